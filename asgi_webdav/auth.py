@@ -1,18 +1,21 @@
 import binascii
 import re
 import hashlib
-import asyncio
+import hmac
 import enum
 from base64 import b64decode
+from collections.abc import Callable
 from uuid import uuid4
+from time import time
 from logging import getLogger
 
-import bonsai
-from bonsai import errors as bonsai_exception
-
 from asgi_webdav.constants import DAVUser
 from asgi_webdav.exception import AuthFailedException
-from asgi_webdav.config import Config
+from asgi_webdav.config import Config, User
+from asgi_webdav.auth_ldap import DAVLDAPAuth
+from asgi_webdav.cache import DAVTTLCache
+from asgi_webdav.executor import DAVExecutor
+from asgi_webdav.metrics import register_metrics
 from asgi_webdav.request import DAVRequest
 from asgi_webdav.response import DAVResponse
 
@@ -47,24 +50,37 @@ class DAVPasswordType(enum.Enum):
     HASHLIB = enum.auto()
     DIGEST = enum.auto()
     LDAP = enum.auto()
+    SCRYPT = enum.auto()
+    PBKDF2 = enum.auto()
 
 
 DAV_PASSWORD_TYPE_MAPPING = {
     "hashlib": (4, DAVPasswordType.HASHLIB),
+    "scrypt": (6, DAVPasswordType.SCRYPT),
+    "pbkdf2": (5, DAVPasswordType.PBKDF2),
     "digest": (3, DAVPasswordType.DIGEST),
     "ldap": (5, DAVPasswordType.LDAP),
 }
 
+DAV_PASSWORD_PREFIX_PATTERN = re.compile(r"^<(?P<sign>\w+)>(?P<split_char>[:#$&|])")
+
 
 class DAVPassword:
+    """
+    The parsed password string of account, it's created once for every account
+    in DAVAuth, and reused by every authentication.
+    """
+
     password: str
 
     type: DAVPasswordType
     data: list[str] | None = None
     message: str | None = None
 
+    ha1: str | None = None  # Digest auth, see compile_ha1()
+
     def _parser_password_string(self) -> (DAVPasswordType, list[str]):
-        m = re.match(r"^<(?P<sign>\w+)>(?P<split_char>[:#$&|])", self.password)
+        m = DAV_PASSWORD_PREFIX_PATTERN.match(self.password)
         if m is None:
             self.type = DAVPasswordType.RAW
             return
@@ -110,33 +126,71 @@ class DAVPassword:
 
         return False, None
 
-    async def check_ldap_password(self, password: str) -> (bool, str | None):
+    def check_scrypt_password(self, password: str) -> (bool, str | None):
+        """
+        password string format: "<scrypt>:n:r:p:salt:hex-digest-string"
+        hex-digest-string: hashlib.scrypt(
+            b"{password}", salt=b"{salt}", n=n, r=r, p=p
+        ).hex()
+        CPU/memory heavy, run it in an executor
+        """
+        try:
+            hash_bytes = hashlib.scrypt(
+                password.encode("utf-8"),
+                salt=self.data[4].encode("utf-8"),
+                n=int(self.data[1]),
+                r=int(self.data[2]),
+                p=int(self.data[3]),
+                maxmem=128 * int(self.data[1]) * int(self.data[2]) * 2,
+            )
+
+        except ValueError as e:
+            return False, str(e)
+
+        if hmac.compare_digest(hash_bytes.hex(), self.data[5]):
+            return True, None
+
+        return False, None
+
+    def check_pbkdf2_password(self, password: str) -> (bool, str | None):
+        """
+        password string format: "<pbkdf2>:algorithm:iterations:salt:hex-digest-string"
+        hex-digest-string: hashlib.pbkdf2_hmac(
+            algorithm, b"{password}", b"{salt}", iterations
+        ).hex()
+        CPU heavy, run it in an executor
+        """
+        try:
+            hash_bytes = hashlib.pbkdf2_hmac(
+                self.data[1],
+                password.encode("utf-8"),
+                self.data[3].encode("utf-8"),
+                int(self.data[2]),
+            )
+
+        except ValueError as e:
+            return False, str(e)
+
+        if hmac.compare_digest(hash_bytes.hex(), self.data[4]):
+            return True, None
+
+        return False, None
+
+    async def check_ldap_password(
+        self, password: str, ldap_auth: DAVLDAPAuth
+    ) -> (bool | None, str | None):
         """ "
         "<ldap>#1#ldaps:/your.domain.com#SIMPLE#uid=user-ldap,cn=users,dc=rexzhang,dc=myds,dc=me"
         """
         if self.data[1] != "1":
             return False, "Wrong password format in Config"
 
-        client = bonsai.LDAPClient(self.data[2])
-        client.set_credentials(self.data[3], user=self.data[4], password=password)
-        try:
-            conn = await client.connect(is_async=True)
-            # result = await conn.search(
-            #     base=ldap_username,
-            #     scope=2,
-            #     attrlist=["uid", "memberOf", "userPassword"],
-            # )
-            # if len(result) != 1:
-            #     logger.warning("LDAP search failed")
-            #     return False
-            conn.close()
-
-        except bonsai_exception.AuthenticationError:
-            return False, "LDAP Authentication Error"
-        except bonsai_exception.AuthMethodNotSupported:
-            return False, "LDAP auth method not supported"
-
-        return True, None
+        return await ldap_auth.check_password(
+            url=self.data[2],
+            mechanism=self.data[3],
+            bind_dn=self.data[4],
+            password=password,
+        )
 
     def check_digest_password(self, username: str, password: str) -> (bool, str | None):
         """
@@ -153,6 +207,19 @@ class DAVPassword:
 
         return False, None
 
+    def compile_ha1(self, username: str, realm: str) -> None:
+        """
+        HA1 = MD5(username:realm:password), only for raw and digest password
+        """
+        match self.type:
+            case DAVPasswordType.RAW:
+                self.ha1 = hashlib.new(
+                    "md5", f"{username}:{realm}:{self.password}".encode("utf-8")
+                ).hexdigest()
+
+            case DAVPasswordType.DIGEST:
+                self.ha1 = self.data[2]
+
     def __repr__(self):
         return f"{self.type}|{self.data}"
 
@@ -172,14 +239,43 @@ class HTTPAuthAbc:
 
 
 class HTTPBasicAuth(HTTPAuthAbc):
-    _cache: dict[bytes, DAVUser]  # basic string: DAVUser
-    _cache_lock: asyncio.Lock
+    """
+    The caches are keyed by the hash of credential(the data of header), the
+    credential itself is not kept in memory.
 
-    def __init__(self, realm: str):
+    The scrypt/PBKDF2 passwords are verified in password_hash_executor, out of
+    the event loop; at most password_hash_max_pending verifications are in it,
+    the others fail immediately.
+    """
+
+    _cache: DAVTTLCache  # credential hash: DAVUser
+    _negative_cache: DAVTTLCache  # credential hash: True
+
+    def __init__(
+        self,
+        realm: str,
+        cache_max_size: int = 1024,
+        cache_ttl: float = 600,
+        negative_cache_ttl: float = 10,
+        ldap_auth: DAVLDAPAuth | None = None,
+        password_hash_max_workers: int = 2,
+        password_hash_max_pending: int = 32,
+    ):
         super().__init__(realm=realm)
 
-        self._cache_lock = asyncio.Lock()
-        self._cache = {}
+        self.ldap_auth = DAVLDAPAuth() if ldap_auth is None else ldap_auth
+
+        self.password_hash_executor = DAVExecutor(
+            name="PasswordHash", max_workers=password_hash_max_workers
+        )
+        self.password_hash_max_pending = password_hash_max_pending
+        self._password_hash_pending = 0
+        self.password_hash_rejected = 0
+
+        self._cache = DAVTTLCache(max_size=cache_max_size, ttl=cache_ttl)
+        self._negative_cache = DAVTTLCache(
+            max_size=cache_max_size, ttl=negative_cache_ttl
+        )
 
     @staticmethod
     def is_credential(auth_header_type: bytes) -> bool:
@@ -188,16 +284,47 @@ class HTTPBasicAuth(HTTPAuthAbc):
     def make_auth_challenge_string(self) -> bytes:
         return f'Basic realm="{self.realm}"'.encode("utf-8")
 
-    async def get_user_from_cache(self, auth_header_data: bytes) -> DAVUser | None:
-        async with self._cache_lock:
-            return self._cache.get(auth_header_data)
+    @staticmethod
+    def get_credential_hash(auth_header_data: bytes) -> bytes:
+        return hashlib.sha256(auth_header_data).digest()
+
+    def get_user_from_cache(self, credential_hash: bytes) -> DAVUser | None:
+        return self._cache.get(credential_hash)
 
-    async def update_user_to_cache(
-        self, auth_header_data: bytes, user: DAVUser
-    ) -> None:
-        async with self._cache_lock:
-            self._cache.update({auth_header_data: user})
-        return
+    def update_user_to_cache(self, credential_hash: bytes, user: DAVUser) -> None:
+        self._cache.set(credential_hash, user)
+        self._negative_cache.pop(credential_hash)
+
+    def is_failed_credential(self, credential_hash: bytes) -> bool:
+        return self._negative_cache.get(credential_hash) is not None
+
+    def update_failed_credential_to_cache(self, credential_hash: bytes) -> None:
+        self._negative_cache.set(credential_hash, True)
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+        self._negative_cache.clear()
+
+    def get_metrics(self) -> dict[str, int | float]:
+        metrics = self._cache.get_metrics()
+        metrics.update(
+            {f"negative_{k}": v for k, v in self._negative_cache.get_metrics().items()}
+        )
+        metrics["password_hash_rejected"] = self.password_hash_rejected
+        return metrics
+
+    async def _run_password_hash(
+        self, check: Callable[[str], tuple[bool, str | None]], password: str
+    ) -> (bool | None, str | None):
+        if self._password_hash_pending >= self.password_hash_max_pending:
+            self.password_hash_rejected += 1
+            return None, "Too many password verifications in progress"
+
+        self._password_hash_pending += 1
+        try:
+            return await self.password_hash_executor.run(check, password)
+        finally:
+            self._password_hash_pending -= 1
 
     @staticmethod
     def parser_auth_header_data(auth_header_data: bytes) -> (str, str):
@@ -212,9 +339,16 @@ class HTTPBasicAuth(HTTPAuthAbc):
 
         return data[:index], data[index + 1 :]
 
-    @staticmethod
-    async def check_password(user: DAVUser, password: str) -> bool:
-        pw_obj = DAVPassword(user.password)
+    async def check_password(
+        self, user: DAVUser, password: str, pw_obj: DAVPassword | None = None
+    ) -> bool | None:
+        """
+        None means the password can not be verified now(LDAP server unavailable,
+        too many verifications in progress...), it's not a wrong password and
+        must not be cached as a failed credential
+        """
+        if pw_obj is None:
+            pw_obj = DAVPassword(user.password)
 
         match pw_obj.type:
             case DAVPasswordType.RAW:
@@ -224,13 +358,26 @@ class HTTPBasicAuth(HTTPAuthAbc):
                 valid, message = False, None
 
             case DAVPasswordType.HASHLIB:
+                # one round of hash, cheaper than a hop to executor
                 valid, message = pw_obj.check_hashlib_password(password)
 
+            case DAVPasswordType.SCRYPT:
+                valid, message = await self._run_password_hash(
+                    pw_obj.check_scrypt_password, password
+                )
+
+            case DAVPasswordType.PBKDF2:
+                valid, message = await self._run_password_hash(
+                    pw_obj.check_pbkdf2_password, password
+                )
+
             case DAVPasswordType.DIGEST:
                 valid, message = pw_obj.check_digest_password(user.username, password)
 
             case DAVPasswordType.LDAP:
-                valid, message = await pw_obj.check_ldap_password(password)
+                valid, message = await pw_obj.check_ldap_password(
+                    password, self.ldap_auth
+                )
 
             case _:
                 valid, message = False, pw_obj.message
@@ -238,6 +385,10 @@ class HTTPBasicAuth(HTTPAuthAbc):
         if valid:
             return True
 
+        if valid is None:
+            logger.warning(f"{message}, username:{user.username}")
+            return None
+
         if message is None:
             message = "Password verification failed, username:{}, password:{}".format(
                 user.username, user.password
@@ -254,6 +405,18 @@ class HTTPBasicAuth(HTTPAuthAbc):
         return False
 
 
+class DAVDigestNonceStatus(enum.Enum):
+    VALID = enum.auto()
+    STALE = enum.auto()
+    INVALID = enum.auto()
+
+
+# the nonce-count smaller than the max one of nonce is accepted once, if it's
+# in the window; the requests of client are concurrent, can arrive out of order
+DIGEST_NONCE_COUNT_WINDOW = 64
+DIGEST_NONCE_COUNT_MASK = (1 << DIGEST_NONCE_COUNT_WINDOW) - 1
+DIGEST_NONCE_COUNT_PATTERN = re.compile(r"[0-9a-fA-F]{8}")
+
 DIGEST_AUTHORIZATION_PARAMS = {
     "username",
     "realm",
@@ -290,17 +453,38 @@ class HTTPDigestAuth(HTTPAuthAbc):
     # sends these parameters with quotes—this is not known to cause any problems with
     # other server implementations.
 
-    def __init__(self, realm: str, secret: str | None = None):
+    # The nonce is "{timestamp}{signature}", it's verified without any state:
+    #   timestamp: 8 hex digits, the time of creation
+    #   signature: HMAC-SHA256(secret, "{timestamp}:{realm}")
+    # The nonce-count of the nonces in use are tracked in a bounded table, a
+    # request with a used one is a replay. An evicted nonce is tracked again
+    # from its next request.
+
+    _nonce_count: DAVTTLCache  # nonce: (max nonce-count, bitmap of window)
+
+    def __init__(
+        self,
+        realm: str,
+        secret: str | None = None,
+        nonce_ttl: float = 300,
+        nonce_count_max_size: int = 65536,
+    ):
         super().__init__(realm=realm)
 
         self.secret = uuid4().hex if secret is None else secret
         self.opaque = uuid4().hex.upper()
 
+        self._nonce_hmac = hmac.new(
+            self.secret.encode("utf-8"), digestmod=hashlib.sha256
+        )
+        self.nonce_ttl = nonce_ttl
+        self._nonce_count = DAVTTLCache(max_size=nonce_count_max_size, ttl=nonce_ttl)
+
     @staticmethod
     def is_credential(auth_header_type: bytes) -> bool:
         return auth_header_type.lower() == b"digest"
 
-    def make_auth_challenge_string(self) -> bytes:
+    def make_auth_challenge_string(self, stale: bool = False) -> bytes:
         return "Digest {}".format(
             self.authorization_string_build_from_data(
                 {
@@ -309,7 +493,7 @@ class HTTPDigestAuth(HTTPAuthAbc):
                     "nonce": self.nonce,
                     "opaque": self.opaque,
                     "algorithm": "MD5",
-                    "stale": "false",
+                    "stale": "true" if stale else "false",
                 }
             )
         ).encode("utf-8")
@@ -325,10 +509,9 @@ class HTTPDigestAuth(HTTPAuthAbc):
     def make_response_authentication_info_string(
         self,
         request: DAVRequest,
-        user: DAVUser,
+        ha1: str,
         digest_auth_data: dict[str, str],
     ) -> bytes:
-        ha1 = self.build_ha1_digest(user)
         ha2 = self.build_ha2_digest(
             method=request.method, uri=digest_auth_data.get("uri")
         )
@@ -342,14 +525,17 @@ class HTTPDigestAuth(HTTPAuthAbc):
                 ha2,
             ]
         )
-        return self.authorization_string_build_from_data(
-            {
-                "rspauth": rspauth,
-                "qop": digest_auth_data.get("qop"),
-                "cnonce": digest_auth_data.get("cnonce"),
-                "nc": digest_auth_data.get("nc"),
-            }
-        ).encode("utf-8")
+        data = {
+            "rspauth": rspauth,
+            "qop": digest_auth_data.get("qop"),
+            "cnonce": digest_auth_data.get("cnonce"),
+            "nc": digest_auth_data.get("nc"),
+        }
+        if self.is_nonce_aging(digest_auth_data.get("nonce")):
+            # the client switch to it before the nonce is stale
+            data["nextnonce"] = self.nonce
+
+        return self.authorization_string_build_from_data(data).encode("utf-8")
         # return 'rspauth="{}", cnonce="{}", qop={}, nc={}'.format(
         #     rspauth,
         #     digest_auth_data.get("cnonce"),
@@ -359,9 +545,75 @@ class HTTPDigestAuth(HTTPAuthAbc):
 
     @property
     def nonce(self) -> str:
-        return hashlib.new(
-            "md5", f"{uuid4().hex}{self.secret}".encode("utf-8")
-        ).hexdigest()
+        return self.create_nonce(time())
+
+    def _sign_nonce(self, timestamp: str) -> str:
+        signature = self._nonce_hmac.copy()
+        signature.update(f"{timestamp}:{self.realm}".encode("utf-8"))
+        return signature.hexdigest()
+
+    def create_nonce(self, timestamp: float) -> str:
+        timestamp = f"{int(timestamp):08x}"
+        return f"{timestamp}{self._sign_nonce(timestamp)}"
+
+    @staticmethod
+    def _get_nonce_timestamp(nonce: str) -> int | None:
+        try:
+            return int(nonce[:8], 16)
+        except ValueError:
+            return None
+
+    def check_nonce(self, nonce: str) -> DAVDigestNonceStatus:
+        timestamp = self._get_nonce_timestamp(nonce)
+        if timestamp is None or not hmac.compare_digest(
+            nonce[8:], self._sign_nonce(nonce[:8])
+        ):
+            return DAVDigestNonceStatus.INVALID
+
+        if time() - timestamp > self.nonce_ttl:
+            return DAVDigestNonceStatus.STALE
+
+        return DAVDigestNonceStatus.VALID
+
+    def is_nonce_aging(self, nonce: str) -> bool:
+        """over the half of its lifetime"""
+        timestamp = self._get_nonce_timestamp(nonce)
+        return timestamp is not None and time() - timestamp > self.nonce_ttl / 2
+
+    def update_nonce_count(self, nonce: str, nc: str) -> bool:
+        """
+        Call it after the request is verified, return False if the nonce-count
+        has been used(a replay)
+        """
+        if nc is None or DIGEST_NONCE_COUNT_PATTERN.fullmatch(nc) is None:
+            # the nc value MUST be exactly 8 hexadecimal digits
+            return False
+
+        count = int(nc, 16)
+
+        item = self._nonce_count.get(nonce)
+        if item is None:
+            max_count, bitmap = count, 1
+        else:
+            max_count, bitmap = item
+            if count - max_count >= DIGEST_NONCE_COUNT_WINDOW:
+                # all the tracked ones are out of the window
+                max_count, bitmap = count, 1
+            elif count > max_count:
+                bitmap = ((bitmap << (count - max_count)) | 1) & DIGEST_NONCE_COUNT_MASK
+                max_count = count
+            else:
+                offset = max_count - count
+                if offset >= DIGEST_NONCE_COUNT_WINDOW or bitmap & (1 << offset):
+                    return False
+
+                bitmap |= 1 << offset
+
+        self._nonce_count.set(nonce, (max_count, bitmap))
+        return True
+
+    def get_metrics(self) -> dict[str, int | float]:
+        return self._nonce_count.get_metrics()
 
     @staticmethod
     def authorization_str_parser_to_data(authorization: str) -> dict:
@@ -387,20 +639,17 @@ class HTTPDigestAuth(HTTPAuthAbc):
     def build_md5_digest(data: list[str]) -> str:
         return hashlib.new("md5", ":".join(data).encode("utf-8")).hexdigest()
 
-    def build_ha1_digest(self, user: DAVUser) -> str:
+    def build_ha1_digest(self, user: DAVUser, pw_obj: DAVPassword | None = None) -> str:
         """
         HA1 = MD5(username:realm:password)
+        pw_obj: the precompiled one, see DAVPassword.compile_ha1()
         """
-        pw_obj = DAVPassword(user.password)
-        match pw_obj.type:
-            case DAVPasswordType.RAW:
-                return self.build_md5_digest([user.username, self.realm, user.password])
-
-            case DAVPasswordType.DIGEST:
-                return pw_obj.data[2]
+        if pw_obj is None:
+            pw_obj = DAVPassword(user.password)
+            pw_obj.compile_ha1(user.username, self.realm)
 
-            case _:
-                pass
+        if pw_obj.ha1 is not None:
+            return pw_obj.ha1
 
         logger.error(
             "{}, , username:{}, password:{}".format(
@@ -418,10 +667,9 @@ class HTTPDigestAuth(HTTPAuthAbc):
     def build_request_digest(
         self,
         request: DAVRequest,
-        user: DAVUser,
+        ha1: str,
         digest_auth_data: dict[str, str],
     ) -> str:
-        ha1 = self.build_ha1_digest(user)
         ha2 = self.build_ha2_digest(
             method=request.method, uri=digest_auth_data.get("uri")
         )
@@ -463,12 +711,55 @@ MESSAGE_401_TEMPLATE = """<!DOCTYPE html>
 
 class DAVAuth:
     realm = "ASGI-WebDAV"
-    user_mapping: dict[str, DAVUser] = dict()
+    user_mapping: dict[str, DAVUser]
+    password_mapping: dict[str, DAVPassword]  # username: precompiled password
 
     def __init__(self, config: Config):
         self.config = config
 
-        for config_account in config.account_mapping:
+        ldap_config = config.ldap_auth
+        self.ldap_auth = DAVLDAPAuth(
+            pool_max_size=ldap_config.pool_max_size,
+            connect_timeout=ldap_config.connect_timeout,
+            bind_timeout=ldap_config.bind_timeout,
+            operation_timeout=ldap_config.operation_timeout,
+            cache_max_size=ldap_config.cache_max_size,
+            cache_ttl=ldap_config.cache_ttl,
+            circuit_breaker_failure_threshold=(
+                ldap_config.circuit_breaker_failure_threshold
+            ),
+            circuit_breaker_reset_timeout=ldap_config.circuit_breaker_reset_timeout,
+        )
+        register_metrics("LDAPAuth", self.ldap_auth.get_metrics)
+        self.http_basic_auth = HTTPBasicAuth(
+            realm=self.realm,
+            cache_max_size=config.http_basic_auth.cache_max_size,
+            cache_ttl=config.http_basic_auth.cache_ttl,
+            negative_cache_ttl=config.http_basic_auth.negative_cache_ttl,
+            ldap_auth=self.ldap_auth,
+            password_hash_max_workers=config.http_basic_auth.password_hash_max_workers,
+            password_hash_max_pending=config.http_basic_auth.password_hash_max_pending,
+        )
+        register_metrics("HTTPBasicAuth cache", self.http_basic_auth.get_metrics)
+        register_metrics(
+            self.http_basic_auth.password_hash_executor.name,
+            self.http_basic_auth.password_hash_executor.get_metrics,
+        )
+        self.http_digest_auth = HTTPDigestAuth(
+            realm=self.realm,
+            secret=config.http_digest_auth.nonce_secret,
+            nonce_ttl=config.http_digest_auth.nonce_ttl,
+            nonce_count_max_size=config.http_digest_auth.nonce_count_max_size,
+        )
+        register_metrics("HTTPDigestAuth nonce", self.http_digest_auth.get_metrics)
+
+        self.update_user_mapping(config.account_mapping)
+
+    def update_user_mapping(self, account_mapping: list[User]):
+        """(re)load the accounts, all the cached authentications are dropped"""
+        user_mapping = {}
+        password_mapping = {}
+        for config_account in account_mapping:
             user = DAVUser(
                 username=config_account.username,
                 password=config_account.password,
@@ -476,11 +767,16 @@ class DAVAuth:
                 admin=config_account.admin,
             )
 
-            self.user_mapping[config_account.username] = user
+            user_mapping[config_account.username] = user
             logger.info(f"Register User: {user}")
 
-        self.http_basic_auth = HTTPBasicAuth(realm=self.realm)
-        self.http_digest_auth = HTTPDigestAuth(realm=self.realm, secret=uuid4().hex)
+            pw_obj = DAVPassword(config_account.password)
+            pw_obj.compile_ha1(config_account.username, self.realm)
+            password_mapping[config_account.username] = pw_obj
+
+        self.user_mapping = user_mapping
+        self.password_mapping = password_mapping
+        self.http_basic_auth.clear_cache()
 
     async def pick_out_user(self, request: DAVRequest) -> (DAVUser | None, str):
         authorization_header = request.headers.get(b"authorization")
@@ -498,10 +794,14 @@ class DAVAuth:
         if self.http_basic_auth.is_credential(auth_header_type):
             request.authorization_method = "Basic"
 
-            user = await self.http_basic_auth.get_user_from_cache(auth_header_data)
-            if user is not None:
+            credential_hash = self.http_basic_auth.get_credential_hash(auth_header_data)
+            user = self.http_basic_auth.get_user_from_cache(credential_hash)
+            if user is not None and self.user_mapping.get(user.username) is user:
                 return user, ""
 
+            if self.http_basic_auth.is_failed_credential(credential_hash):
+                return None, "no permission"  # TODO
+
             try:
                 (
                     username,
@@ -512,12 +812,21 @@ class DAVAuth:
 
             user = self.user_mapping.get(username)
             if user is None:
+                valid = False
+            else:
+                valid = await self.http_basic_auth.check_password(
+                    user, request_password, self.password_mapping.get(username)
+                )
+
+            if valid is None:
+                # can't be verified now, try again with the next request
                 return None, "no permission"  # TODO
 
-            if not await self.http_basic_auth.check_password(user, request_password):
+            if not valid:
+                self.http_basic_auth.update_failed_credential_to_cache(credential_hash)
                 return None, "no permission"  # TODO
 
-            await self.http_basic_auth.update_user_to_cache(auth_header_data, user)
+            self.http_basic_auth.update_user_to_cache(credential_hash, user)
             return user, ""
 
         # HTTP Digest Auth
@@ -534,9 +843,17 @@ class DAVAuth:
             if user is None:
                 return None, "no permission"
 
+            nonce = digest_auth_data.get("nonce")
+            nonce_status = self.http_digest_auth.check_nonce(nonce)
+            if nonce_status == DAVDigestNonceStatus.INVALID:
+                return None, "no permission"
+
+            ha1 = self.http_digest_auth.build_ha1_digest(
+                user, self.password_mapping.get(user.username)
+            )
             expected_request_digest = self.http_digest_auth.build_request_digest(
                 request=request,
-                user=user,
+                ha1=ha1,
                 digest_auth_data=digest_auth_data,
             )
             request_digest = digest_auth_data.get("response")
@@ -547,13 +864,24 @@ class DAVAuth:
                 )
                 return None, "no permission"
 
+            if nonce_status == DAVDigestNonceStatus.STALE:
+                # the credential is right, ask the client retry with a new nonce
+                request.authorization_nonce_stale = True
+                return None, "stale nonce"
+
+            if not self.http_digest_auth.update_nonce_count(
+                nonce, digest_auth_data.get("nc")
+            ):
+                logger.warning(f"reused nonce-count, nonce:{nonce}")
+                return None, "no permission"
+
             # https://datatracker.ietf.org/doc/html/rfc2617#page-15
             # macOS 11.4 finder supported
             #   WebDAVFS/3.0.0 (03008000) Darwin/20.5.0 (x86_64)
             request.authorization_info = (
                 self.http_digest_auth.make_response_authentication_info_string(
                     request=request,
-                    user=user,
+                    ha1=ha1,
                     digest_auth_data=digest_auth_data,
                 )
             )
@@ -562,7 +890,9 @@ class DAVAuth:
         return None, "Unknown authentication method"
 
     def create_response_401(self, request: DAVRequest, message: str) -> DAVResponse:
-        if self.config.http_digest_auth.enable:
+        if request.authorization_nonce_stale:
+            enable_digest = True
+        elif self.config.http_digest_auth.enable:
             enable_digest = not self._match_user_agent(
                 rule=self.config.http_digest_auth.disable_rule,
                 user_agent=request.client_user_agent,
@@ -573,7 +903,9 @@ class DAVAuth:
                 user_agent=request.client_user_agent,
             ))
         if enable_digest:
-            challenge_string = self.http_digest_auth.make_auth_challenge_string()
+            challenge_string = self.http_digest_auth.make_auth_challenge_string(
+                stale=request.authorization_nonce_stale
+            )
             logger.debug("response Digest auth challenge")
         else:
             challenge_string = self.http_basic_auth.make_auth_challenge_string()
@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from time import monotonic
+from logging import getLogger
+
+import bonsai
+from bonsai import errors as bonsai_exception
+
+from asgi_webdav.cache import DAVTTLCache
+
+logger = getLogger(__name__)
+
+
+class DAVLDAPConnectionAbc:
+    """
+    A connection to LDAP server, it can bind(authenticate) many times.
+
+    bind() returns False if the credential is wrong, raises an exception for the
+    other errors(connection lost, server busy...), then the connection is
+    dropped and the failure is counted by the circuit breaker.
+    """
+
+    async def bind(self, mechanism: str, bind_dn: str, password: str) -> bool:
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+DAVLDAPConnectionFactory = Callable[[str, float], Awaitable[DAVLDAPConnectionAbc]]
+
+
+class BonsaiLDAPConnection(DAVLDAPConnectionAbc):
+    """
+    bonsai can not re-bind an opened connection, so every bind() opens a new
+    one; the pool still bounds the number of the concurrent binds.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+
+    async def bind(self, mechanism: str, bind_dn: str, password: str) -> bool:
+        client = bonsai.LDAPClient(self.url)
+        client.set_credentials(mechanism, user=bind_dn, password=password)
+        try:
+            conn = await client.connect(is_async=True, timeout=self.timeout)
+        except bonsai_exception.AuthenticationError:
+            return False
+
+        conn.close()
+        return True
+
+    def close(self):
+        pass
+
+
+async def create_bonsai_ldap_connection(
+    url: str, connect_timeout: float
+) -> DAVLDAPConnectionAbc:
+    return BonsaiLDAPConnection(url, connect_timeout)
+
+
+class DAVLDAPConnectionPool:
+    """
+    A bounded pool of the connections to one LDAP server, the idle connections
+    are reused; the caller waits for a free one when all are in use.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        connection_factory: DAVLDAPConnectionFactory,
+        max_size: int,
+        connect_timeout: float,
+    ):
+        self.url = url
+        self.connection_factory = connection_factory
+        self.max_size = max_size
+        self.connect_timeout = connect_timeout
+
+        self._semaphore = asyncio.Semaphore(max_size)
+        self._idle: list[DAVLDAPConnectionAbc] = []
+        self.in_use = 0
+        self.created = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._semaphore:
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = await asyncio.wait_for(
+                    self.connection_factory(self.url, self.connect_timeout),
+                    self.connect_timeout,
+                )
+                self.created += 1
+
+            self.in_use += 1
+            try:
+                yield conn
+
+            except BaseException:
+                conn.close()
+                raise
+
+            else:
+                self._idle.append(conn)
+
+            finally:
+                self.in_use -= 1
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+
+class DAVCircuitBreaker:
+    """
+    Open after failure_threshold failures in a row, the calls fail fast while
+    it's open. After reset_timeout seconds, one trial call is allowed(half
+    open), it's closed again if the trial is succeeded.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+
+        if self._trial_in_flight or monotonic() - self._opened_at < self.reset_timeout:
+            return False
+
+        self._trial_in_flight = True
+        return True
+
+    def release_trial(self):
+        """the call is abandoned(e.g. cancelled), it's not a success or a failure"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.warning("LDAP circuit breaker is open")
+
+            self._opened_at = monotonic()
+            self._trial_in_flight = False
+
+
+class DAVLDAPAuth:
+    """
+    Verify the password by binding to LDAP server, with a connection pool and a
+    circuit breaker per server. The verified credentials are cached, keyed by
+    the hash of credential.
+
+    - connect_timeout: open a connection
+    - bind_timeout: one bind
+    - operation_timeout: the whole verification, include waiting for a free
+        connection in pool
+    """
+
+    def __init__(
+        self,
+        pool_max_size: int = 8,
+        connect_timeout: float = 5,
+        bind_timeout: float = 5,
+        operation_timeout: float = 10,
+        cache_max_size: int = 1024,
+        cache_ttl: float = 600,
+        circuit_breaker_failure_threshold: int = 5,
+        circuit_breaker_reset_timeout: float = 30,
+        connection_factory: DAVLDAPConnectionFactory | None = None,
+    ):
+        self.pool_max_size = pool_max_size
+        self.connect_timeout = connect_timeout
+        self.bind_timeout = bind_timeout
+        self.operation_timeout = operation_timeout
+        self.circuit_breaker_failure_threshold = circuit_breaker_failure_threshold
+        self.circuit_breaker_reset_timeout = circuit_breaker_reset_timeout
+        self.connection_factory = (
+            create_bonsai_ldap_connection
+            if connection_factory is None
+            else connection_factory
+        )
+
+        self._cache = DAVTTLCache(max_size=cache_max_size, ttl=cache_ttl)
+        self._pools: dict[str, DAVLDAPConnectionPool] = {}
+        self._circuit_breakers: dict[str, DAVCircuitBreaker] = {}
+
+        self.rejected = 0  # by circuit breaker
+        self.timeouts = 0
+        self.errors = 0
+
+    def _get_pool(self, url: str) -> DAVLDAPConnectionPool:
+        pool = self._pools.get(url)
+        if pool is None:
+            pool = DAVLDAPConnectionPool(
+                url=url,
+                connection_factory=self.connection_factory,
+                max_size=self.pool_max_size,
+                connect_timeout=self.connect_timeout,
+            )
+            self._pools[url] = pool
+
+        return pool
+
+    def _get_circuit_breaker(self, url: str) -> DAVCircuitBreaker:
+        circuit_breaker = self._circuit_breakers.get(url)
+        if circuit_breaker is None:
+            circuit_breaker = DAVCircuitBreaker(
+                failure_threshold=self.circuit_breaker_failure_threshold,
+                reset_timeout=self.circuit_breaker_reset_timeout,
+            )
+            self._circuit_breakers[url] = circuit_breaker
+
+        return circuit_breaker
+
+    async def _bind(self, url: str, mechanism: str, bind_dn: str, password: str):
+        async with self._get_pool(url).connection() as conn:
+            return await asyncio.wait_for(
+                conn.bind(mechanism, bind_dn, password), self.bind_timeout
+            )
+
+    async def check_password(
+        self, url: str, mechanism: str, bind_dn: str, password: str
+    ) -> (bool | None, str | None):
+        """
+        valid: None means the password can not be verified now(the server is
+        unavailable), it's not a wrong password
+        """
+        credential_hash = hashlib.sha256(
+            "\n".join([url, mechanism, bind_dn, password]).encode("utf-8")
+        ).digest()
+        if self._cache.get(credential_hash) is not None:
+            return True, None
+
+        circuit_breaker = self._get_circuit_breaker(url)
+        if not circuit_breaker.allow():
+            self.rejected += 1
+            return None, "LDAP server is unavailable(circuit breaker is open)"
+
+        try:
+            valid = await asyncio.wait_for(
+                self._bind(url, mechanism, bind_dn, password), self.operation_timeout
+            )
+
+        except asyncio.CancelledError:
+            # e.g. the client is disconnected, let the next call be the trial
+            circuit_breaker.release_trial()
+            raise
+
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            circuit_breaker.record_failure()
+            return None, "LDAP timeout"
+
+        except bonsai_exception.AuthMethodNotSupported:
+            circuit_breaker.record_success()
+            return False, "LDAP auth method not supported"
+
+        except Exception as e:
+            self.errors += 1
+            circuit_breaker.record_failure()
+            return None, f"LDAP error: {e}"
+
+        circuit_breaker.record_success()
+        if not valid:
+            return False, "LDAP Authentication Error"
+
+        self._cache.set(credential_hash, True)
+        return True, None
+
+    def get_metrics(self) -> dict[str, int | float]:
+        metrics = self._cache.get_metrics()
+        metrics.update(
+            {
+                "pool_created": sum(pool.created for pool in self._pools.values()),
+                "pool_idle": sum(pool.idle for pool in self._pools.values()),
+                "pool_in_use": sum(pool.in_use for pool in self._pools.values()),
+                "circuit_open": sum(
+                    cb.is_open for cb in self._circuit_breakers.values()
+                ),
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+            }
+        )
+        return metrics
@@ -0,0 +1,238 @@
+import threading
+from time import monotonic
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, Optional
+
+
+class DAVLRUCache:
+    """
+    A bounded LRU cache, with optional TTL and hit/miss statistics.
+
+    - max_size: the max number of the entries, or the max total weight of the
+        entries if get_weight is given(e.g. len, for a cache bounded by bytes)
+    - ttl: seconds, None means the entry never expires
+    - on_remove: called with (key, value) of the entry which is removed(evicted,
+        expired, invalidated or replaced), outside of the lock
+    It is thread safe, the entries can be invalidated from a non-asyncio thread.
+
+    The generation is increased by every invalidation(pop/clear). Get it before
+    loading a value, and pass it to set(); the value is dropped if anything was
+    invalidated during the loading, so a stale value never gets into the cache.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: Optional[float] = None,
+        get_weight: Optional[Callable[[Any], int]] = None,
+        on_remove: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.get_weight = get_weight
+        self.on_remove = on_remove
+
+        self._data: OrderedDict[Hashable, tuple[Any, Optional[float]]] = OrderedDict()
+        self._weights: dict[Hashable, int] = {}
+        self._weight = 0
+        self._lock = threading.Lock()
+
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count=False) is not None
+
+    def get(self, key: Hashable, count: bool = True) -> Any:
+        removed = []
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expire_time = item
+                if expire_time is None or expire_time > monotonic():
+                    self._data.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return value
+
+                # expired
+                removed.append(self._remove(key))
+
+            if count:
+                self.misses += 1
+
+        self._call_on_remove(removed)
+        return None
+
+    def _remove(self, key: Hashable) -> tuple[Hashable, Any]:
+        """must be called with self._lock"""
+        value, _ = self._data.pop(key)
+        self._weight -= self._weights.pop(key, 1)
+        return key, value
+
+    def _call_on_remove(self, removed: list[tuple[Hashable, Any]]):
+        if self.on_remove is None:
+            return
+
+        for key, value in removed:
+            self.on_remove(key, value)
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> bool:
+        """
+        ttl: override the default ttl of cache
+        return False if the value is dropped(not cached)
+        """
+        if self.max_size <= 0:
+            return False
+
+        if ttl is None:
+            ttl = self.ttl
+        expire_time = None if ttl is None else monotonic() + ttl
+
+        removed = []
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+
+            if key in self._data:
+                removed.append(self._remove(key))
+
+            if self.get_weight is None:
+                weight = 1
+            else:
+                weight = self.get_weight(value)
+                self._weights[key] = weight
+
+            self._data[key] = (value, expire_time)
+            self._weight += weight
+            while self._weight > self.max_size:
+                removed.append(self._remove(next(iter(self._data))))
+                self.evictions += 1
+
+        self._call_on_remove(removed)
+        return True
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            self.generation += 1
+            if key not in self._data:
+                return None
+
+            removed = self._remove(key)
+
+        self._call_on_remove([removed])
+        return removed[1]
+
+    def pop_matching(self, predicate: Callable[[Hashable], bool]) -> int:
+        """remove all entries whose key matches the predicate, it's O(n)"""
+        with self._lock:
+            self.generation += 1
+            keys = [key for key in self._data.keys() if predicate(key)]
+            removed = [self._remove(key) for key in keys]
+
+        self._call_on_remove(removed)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            removed = [(key, value) for key, (value, _) in self._data.items()]
+            self._data.clear()
+            self._weights.clear()
+            self._weight = 0
+
+        self._call_on_remove(removed)
+
+    def get_metrics(self) -> dict[str, int | float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "weight": self._weight,
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class DAVTTLCache:
+    """
+    A bounded cache with TTL, for the data which is only accessed in the thread
+    of event loop, so there is no lock at all. get() never reorders the entries,
+    the oldest inserted entry is evicted first when it's full.
+
+    - max_size: the max number of the entries
+    - ttl: seconds
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._data: dict[Hashable, tuple[Any, float]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is not None:
+            if item[1] > monotonic():
+                self.hits += 1
+                return item[0]
+
+            # expired
+            self._data.pop(key, None)
+
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+
+        self._data.pop(key, None)
+        self._data[key] = (value, monotonic() + self.ttl)
+        while len(self._data) > self.max_size:
+            del self._data[next(iter(self._data))]
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any:
+        item = self._data.pop(key, None)
+        if item is None:
+            return None
+
+        return item[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def get_metrics(self) -> dict[str, int | float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+        }
@@ -24,12 +24,84 @@ class User(BaseModel):
     admin: bool = False
 
 
+class HTTPBasicAuth(BaseModel):
+    """
+    cache_max_size/cache_ttl: the verified credentials
+    negative_cache_ttl: the failed credentials, keep it short
+    password_hash_max_workers: the threads verifying scrypt/PBKDF2 password
+    password_hash_max_pending: the verifications over it fail immediately
+    """
+
+    cache_max_size: int = 1024
+    cache_ttl: float = 600  # second
+    negative_cache_ttl: float = 10  # second
+    password_hash_max_workers: int = 2
+    password_hash_max_pending: int = 32
+
+
 class HTTPDigestAuth(BaseModel):
+    """
+    nonce_secret: sign the nonces, None means a random one; set the same one
+        for all the worker processes, or a nonce is only valid in the worker
+        process created it
+    nonce_ttl: the nonce is stale after it, the client retry with a new nonce
+        without asking the user again
+    nonce_count_max_size: the max number of nonces whose nonce-count are
+        tracked, for replay protection; per worker process
+    """
+
     enable: bool = False
     enable_rule: str = ""  # Valid when "enable" is false
     disable_rule: str = "neon/"  # Valid when "enable" is true
     # TODO Compatible with neon
 
+    nonce_secret: str | None = None
+    nonce_ttl: float = 300  # second
+    nonce_count_max_size: int = 65536
+
+
+class LDAPAuth(BaseModel):
+    """
+    For the account with LDAP password("<ldap>#1#..."), per LDAP server:
+        pool_max_size: the max number of the connections(the concurrent binds;
+            bonsai opens a new LDAP connection for every bind)
+        connect_timeout/bind_timeout: open a connection/one bind
+        operation_timeout: the whole verification, include waiting for a free
+            connection in pool
+        circuit_breaker_*: fail fast after the failures(timeout, error) in a
+            row, retry after the reset_timeout
+    The verified credentials are cached for cache_ttl.
+    """
+
+    pool_max_size: int = 8
+    connect_timeout: float = 5  # second
+    bind_timeout: float = 5  # second
+    operation_timeout: float = 10  # second
+    cache_max_size: int = 1024
+    cache_ttl: float = 600  # second
+    circuit_breaker_failure_threshold: int = 5
+    circuit_breaker_reset_timeout: float = 30  # second
+
+
+class MetadataCacheInvalidation(Enum):
+    INOTIFY = "inotify"
+    TTL = "ttl"
+
+
+class ProviderReadAhead(BaseModel):
+    """
+    FileSystemProvider reads the next blocks of file while the current one is
+    being sent, so the latency of disk and network are overlapped
+
+    block_size: the max bytes of one read, the block grows from 64KiB up to it
+    max_buffer_size: the max bytes in flight(read ahead) per response, one
+        block at least
+    """
+
+    enable: bool = True
+    block_size: int = 512 * 1024
+    max_buffer_size: int = 2 * 1024 * 1024
+
 
 class Provider(BaseModel):
     """
@@ -49,7 +121,73 @@ class Provider(BaseModel):
     home_dir: bool = False
     readonly: bool = False  # TODO impl
 
+    # FileSystemProvider only, override ProviderMetadataCache.invalidation
+    metadata_cache_invalidation: MetadataCacheInvalidation | None = None
+    # FileSystemProvider only, override Config.provider_read_ahead
+    read_ahead: ProviderReadAhead | None = None
+
+
+class ProviderMetadataCache(BaseModel):
+    """
+    Cache the metadata(stat, content type...) of file system's resource
+
+    invalidation:
+        inotify: for local disk, Linux only; fallback to ttl if unavailable
+        ttl: for network mount(NFS, SMB...)
+    """
+
+    enable: bool = True
+    max_size: int = 65536
+    invalidation: MetadataCacheInvalidation = MetadataCacheInvalidation.INOTIFY
+    ttl: float = 5  # second
+
+
+class ProviderOpenFileCache(BaseModel):
+    """
+    Cache the opened file descriptors of file system's resource(like nginx's
+    open_file_cache), the GET/range requests of a file share one descriptor
+
+    max_size: the max number of the descriptors, per provider
+    inactive: the descriptor not be used for it is closed
+    """
+
+    enable: bool = True
+    max_size: int = 256
+    inactive: float = 60  # second
+
+
+class ProviderContentCache(BaseModel):
+    """
+    Cache the content of small files in memory, the cached one is sent in one
+    message; keyed by path, inode, mtime and size, a changed file is a new key
+
+    max_file_size: the file larger than it is not cached
+    max_size: bytes of all cached contents, shared by all providers
+    """
+
+    enable: bool = False
+    max_file_size: int = 64 * 1024
+    max_size: int = 64 * 1024 * 1024
+
+
+class LockStoreBackend(Enum):
+    MEMORY = "memory"
+    SQLITE = "sqlite"
+
 
+class LockStore(BaseModel):
+    """
+    backend:
+        memory: in the process, for one worker process only
+        sqlite: in the file sqlite_path, shared by the worker processes on the
+            same host
+    sqlite_path: None means lock.sqlite3 in the private directory of the user,
+        $XDG_CACHE_HOME/asgi-webdav or ~/.cache/asgi-webdav; never put it in a
+        shared directory(e.g. /tmp), the other users could forge the locks
+    """
+
+    backend: LockStoreBackend = LockStoreBackend.MEMORY
+    sqlite_path: str | None = None
 
 
 class GuessTypeExtension(BaseModel):
@@ -77,12 +215,50 @@ class Compression(BaseModel):
 
 
 class HideFileInDir(BaseModel):
+    """
+    ua_cache_max_size: the max number of the client's UA whose rules are cached
+    """
+
     enable: bool = True
     enable_default_rules: bool = True
     user_rules: dict[str, str] = {}
+    ua_cache_max_size: int = 1024
 
 
 
+class PropfindDepthInfinity(BaseModel):
+    """
+    Depth: infinity PROPFIND,
+        response 403 with error propfind-finite-depth when it's disabled or the
+        count of entries is over max_entries
+    """
+
+    enable: bool = True
+    max_entries: int = 10000
+
+
+class PropfindChildProvider(BaseModel):
+    """
+    PROPFIND(Depth: 1) on the path which has child providers(mounted in it),
+        the child providers are requested concurrently, up to max_concurrency;
+        the one over timeout(include waiting for the concurrency) is responded
+        as a 504 entry in the 207 response
+    """
+
+    max_concurrency: int = 8
+    timeout: float = 10  # second
+
+
+class PropfindResponseCache(BaseModel):
+    """
+    Cache the rendered <D:response> of resources in PROPFIND response,
+        max_size: bytes of all cached responses, per provider
+    """
+
+    enable: bool = True
+    max_size: int = 16 * 1024 * 1024
+
+
 class LoggingLevel(Enum):
     CRITICAL = "CRITICAL"
     ERROR = "ERROR"
@@ -94,19 +270,31 @@ class LoggingLevel(Enum):
 class Config(BaseModel):
     # auth
     account_mapping: list[User] = list()  # TODO => user_mapping ?
+    http_basic_auth: HTTPBasicAuth = HTTPBasicAuth()
     http_digest_auth: HTTPDigestAuth = HTTPDigestAuth()
+    ldap_auth: LDAPAuth = LDAPAuth()
 
     # provider
     provider_mapping: list[Provider] = list()  # TODO => prefix_mapping ?
+    provider_io_max_workers: int = 16
+    provider_metadata_cache: ProviderMetadataCache = ProviderMetadataCache()
+    provider_open_file_cache: ProviderOpenFileCache = ProviderOpenFileCache()
+    provider_read_ahead: ProviderReadAhead = ProviderReadAhead()
+    provider_content_cache: ProviderContentCache = ProviderContentCache()
+    lock_store: LockStore = LockStore()
 
     # rules process
     hide_file_in_dir: HideFileInDir = HideFileInDir()
     guess_type_extension: GuessTypeExtension = GuessTypeExtension()
     text_file_charset_detect: TextFileCharsetDetect = TextFileCharsetDetect()
+    propfind_depth_infinity: PropfindDepthInfinity = PropfindDepthInfinity()
+    propfind_child_provider: PropfindChildProvider = PropfindChildProvider()
 
     # response
     compression: Compression = Compression()
+    propfind_response_cache: PropfindResponseCache = PropfindResponseCache()
     enable_dir_browser: bool = True
+    enable_zero_copy: bool = True
 
     # other
     logging_level: LoggingLevel = LoggingLevel.INFO
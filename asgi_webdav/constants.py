@@ -1,13 +1,17 @@
 from typing import NewType, Union
 import re
+import warnings
 from enum import Enum, IntEnum
 from time import time
 from uuid import UUID
 from dataclasses import dataclass, field
 from collections import namedtuple
+from collections.abc import Iterable
 
 import arrow
 
+from asgi_webdav.cache import DAVLRUCache
+
 
 DAV_METHODS = {
     # rfc4918:9.1
@@ -208,13 +212,59 @@ class DAVLockInfo:
                 self.timeout.__str__(),
                 self.expire.__str__(),
                 self.scope.name,
-                self.owner,
+                str(self.owner),
                 self.token.hex,
             ]
         )
         return f"DAVLockInfo({s})"
 
 
+class _DAVPermissionRules:
+    """
+    The rules of one polarity are compiled into one regex, match any of them;
+    fallback to the compiled rules one by one if they can't be combined(e.g.
+    a global inline flag in the middle, or a capture group: the groups are
+    renumbered in the combined one, the backreferences change their meaning)
+    """
+
+    def __init__(self, rules: list[str]):
+        self.match_all = any(rule in {"", "^", ".*", "^.*"} for rule in rules)
+
+        self._pattern: re.Pattern | None = None
+        self._patterns: list[re.Pattern] = []
+        if len(rules) == 0:
+            return
+
+        patterns = [re.compile(rule) for rule in rules]
+        if any(pattern.groups > 0 for pattern in patterns):
+            self._patterns = patterns
+            return
+
+        try:
+            with warnings.catch_warnings():
+                # Python 3.10: the flag is applied to all of them, with a warning
+                warnings.simplefilter("error", DeprecationWarning)
+                self._pattern = re.compile("|".join(f"(?:{rule})" for rule in rules))
+        except (re.error, DeprecationWarning):
+            self._patterns = patterns
+
+    def match(self, path: str) -> bool:
+        if self.match_all:
+            return True
+
+        if self._pattern is not None:
+            return self._pattern.match(path) is not None
+
+        for pattern in self._patterns:
+            if pattern.match(path) is not None:
+                return True
+
+        return False
+
+
+DAV_USER_PERMISSION_CACHE_MAX_SIZE = 4096
+
+
 @dataclass
 class DAVUser:
     username: str
@@ -234,31 +284,36 @@ class DAVUser:
             else:
                 raise
 
-    def check_paths_permission(self, paths: list[DAVPath]) -> bool:
-        for path in paths:
-            allow = False
-            for permission in self.permissions_allow:  # allow: or
-                m = re.match(permission, path.raw)
-                if m is not None:
-                    allow = True
-                    break
+        self._rules_allow = _DAVPermissionRules(self.permissions_allow)  # allow: or
+        self._rules_deny = _DAVPermissionRules(self.permissions_deny)  # deny: and
+        # path.raw: bool
+        self._permission_cache = DAVLRUCache(DAV_USER_PERMISSION_CACHE_MAX_SIZE)
 
-            if not allow:
-                return False
+    def _check_path_permission(self, path: str) -> bool:
+        return self._rules_allow.match(path) and not self._rules_deny.match(path)
 
+    def check_paths_permission(self, paths: list[DAVPath]) -> bool:
         for path in paths:
-            allow = True
-            for permission in self.permissions_deny:  # deny: and
-                m = re.match(permission, path.raw)
-                if m is not None:
-                    allow = False
-                    break
+            allow = self._permission_cache.get(path.raw)
+            if allow is None:
+                allow = self._check_path_permission(path.raw)
+                self._permission_cache.set(path.raw, allow)
 
             if not allow:
                 return False
 
         return True
 
+    def filter_paths_permission(self, paths: Iterable[DAVPath]) -> list[DAVPath]:
+        """
+        the allowed ones of paths, for a listing(e.g. PROPFIND); in one pass,
+        without the cache of single path
+        """
+        if self._rules_allow.match_all and len(self.permissions_deny) == 0:
+            return list(paths)
+
+        return [path for path in paths if self._check_path_permission(path.raw)]
+
     def __str__(self):
         return f"{self.username}, allow:{self.permissions_allow}, deny:{self.permissions_deny}"
 
@@ -327,6 +382,17 @@ DEFAULT_HIDE_FILE_IN_DIR_RULES = {
 
 RESPONSE_DATA_BLOCK_SIZE = 64 * 1024
 
+# the limits of XML request body(PROPFIND/PROPPATCH/LOCK)
+REQUEST_BODY_XML_MAX_SIZE = 1024 * 1024
+REQUEST_BODY_XML_MAX_DEPTH = 32
+# the parsed PROPFIND bodies are cached by the body, the clients send the same
+# one again and again
+REQUEST_BODY_PROPFIND_CACHE_MAX_SIZE = 256  # entries
+REQUEST_BODY_PROPFIND_CACHE_MAX_BODY_SIZE = 4096
+
+# the max count of ranges in header Range, the header over it is ignored
+REQUEST_HEADER_RANGE_MAX_COUNT = 64
+
 
 class DAVAcceptEncoding:
     # https://developer.mozilla.org/zh-CN/docs/Web/HTTP/Headers/Content-Encoding
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from time import perf_counter
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections.abc import Callable
+
+
+class DAVExecutor(ThreadPoolExecutor):
+    """
+    A bounded thread pool for the blocking operations, with runtime statistics.
+
+    It can be used anywhere a concurrent.futures.Executor is accepted, like:
+    loop.run_in_executor(), aiofiles.open(executor=...)
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+
+        self.name = name
+        self.max_workers = max_workers
+
+        self._stats_lock = threading.Lock()
+        self.queue_depth = 0  # submitted, but not started
+        self.running = 0
+        self.completed = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _call(self, submit_time: float, fn: Callable, args, kwargs):
+        wait_time = perf_counter() - submit_time
+        with self._stats_lock:
+            self.queue_depth -= 1
+            self.running += 1
+            self.wait_time_total += wait_time
+            if wait_time > self.wait_time_max:
+                self.wait_time_max = wait_time
+
+        try:
+            return fn(*args, **kwargs)
+
+        finally:
+            with self._stats_lock:
+                self.running -= 1
+                self.completed += 1
+
+    def _on_done(self, future: Future):
+        if future.cancelled():
+            # cancelled before start
+            with self._stats_lock:
+                self.queue_depth -= 1
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        with self._stats_lock:
+            self.queue_depth += 1
+
+        try:
+            future = super().submit(self._call, perf_counter(), fn, args, kwargs)
+        except RuntimeError:
+            # executor is shutdown
+            with self._stats_lock:
+                self.queue_depth -= 1
+            raise
+
+        future.add_done_callback(self._on_done)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self, partial(fn, *args, **kwargs)
+        )
+
+    def get_metrics(self) -> dict[str, int | float]:
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "running": self.running,
+                "completed": self.completed,
+                "wait_time_total": round(self.wait_time_total, 6),
+                "wait_time_max": round(self.wait_time_max, 6),
+            }
@@ -2,8 +2,9 @@ from typing import Optional, Union
 import re
 import hashlib
 from pathlib import Path
+from concurrent.futures import Executor
 from mimetypes import guess_type as orig_guess_type
-from collections.abc import Callable, AsyncGenerator
+from collections.abc import Callable, AsyncGenerator, Iterable
 
 import xmltodict
 import aiofiles
@@ -13,15 +14,24 @@ from asgi_webdav.constants import RESPONSE_DATA_BLOCK_SIZE
 from asgi_webdav.config import Config
 
 
-async def receive_all_data_in_one_call(receive: Callable) -> bytes:
-    data = b""
+async def receive_all_data_in_one_call(
+    receive: Callable, max_size: Optional[int] = None
+) -> Optional[bytes]:
+    """return None if the size of body is larger than max_size"""
+    data = []
+    size = 0
     more_body = True
     while more_body:
         request_data = await receive()
-        data += request_data.get("body", b"")
+        chunk = request_data.get("body", b"")
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            return None
+
+        data.append(chunk)
         more_body = request_data.get("more_body")
 
-    return data
+    return b"".join(data)
 
 
 async def empty_data_generator() -> AsyncGenerator[bytes, bool]:
@@ -40,6 +50,11 @@ async def get_data_generator_from_content(
         yield data, more_body
 
 
+async def async_iter(items: Iterable) -> AsyncGenerator:
+    for item in items:
+        yield item
+
+
 def generate_etag(f_size: [float, int], f_modify_time: float) -> str:
     """
     https://tools.ietf.org/html/rfc7232#section-2.3 ETag
@@ -48,6 +63,11 @@ def generate_etag(f_size: [float, int], f_modify_time: float) -> str:
     return f'W/"{hashlib.md5(f"{f_size}{f_modify_time}".encode("utf-8")).hexdigest()}"'
 
 
+def generate_content_etag(content: bytes) -> str:
+    """for the generated content(e.g. the listing of dir browser's page)"""
+    return f'W/"{hashlib.md5(content).hexdigest()}"'
+
+
 def guess_type(
     config: Config, file: Union[str, Path]
 ) -> (Optional[str], Optional[str]):
@@ -81,7 +101,9 @@ def guess_type(
 
 
 async def detect_charset(
-    file: Union[str, Path], content_type: Optional[str]
+    file: Union[str, Path],
+    content_type: Optional[str],
+    executor: Optional[Executor] = None,
 ) -> Optional[str]:
     """
     https://docs.python.org/3/library/codecs.html
@@ -93,7 +115,7 @@ async def detect_charset(
         return None
 
     detector = UniversalDetector()
-    async with aiofiles.open(file, "rb") as fp:
+    async with aiofiles.open(file, "rb", executor=executor) as fp:
         for line in await fp.readlines():
             detector.feed(line)
             if detector.done:
@@ -119,9 +141,11 @@ def is_browser_user_agent(user_agent: Optional[bytes]) -> bool:
     return True
 
 
-def dav_dict2xml(data: dict) -> bytes:
+def dav_dict2xml(data: dict, full_document: bool = True) -> bytes:
     return (
-        xmltodict.unparse(data, short_empty_elements=True)
+        xmltodict.unparse(
+            data, full_document=full_document, short_empty_elements=True
+        )
         .replace("\n", "")
         .encode("utf-8")
     )
@@ -1,43 +1,104 @@
 from typing import Optional
+from collections import deque
+from collections.abc import Container
 import asyncio
+import heapq
 import pprint
 from uuid import UUID, uuid4
 from time import time
+from logging import getLogger
 
 from asgi_webdav.constants import DAVPath, DAVLockScope, DAVLockInfo
 from asgi_webdav.request import DAVRequest
 
+logger = getLogger(__name__)
+
+# seconds, the reaper wakes up at least once in it while there are locks
+_REAPER_MAX_INTERVAL = 10
+# seconds, the window of metrics reaped_per_minute
+_REAP_RATE_WINDOW = 60
+
+
+class _PathTrieNode:
+    __slots__ = ("children", "value")
+
+    def __init__(self):
+        self.children: dict[str, _PathTrieNode] = {}
+        self.value: Optional[tuple[DAVPath, DAVLockScope, set[UUID]]] = None
+
 
 class Path2TokenMap:
     """
     path is request.src_path or request_dst_path
         or request.xxx_path + child
+
+    The locked paths are indexed by a trie of the parts of path, the lookup of
+    a path and its ancestors is O(depth of path).
     """
 
     data: dict[DAVPath, tuple[DAVLockScope, set[UUID]]]
 
     def __init__(self):
         self.data = {}
+        self._root = _PathTrieNode()
 
     def __contains__(self, item: DAVPath):
         return item in self.data
 
+    def __len__(self):
+        return len(self.data)
+
     def keys(self):
         return self.data.keys()
 
+    def _get_node_chain(self, path: DAVPath) -> list[_PathTrieNode]:
+        """the nodes from root to path, stop at the first missing one"""
+        node = self._root
+        chain = [node]
+        for name in path.parts:
+            node = node.children.get(name)
+            if node is None:
+                break
+
+            chain.append(node)
+
+        return chain
+
     def get_tokens(self, path: DAVPath) -> list[UUID]:
+        """the tokens of path and its ancestors"""
         tokens = []
-        for locked_path in self.data.keys():
-            if not path.startswith(locked_path):
-                continue
-
-            tokens += list(self.data.get(locked_path)[1])
+        for node in self._get_node_chain(path):
+            if node.value is not None:
+                tokens += list(node.value[2])
 
         return tokens
 
+    def get_paths(self, prefix: DAVPath) -> list[DAVPath]:
+        """the locked paths under prefix, include itself"""
+        chain = self._get_node_chain(prefix)
+        if len(chain) != prefix.count + 1:
+            return []
+
+        paths = []
+        nodes = [chain[-1]]
+        while nodes:
+            node = nodes.pop()
+            if node.value is not None:
+                paths.append(node.value[0])
+
+            nodes.extend(node.children.values())
+
+        return paths
+
     def add(self, path: DAVPath, scope: DAVLockScope, token: UUID) -> bool:
         if path not in self.data:
-            self.data[path] = (scope, {token})
+            node = self._root
+            for name in path.parts:
+                node = node.children.setdefault(name, _PathTrieNode())
+
+            tokens = {token}
+            node.value = (path, scope, tokens)
+            self.data[path] = (scope, tokens)
             return True
 
         if scope == DAVLockScope.exclusive:
@@ -54,16 +115,38 @@ class Path2TokenMap:
         if len(self.data[path][1]) == 0:
             self.data.pop(path)
 
+            chain = self._get_node_chain(path)
+            chain[-1].value = None
+            # prune the empty branch
+            for index in range(len(chain) - 1, 0, -1):
+                node = chain[index]
+                if node.value is not None or len(node.children) > 0:
+                    break
+
+                chain[index - 1].children.pop(path.parts[index - 1])
+
         return True
 
 
 class DAVLock:
+    """
+    The expired locks are removed by a background reaper task, it's started by
+    the first new lock, and exits when there is no lock.
+    """
+
     def __init__(self):
         self.lock = asyncio.Lock()
 
         self.path2token_map = Path2TokenMap()
         self.lock_map: dict[UUID, DAVLockInfo] = {}
 
+        # (expire, token), the item is stale if the lock is refreshed/released
+        self._expire_heap: list[tuple[float, UUID]] = []
+        self._reaper_task: Optional[asyncio.Task] = None
+
+        self.reaped = 0
+        self._reap_history: deque[tuple[float, int]] = deque()
+
     async def new(self, request: DAVRequest) -> Optional[DAVLockInfo]:
         """return None if create lock failed"""
         async with self.lock:
@@ -82,6 +165,8 @@ class DAVLock:
             if not success:
                 return None
             self.lock_map[info.token] = info
+            heapq.heappush(self._expire_heap, (info.expire, info.token))
+            self._start_reaper()
 
             return info
 
@@ -90,6 +175,7 @@ class DAVLock:
             if info := self.lock_map.get(token):
                 info.update_expire()
                 self.lock_map[token] = info
+                heapq.heappush(self._expire_heap, (info.expire, info.token))
                 return info
 
         return None
@@ -110,6 +196,64 @@ class DAVLock:
         self._remove_token(info.path, token)
         return None
 
+    def _reap(self, timestamp: float) -> int:
+        count = 0
+        heap = self._expire_heap
+        while heap and heap[0][0] <= timestamp:
+            expire, token = heapq.heappop(heap)
+            info = self.lock_map.get(token)
+            if info is None or info.expire > timestamp:
+                # released or refreshed
+                continue
+
+            self._remove_token(info.path, token)
+            count += 1
+
+        return count
+
+    async def _run_reaper(self):
+        while True:
+            async with self.lock:
+                timestamp = time()
+                count = self._reap(timestamp)
+                if count > 0:
+                    self.reaped += count
+                    self._reap_history.append((timestamp, count))
+                    self._prune_reap_history(timestamp)
+                    logger.debug(f"reaped {count} expired lock(s)")
+
+                if len(self.lock_map) == 0:
+                    # the stale items
+                    self._expire_heap.clear()
+                    self._reaper_task = None
+                    return
+
+                delay = self._expire_heap[0][0] - timestamp
+
+            await asyncio.sleep(min(max(delay, 0), _REAPER_MAX_INTERVAL))
+
+    def _start_reaper(self):
+        task = self._reaper_task
+        if task is not None and not task.done():
+            if task.get_loop() is asyncio.get_running_loop():
+                return
+
+        self._reaper_task = asyncio.create_task(self._run_reaper())
+
+    def _prune_reap_history(self, timestamp: float):
+        history = self._reap_history
+        while history and history[0][0] < timestamp - _REAP_RATE_WINDOW:
+            history.popleft()
+
+    def get_metrics(self) -> dict[str, int | float]:
+        self._prune_reap_history(time())
+        return {
+            "active_locks": len(self.lock_map),
+            "locked_paths": len(self.path2token_map),
+            "reaped": self.reaped,
+            "reaped_per_minute": sum(count for _, count in self._reap_history),
+        }
+
     async def is_locking(self, path: DAVPath, owner_token: UUID = None) -> bool:
         async with self.lock:
             timestamp = time()
@@ -137,6 +281,38 @@ class DAVLock:
 
         return result
 
+    async def get_info_by_paths(
+        self, prefix: DAVPath, paths: Optional[Container[DAVPath]] = None
+    ) -> dict[DAVPath, list[DAVLockInfo]]:
+        """
+        the bulk version of get_info_by_path(), in one pass under a single
+        acquisition of the lock
+        prefix: only the locked paths under it
+        paths: only the locked paths in it, None means all
+        """
+        result = {}
+        if len(self.lock_map) == 0:
+            return result
+
+        async with self.lock:
+            timestamp = time()
+            for path in self.path2token_map.get_paths(prefix):
+                if paths is not None and path not in paths:
+                    continue
+                if path not in self.path2token_map:
+                    # removed by _get_lock_info(), it's expired
+                    continue
+
+                infos = [
+                    info
+                    for token in self.path2token_map.get_tokens(path)
+                    if (info := self._get_lock_info(token, timestamp))
+                ]
+                if len(infos) > 0:
+                    result[path] = infos
+
+        return result
+
     async def get_info_by_token(self, token: UUID) -> Optional[DAVLockInfo]:
         async with self.lock:
             if info := self._get_lock_info(token):
@@ -0,0 +1,309 @@
+from typing import Optional
+import os
+import sqlite3
+import threading
+from stat import S_ISDIR
+from pathlib import Path
+from concurrent.futures import Future
+from collections.abc import Container
+from uuid import UUID, uuid4
+from time import time
+from logging import getLogger
+
+from asgi_webdav.constants import DAVPath, DAVDepth, DAVLockScope, DAVLockInfo
+from asgi_webdav.executor import DAVExecutor
+from asgi_webdav.exception import ProviderInitException
+from asgi_webdav.request import DAVRequest
+
+logger = getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dav_lock (
+    token TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    depth TEXT NOT NULL,
+    timeout INTEGER NOT NULL,
+    expire REAL NOT NULL,
+    scope INTEGER NOT NULL,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS dav_lock_path ON dav_lock (path);
+CREATE INDEX IF NOT EXISTS dav_lock_expire ON dav_lock (expire);
+"""
+
+_COLUMNS = "path, depth, timeout, expire, scope, owner, token"
+
+# milliseconds, waiting for the write lock of database held by other process
+_BUSY_TIMEOUT = 5000
+
+
+def get_default_db_path() -> str:
+    """
+    lock.sqlite3 in the private directory of the user, a file in a shared
+    directory(e.g. /tmp) can be created or replaced(symlink) by other users
+    """
+    cache_path = os.getenv("XDG_CACHE_HOME") or Path.home().joinpath(".cache")
+    path = Path(cache_path).joinpath("asgi-webdav")
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    stat_result = path.lstat()
+    if (
+        not S_ISDIR(stat_result.st_mode)
+        or (hasattr(os, "getuid") and stat_result.st_uid != os.getuid())
+        or stat_result.st_mode & 0o077
+    ):
+        raise ProviderInitException(
+            f"The directory of lock store {path} is not private(0700 and owned by"
+            " the user), set LockStore.sqlite_path explicitly"
+        )
+
+    return str(path.joinpath("lock.sqlite3"))
+
+
+def _get_self_and_ancestors(path: DAVPath) -> list[str]:
+    return ["/" + "/".join(path.parts[:index]) for index in range(path.count + 1)]
+
+
+def _row_to_info(row: tuple) -> DAVLockInfo:
+    path, depth, timeout, expire, scope, owner, token = row
+    info = DAVLockInfo(
+        path=DAVPath(path),
+        depth=DAVDepth[depth],
+        timeout=timeout,
+        scope=DAVLockScope(scope),
+        owner=owner,
+        token=UUID(token),
+    )
+    info.expire = expire
+    return info
+
+
+class DAVSQLiteLock:
+    """
+    The lock store in a SQLite database file(WAL mode), it's shared by the
+    worker processes on the same host. The interface is the same as DAVLock.
+
+    All the database operations run in a single thread, the connection is
+    only used by it. The writing is serialized by SQLite, across processes.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, name: str = "DAVSQLiteLock"):
+        """db_path: None means get_default_db_path()"""
+        if db_path is None:
+            db_path = get_default_db_path()
+
+        self.db_path = db_path
+        self.executor = DAVExecutor(name=name, max_workers=1)
+
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_lock = threading.Lock()
+
+        self.reaped = 0
+
+        # the counters in database, updated in the thread of executor
+        self._metrics: dict[str, int] = {"active_locks": 0, "locked_paths": 0}
+        self._metrics_future: Optional[Future] = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        with self._connection_lock:
+            if self._connection is None:
+                connection = sqlite3.connect(
+                    self.db_path,
+                    timeout=_BUSY_TIMEOUT / 1000,
+                    isolation_level=None,  # autocommit, use BEGIN explicitly
+                    check_same_thread=False,
+                )
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                connection.execute(f"PRAGMA busy_timeout={_BUSY_TIMEOUT}")
+                connection.executescript(_SCHEMA)
+                self._connection = connection
+
+            return self._connection
+
+    def _select_infos(
+        self, connection: sqlite3.Connection, where: str, params: tuple
+    ) -> list[DAVLockInfo]:
+        cursor = connection.execute(
+            f"SELECT {_COLUMNS} FROM dav_lock WHERE expire > ? AND {where}",
+            (time(),) + params,
+        )
+        return [_row_to_info(row) for row in cursor.fetchall()]
+
+    def _select_infos_by_path(
+        self, connection: sqlite3.Connection, path: DAVPath
+    ) -> list[DAVLockInfo]:
+        """the locks of path and its ancestors"""
+        paths = _get_self_and_ancestors(path)
+        return self._select_infos(
+            connection,
+            f"path IN ({', '.join('?' * len(paths))}) ORDER BY length(path)",
+            tuple(paths),
+        )
+
+    def _new(self, request: DAVRequest) -> Optional[DAVLockInfo]:
+        info = DAVLockInfo(
+            path=request.src_path,
+            depth=request.depth,
+            timeout=request.timeout,
+            scope=request.lock_scope,
+            owner=request.lock_owner,
+            token=uuid4(),
+        )
+
+        connection = self._get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            timestamp = time()
+            reaped = connection.execute(
+                "DELETE FROM dav_lock WHERE expire <= ?", (timestamp,)
+            ).rowcount
+            self.reaped += reaped
+
+            exists = connection.execute(
+                "SELECT 1 FROM dav_lock WHERE path = ? LIMIT 1",
+                (info.path.raw,),
+            ).fetchone()
+            if exists and info.scope == DAVLockScope.exclusive:
+                connection.execute("ROLLBACK")
+                return None
+
+            connection.execute(
+                f"INSERT INTO dav_lock ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    info.path.raw,
+                    info.depth.name,
+                    info.timeout,
+                    info.expire,
+                    info.scope.value,
+                    info.owner,
+                    str(info.token),
+                ),
+            )
+            connection.execute("COMMIT")
+
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return info
+
+    async def new(self, request: DAVRequest) -> Optional[DAVLockInfo]:
+        """return None if create lock failed"""
+        return await self.executor.run(self._new, request)
+
+    def _refresh(self, token: UUID) -> Optional[DAVLockInfo]:
+        connection = self._get_connection()
+        timestamp = time()
+        cursor = connection.execute(
+            "UPDATE dav_lock SET expire = ? + timeout WHERE token = ? AND expire > ?",
+            (timestamp, str(token), timestamp),
+        )
+        if cursor.rowcount == 0:
+            return None
+
+        infos = self._select_infos(connection, "token = ?", (str(token),))
+        return infos[0] if infos else None
+
+    async def refresh(self, token: UUID) -> Optional[DAVLockInfo]:
+        return await self.executor.run(self._refresh, token)
+
+    def _is_locking(self, path: DAVPath, owner_token: UUID = None) -> bool:
+        infos = self._select_infos_by_path(self._get_connection(), path)
+        for info in infos:
+            if info.token == owner_token:
+                return False
+
+        return len(infos) > 0
+
+    async def is_locking(self, path: DAVPath, owner_token: UUID = None) -> bool:
+        return await self.executor.run(self._is_locking, path, owner_token)
+
+    def _get_info_by_path(self, path: DAVPath) -> list[DAVLockInfo]:
+        infos = self._select_infos_by_path(self._get_connection(), path)
+        if all(info.path != path for info in infos):
+            return []
+
+        return infos
+
+    async def get_info_by_path(self, path: DAVPath) -> list[DAVLockInfo]:
+        return await self.executor.run(self._get_info_by_path, path)
+
+    def _get_info_by_paths(
+        self, prefix: DAVPath, paths: Optional[Container[DAVPath]]
+    ) -> dict[DAVPath, list[DAVLockInfo]]:
+        connection = self._get_connection()
+        if prefix.count == 0:
+            infos = self._select_infos(connection, "1", ())
+        else:
+            # "/" < "0", all the descendants are in [prefix + "/", prefix + "0")
+            infos = self._select_infos(
+                connection,
+                "(path = ? OR (path >= ? AND path < ?))",
+                (prefix.raw, prefix.raw + "/", prefix.raw + "0"),
+            )
+
+        result = {}
+        for info in infos:
+            if paths is not None and info.path not in paths:
+                continue
+
+            result[info.path] = self._select_infos_by_path(connection, info.path)
+
+        return result
+
+    async def get_info_by_paths(
+        self, prefix: DAVPath, paths: Optional[Container[DAVPath]] = None
+    ) -> dict[DAVPath, list[DAVLockInfo]]:
+        """see DAVLock.get_info_by_paths()"""
+        return await self.executor.run(self._get_info_by_paths, prefix, paths)
+
+    def _get_info_by_token(self, token: UUID) -> Optional[DAVLockInfo]:
+        infos = self._select_infos(self._get_connection(), "token = ?", (str(token),))
+        return infos[0] if infos else None
+
+    async def get_info_by_token(self, token: UUID) -> Optional[DAVLockInfo]:
+        return await self.executor.run(self._get_info_by_token, token)
+
+    def _release(self, token: UUID) -> bool:
+        cursor = self._get_connection().execute(
+            "DELETE FROM dav_lock WHERE token = ?", (str(token),)
+        )
+        return cursor.rowcount > 0
+
+    async def release(self, token: UUID) -> bool:
+        return await self.executor.run(self._release, token)
+
+    def _update_metrics(self):
+        try:
+            active_locks, locked_paths = (
+                self._get_connection()
+                .execute(
+                    "SELECT count(*), count(DISTINCT path) FROM dav_lock"
+                    " WHERE expire > ?",
+                    (time(),),
+                )
+                .fetchone()
+            )
+        except sqlite3.Error as e:
+            logger.error(f"get metrics of lock failed: {e}")
+            return
+
+        self._metrics = {"active_locks": active_locks, "locked_paths": locked_paths}
+
+    async def update_metrics(self):
+        await self.executor.run(self._update_metrics)
+
+    def get_metrics(self) -> dict[str, int | float]:
+        """
+        it's called in the event loop, never wait for the database: return the
+        last counters, and update them in the executor for the next call
+        """
+        if self._metrics_future is None or self._metrics_future.done():
+            try:
+                self._metrics_future = self.executor.submit(self._update_metrics)
+            except RuntimeError:
+                # executor is shutdown
+                pass
+
+        return {**self._metrics, "reaped": self.reaped}
@@ -0,0 +1,14 @@
+"""
+Runtime statistics of the components, display in page: /_/admin/metrics
+"""
+from collections.abc import Callable
+
+_metrics_getters: dict[str, Callable[[], dict[str, int | float]]] = {}
+
+
+def register_metrics(name: str, getter: Callable[[], dict[str, int | float]]):
+    _metrics_getters[name] = getter
+
+
+def get_metrics() -> dict[str, dict[str, int | float]]:
+    return {name: getter() for name, getter in _metrics_getters.items()}
@@ -36,6 +36,19 @@ class DAVPropertyBasicData:
     def etag(self) -> str:
         return generate_etag(self.content_length, self.last_modified.timestamp)
 
+    @property
+    def fingerprint(self) -> tuple:
+        """changed when any item of as_dict() is changed, it's cheaper than etag"""
+        return (
+            self.is_collection,
+            self.display_name,
+            self.creation_date.timestamp,
+            self.last_modified.timestamp,
+            self.content_type,
+            self.content_length,
+            self.content_encoding,
+        )
+
     def get_get_head_response_headers(self) -> dict[bytes, bytes]:
         if self.content_type.startswith("text/") and self.content_charset:
             content_type = f"{self.content_type}; charset={self.content_charset}"
@@ -1,22 +1,31 @@
 from typing import Optional
+from copy import copy
+from contextlib import aclosing
 from urllib.parse import quote as encode_path_name_for_url
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, AsyncIterable
 from logging import getLogger
 
 
 from asgi_webdav.constants import (
     DAV_METHODS,
     DAVPath,
+    DAVDepth,
     DAVLockInfo,
     DAVPropertyIdentity,
+    DAVTime,
+    RESPONSE_DATA_BLOCK_SIZE,
 )
-from asgi_webdav.config import Config
+from asgi_webdav.config import Config, LockStoreBackend
+from asgi_webdav.cache import DAVLRUCache
+from asgi_webdav.metrics import register_metrics
 from asgi_webdav.property import DAVPropertyBasicData, DAVProperty
-from asgi_webdav.response import DAVResponse, DAVResponseType
+from asgi_webdav.response import DAVResponse, DAVResponseType, DAVFileBody
 from asgi_webdav.helpers import receive_all_data_in_one_call, dav_dict2xml
+from asgi_webdav.xml_writer import DAVMultiStatusWriter, write_element
 
 from asgi_webdav.request import DAVRequest
 from asgi_webdav.lock import DAVLock
+from asgi_webdav.lock_sqlite import DAVSQLiteLock
 
 logger = getLogger(__name__)
 
@@ -38,7 +47,24 @@ class DAVProvider:
         self.home_dir = home_dir
         self.read_only = read_only  # TODO
 
-        self.dav_lock = DAVLock()
+        name = f"{type(self).__name__}({self.prefix}) lock"
+        if self.config.lock_store.backend == LockStoreBackend.SQLITE:
+            self.dav_lock = DAVSQLiteLock(self.config.lock_store.sqlite_path, name)
+        else:
+            self.dav_lock = DAVLock()
+        register_metrics(name, self.dav_lock.get_metrics)
+
+        # the rendered <D:response> of resources, key: href path
+        self.propfind_response_cache: Optional[DAVLRUCache] = None
+        cache_config = self.config.propfind_response_cache
+        if cache_config.enable:
+            self.propfind_response_cache = DAVLRUCache(
+                max_size=cache_config.max_size, get_weight=lambda item: len(item[1])
+            )
+            register_metrics(
+                f"{type(self).__name__}({self.prefix}) propfind response cache",
+                self.propfind_response_cache.get_metrics,
+            )
 
         # https://developer.mozilla.org/zh-CN/docs/Web/HTTP/Headers/Accept-Ranges
         self.support_content_range: bool = False
@@ -46,15 +72,6 @@ class DAVProvider:
     def __repr__(self):
         raise NotImplementedError
 
-    @staticmethod
-    def _create_ns_key_with_id(ns_map: dict[str, str], ns: str, key: str) -> str:
-        if not ns:
-            # no namespace
-            return key
-
-        ns_id = ns_map.setdefault(ns, f"ns{len(ns_map) + 1}")
-        return f"{ns_id}:{key}"
-
     @staticmethod
     def _create_data_lock_discovery(lock_info: DAVLockInfo) -> dict:
         return {
@@ -115,99 +132,252 @@ class DAVProvider:
     async def _do_propfind(self, request: DAVRequest) -> dict[DAVPath, DAVProperty]:
         raise NotImplementedError
 
-    async def create_propfind_response(
-        self, request: DAVRequest, dav_properties: dict[DAVPath, DAVProperty]
+    def _create_sub_request(
+        self, request: DAVRequest, src_path: DAVPath, depth: DAVDepth
+    ) -> DAVRequest:
+        sub_request = copy(request)
+        sub_request.src_path = src_path
+        sub_request.depth = depth
+        sub_request.update_distribute_info(self.prefix)
+        return sub_request
+
+    @staticmethod
+    def _is_excluded_path(path: DAVPath, excluded_paths: list[DAVPath]) -> bool:
+        return any(path.startswith(excluded_path) for excluded_path in excluded_paths)
+
+    async def do_propfind_depth_infinity(
+        self, request: DAVRequest, excluded_paths: list[DAVPath]
+    ) -> AsyncGenerator[DAVProperty, None]:
+        """
+        Walk the tree lazily(depth first) with depth 1 PROPFIND, only the children
+        of one collection are held in memory.
+
+        excluded_paths: the prefix of other providers mounted inside this tree
+        """
+        dav_properties = await self._do_propfind(
+            self._create_sub_request(request, request.src_path, DAVDepth.d0)
+        )
+        dav_property = dav_properties.get(request.src_path)
+        if dav_property is None:
+            return
+
+        yield dav_property
+        if not dav_property.is_collection:
+            return
+
+        collections = [request.src_path]
+        while len(collections) > 0:
+            href_path = collections.pop()
+            dav_properties = await self._do_propfind(
+                self._create_sub_request(request, href_path, DAVDepth.d1)
+            )
+            for path, dav_property in dav_properties.items():
+                if path == href_path or self._is_excluded_path(path, excluded_paths):
+                    continue
+
+                yield dav_property
+                if dav_property.is_collection:
+                    collections.append(path)
+
+    async def count_propfind_depth_infinity(
+        self, request: DAVRequest, excluded_paths: list[DAVPath], limit: int
+    ) -> int:
+        """
+        the entry count of depth infinity PROPFIND, stop counting over limit;
+        it's called before do_propfind_depth_infinity(), so the tree is walked
+        twice. This fallback creates the properties of all entries, override it
+        with a cheaper count(e.g. listing the names only).
+        """
+        count = 0
+        async with aclosing(
+            self.do_propfind_depth_infinity(request, excluded_paths)
+        ) as dav_properties:
+            async for _ in dav_properties:
+                count += 1
+                if count > limit:
+                    break
+
+        return count
+
+    def _invalidate_propfind_response(self, path: DAVPath, recursive: bool = False):
+        if self.propfind_response_cache is None:
+            return
+
+        if recursive:
+            self.propfind_response_cache.pop_matching(lambda key: key.startswith(path))
+        else:
+            self.propfind_response_cache.pop(path)
+
+    def _create_propfind_response_fragment(
+        self,
+        request: DAVRequest,
+        dav_property: DAVProperty,
+        lock_infos: dict[DAVPath, list[DAVLockInfo]],
+        writer: DAVMultiStatusWriter,
     ) -> bytes:
-        response = []
-        ns_map = {}
-        for dav_property in dav_properties.values():
-            href_path = dav_property.href_path
-            # basic data
-            property_basic_data = dav_property.basic_data.as_dict()
-            if request.propfind_fetch_all_property:
-                basic_keys = property_basic_data.keys()
-            else:
-                basic_keys = request.propfind_basic_keys
-
-            found_property = {
-                f"D:{k}": property_basic_data[k]
-                for k in basic_keys
-                if k in property_basic_data
-            }
+        """
+        the <D:response> of one resource
+        lock_infos: from DAVLock.get_info_by_paths()
+
+        The fragment of the unlocked resource is cached, the cached one is
+        reused while the data of resource and the requested properties are
+        unchanged. It declares the namespaces it used, so it's valid in any
+        multistatus document.
+        """
+        href_path = dav_property.href_path
+        lock_info = lock_infos.get(href_path, [])
+        if self.propfind_response_cache is None or len(lock_info) > 0:
+            return self._render_propfind_response_fragment(
+                request, dav_property, lock_info, writer
+            )
+
+        if request.propfind_fetch_all_property:
+            requested_keys = None
+        else:
+            requested_keys = frozenset(request.propfind_basic_keys)
+        validator = (
+            requested_keys,
+            dav_property.is_collection,
+            dav_property.basic_data.fingerprint,
+            tuple(dav_property.extra_data.items()),
+            tuple(dav_property.extra_not_found),
+        )
+        cached = self.propfind_response_cache.get(href_path)
+        if cached is not None and cached[0] == validator:
+            return cached[1]
 
-            if dav_property.is_collection:
-                found_property["D:resourcetype"] = {"D:collection": None}
-            else:
-                found_property["D:resourcetype"] = None
-
-            # extra data
-            for (ns, key), value in dav_property.extra_data.items():
-                ns_id = self._create_ns_key_with_id(ns_map, ns, key)
-                found_property[ns_id] = value
-
-            # lock
-            lock_info = await self.dav_lock.get_info_by_path(href_path)
-            if len(lock_info) > 0:
-                # TODO!!!! multi-token
-                lock_discovery = self._create_data_lock_discovery(lock_info[0])
-            else:
-                lock_discovery = None
-
-            # found_property.update(
-            #     {
-            #         "D:supportedlock": {
-            #             "D:lockentry": [
-            #                 {
-            #                     "D:lockscope": {"D:exclusive": None},
-            #                     "D:locktype": {"D:write": None},
-            #                 },
-            #                 {
-            #                     "D:lockscope": {"D:shared": None},
-            #                     "D:locktype": {"D:write": None},
-            #                 },
-            #             ]
-            #         }
-            #     }
-            # )
-
-            response_item = {
-                "D:href": encode_path_name_for_url(href_path.raw),
-                "D:propstat": [
-                    {
-                        "D:prop": found_property,
-                        "D:lockdiscovery": lock_discovery,
-                        "D:status": "HTTP/1.1 200 OK",
-                    },
-                ],
-            }
+        fragment = self._render_propfind_response_fragment(
+            request, dav_property, lock_info, writer
+        )
+        self.propfind_response_cache.set(href_path, (validator, fragment))
+        return fragment
 
-            # extra not found
-            if len(dav_property.extra_not_found) > 0:
-                not_found_property = {}
-                for ns, key in dav_property.extra_not_found:
-                    ns_id = self._create_ns_key_with_id(ns_map, ns, key)
-                    not_found_property[ns_id] = None
+    def _render_propfind_response_fragment(
+        self,
+        request: DAVRequest,
+        dav_property: DAVProperty,
+        lock_info: list[DAVLockInfo],
+        writer: DAVMultiStatusWriter,
+    ) -> bytes:
+        href_path = dav_property.href_path
+        used_ns = set()
 
-                not_found_property = {
-                    "D:prop": not_found_property,
-                    "D:status": "HTTP/1.1 404 Not Found",
-                }
-                response_item["D:propstat"].append(not_found_property)
+        # basic data
+        property_basic_data = dav_property.basic_data.as_dict()
+        if request.propfind_fetch_all_property:
+            basic_keys = property_basic_data.keys()
+        else:
+            basic_keys = request.propfind_basic_keys
 
-            # namespace
-            # TODO ns0 => DAV:
-            for k, v in ns_map.items():
-                response_item[f"@xmlns:{v}"] = k
+        found_elements = []
+        for k in basic_keys:
+            if k in property_basic_data:
+                write_element(found_elements, f"D:{k}", property_basic_data[k])
 
-            response.append(response_item)
+        if dav_property.is_collection:
+            found_elements.append("<D:resourcetype><D:collection/></D:resourcetype>")
+        else:
+            found_elements.append("<D:resourcetype/>")
 
-        data = {
-            "D:multistatus": {
-                "@xmlns:D": "DAV:",
-                "D:response": response,
-            }
-        }
-        return dav_dict2xml(data)
+        # extra data
+        for (ns, key), value in dav_property.extra_data.items():
+            write_element(found_elements, writer.get_tag(ns, key, used_ns), value)
+
+        # lock
+        if len(lock_info) > 0:
+            # TODO!!!! multi-token
+            lock_discovery = self._create_data_lock_discovery(lock_info[0])
+        else:
+            lock_discovery = None
+        write_element(found_elements, "D:lockdiscovery", lock_discovery)
+
+        # found_property.update(
+        #     {
+        #         "D:supportedlock": {
+        #             "D:lockentry": [
+        #                 {
+        #                     "D:lockscope": {"D:exclusive": None},
+        #                     "D:locktype": {"D:write": None},
+        #                 },
+        #                 {
+        #                     "D:lockscope": {"D:shared": None},
+        #                     "D:locktype": {"D:write": None},
+        #                 },
+        #             ]
+        #         }
+        #     }
+        # )
+
+        propstats = [("HTTP/1.1 200 OK", found_elements)]
+
+        # extra not found
+        if len(dav_property.extra_not_found) > 0:
+            not_found_elements = [
+                f"<{writer.get_tag(ns, key, used_ns)}/>"
+                for ns, key in dav_property.extra_not_found
+            ]
+            propstats.append(("HTTP/1.1 404 Not Found", not_found_elements))
+
+        return writer.write_response(
+            encode_path_name_for_url(href_path.raw), propstats, used_ns
+        )
+
+    async def create_propfind_response(
+        self, request: DAVRequest, dav_properties: dict[DAVPath, DAVProperty]
+    ) -> bytes:
+        lock_infos = await self.dav_lock.get_info_by_paths(
+            request.src_path, dav_properties.keys()
+        )
+        writer = DAVMultiStatusWriter()
+        fragments = [writer.start()]
+        for dav_property in dav_properties.values():
+            fragments.append(
+                self._create_propfind_response_fragment(
+                    request, dav_property, lock_infos, writer
+                )
+            )
+
+        fragments.append(writer.end())
+        return b"".join(fragments)
+
+    async def create_propfind_response_generator(
+        self,
+        request: DAVRequest,
+        dav_properties: AsyncIterable[DAVProperty],
+        status_responses: dict[DAVPath, str] | None = None,
+    ) -> AsyncGenerator[tuple[bytes, bool], None]:
+        """
+        the streaming version of create_propfind_response(), the data is sent
+        while the dav_properties is producing
+        status_responses: {href path: status}, the resources without property,
+            e.g. the child provider is timeout
+        """
+        # the locks are looked up once, when the response starts
+        lock_infos = await self.dav_lock.get_info_by_paths(request.src_path)
+        writer = DAVMultiStatusWriter()
+        fragments = [writer.start()]
+        size = 0
+        async for dav_property in dav_properties:
+            fragment = self._create_propfind_response_fragment(
+                request, dav_property, lock_infos, writer
+            )
+            fragments.append(fragment)
+            size += len(fragment)
+            if size >= RESPONSE_DATA_BLOCK_SIZE:
+                yield b"".join(fragments), True
+                fragments.clear()
+                size = 0
+
+        if status_responses:
+            for href_path, status in status_responses.items():
+                fragments.append(
+                    writer.write_status_response(
+                        encode_path_name_for_url(href_path.raw), status
+                    )
+                )
+
+        fragments.append(writer.end())
+        yield b"".join(fragments), False
 
     """
     https://tools.ietf.org/html/rfc4918#page-44
@@ -252,6 +422,7 @@ class DAVProvider:
             return DAVResponse(423)
 
         http_status = await self._do_proppatch(request)
+        self._invalidate_propfind_response(request.src_path)
         if http_status == 207:
             sucess_ids = [x[0] for x in request.proppatch_entries]
             message = self._create_proppatch_response(request, sucess_ids)
@@ -323,6 +494,7 @@ class DAVProvider:
             return DAVResponse(415)
 
         http_status = await self._do_mkcol(request)
+        self._invalidate_propfind_response(request.src_path)
         return DAVResponse(http_status)
 
     async def _do_mkcol(self, request: DAVRequest) -> int:
@@ -411,14 +583,65 @@ class DAVProvider:
     ) -> tuple[int, Optional[DAVPropertyBasicData], Optional[AsyncGenerator]]:
         # 404, None, None
         # 200, DAVPropertyBasicData, None  # is_dir
-        # 200/206, DAVPropertyBasicData, AsyncGenerator  # is_file
+        # 200, DAVPropertyBasicData, AsyncGenerator  # is_file, the whole file
         #
         # self._create_get_head_response_headers()
         raise NotImplementedError
 
+    async def do_get_content_range(
+        self,
+        request: DAVRequest,
+        property_basic_data: DAVPropertyBasicData,
+        start: int,
+        end: int,
+    ) -> AsyncGenerator | DAVFileBody:
+        """the byte range [start, end] of file, when support_content_range is True"""
+        return await self._do_get_content_range(
+            request, property_basic_data, start, end
+        )
+
+    async def _do_get_content_range(
+        self,
+        request: DAVRequest,
+        property_basic_data: DAVPropertyBasicData,
+        start: int,
+        end: int,
+    ) -> AsyncGenerator | DAVFileBody:
+        raise NotImplementedError
+
+    @staticmethod
+    def create_preconditions_response(
+        request: DAVRequest, etag: str, last_modified: DAVTime
+    ) -> Optional[DAVResponse]:
+        """
+        GET/HEAD, response 304/412 if the precondition(If-Match, If-None-Match...)
+        is failed, else None
+        """
+        http_status = request.evaluate_preconditions(etag, last_modified.timestamp)
+        if http_status is None:
+            return None
+
+        if http_status == 304:
+            # rfc7232:4.1, with the validators of the selected representation
+            return DAVResponse(
+                304,
+                headers={
+                    b"ETag": etag.encode("utf-8"),
+                    b"Last-Modified": last_modified.http_date().encode("utf-8"),
+                },
+                response_type=DAVResponseType.UNDECIDED,
+            )
+
+        return DAVResponse(http_status)
+
     async def do_head(self, request: DAVRequest) -> DAVResponse:
         http_status, property_basic_data = await self._do_head(request)
         if http_status == 200:
+            if response := self.create_preconditions_response(
+                request, property_basic_data.etag, property_basic_data.last_modified
+            ):
+                return response
+
             headers = property_basic_data.get_get_head_response_headers()
             if self.support_content_range:
                 headers.update(
@@ -520,6 +743,7 @@ class DAVProvider:
             return DAVResponse(423)
 
         http_status = await self._do_delete(request)
+        self._invalidate_propfind_response(request.src_path, recursive=True)
         if http_status == 204:
             await self.dav_lock.release(request.lock_token)
 
@@ -589,6 +813,7 @@ class DAVProvider:
             return DAVResponse(423)
 
         http_status = await self._do_put(request)
+        self._invalidate_propfind_response(request.src_path)
         return DAVResponse(http_status)
 
     async def _do_put(self, request: DAVRequest) -> int:
@@ -658,6 +883,7 @@ class DAVProvider:
             return DAVResponse(423)
 
         http_status = await self._do_copy(request)
+        self._invalidate_propfind_response(request.dst_path, recursive=True)
         return DAVResponse(http_status)
 
     async def _do_copy(self, request: DAVRequest) -> int:
@@ -722,6 +948,8 @@ class DAVProvider:
             return DAVResponse(423)
 
         http_status = await self._do_move(request)
+        self._invalidate_propfind_response(request.src_path, recursive=True)
+        self._invalidate_propfind_response(request.dst_path, recursive=True)
         # )
         return DAVResponse(http_status)
 
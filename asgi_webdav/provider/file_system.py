@@ -1,14 +1,18 @@
 from typing import Optional
+import os
 import shutil
 import json
+import asyncio
 from stat import S_ISDIR
 from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import Executor, Future, wait
+from collections import deque
 from collections.abc import AsyncGenerator
 from logging import getLogger
 
 
 import aiofiles
-from aiofiles.os import stat as aio_stat
 
 from asgi_webdav.constants import (
     DAVPath,
@@ -18,11 +22,22 @@ from asgi_webdav.constants import (
     DAVPropertyPatches,
     RESPONSE_DATA_BLOCK_SIZE,
 )
+from asgi_webdav.config import MetadataCacheInvalidation, ProviderReadAhead
 from asgi_webdav.property import DAVPropertyBasicData, DAVProperty
 from asgi_webdav.exception import ProviderInitException
 from asgi_webdav.helpers import generate_etag, guess_type, detect_charset
+from asgi_webdav.cache import DAVLRUCache
+from asgi_webdav.executor import DAVExecutor
+from asgi_webdav.metrics import register_metrics
 from asgi_webdav.request import DAVRequest
+from asgi_webdav.response import DAVFileBody
 from asgi_webdav.provider.dev_provider import DAVProvider
+from asgi_webdav.provider.file_system_watcher import FileSystemWatcher
+from asgi_webdav.provider.file_system_open_file_cache import (
+    OpenFile,
+    OpenFileCache,
+    get_file_identity,
+)
 
 
 logger = getLogger(__name__)
@@ -38,6 +53,30 @@ DAV_EXTENSION_INFO_FILE_EXTENSION = "WebDAV"
 """
 
 
+@dataclass
+class FileSystemMetadata:
+    basic_data: DAVPropertyBasicData
+    extra_property_exists: bool  # the .WebDAV file exists
+    identity: tuple  # (st_dev, st_ino, st_mtime_ns, st_size)
+    watched_paths: list[Path]  # the references of watch held by it
+
+
+@dataclass
+class FileSystemStat:
+    stat_result: os.stat_result
+    extra_property_exists: bool
+    is_watched: bool  # the change of it can be caught by FileSystemWatcher
+    watched_paths: list[Path]  # the references of watch, see FileSystemWatcher
+
+
+@dataclass
+class FileSystemListingEntry:
+    fs_path: Path
+    metadata: Optional[FileSystemMetadata] = None  # hit the metadata cache
+    fs_stat: Optional[FileSystemStat] = None  # miss the metadata cache
+    extra_data: Optional[dict[DAVPropertyIdentity, str]] = None
+
+
 def _parser_property_from_json(data) -> dict[DAVPropertyIdentity, str]:
     try:
         if not isinstance(data, dict):
@@ -55,26 +94,64 @@ def _parser_property_from_json(data) -> dict[DAVPropertyIdentity, str]:
     return data
 
 
-async def _load_extra_property(file: Path) -> dict[DAVPropertyIdentity, str]:
-    async with aiofiles.open(file, "r") as fp:
+def _read_extra_property(file: Path) -> dict[DAVPropertyIdentity, str]:
+    """sync version of _load_extra_property(), call it in executor"""
+    try:
+        with open(file) as fp:
+            data = json.load(fp)
+
+    except FileNotFoundError:
+        return dict()
+
+    except json.JSONDecodeError as e:
+        logger.warning(f"Parse property file {file} failed: {e}")
+        return dict()
+
+    return _parser_property_from_json(data)
+
+
+def _read_small_file(file: Path, identity: tuple) -> Optional[bytes]:
+    """return None if the file is changed since the identity was taken"""
+    try:
+        with open(file, "rb") as fp:
+            if get_file_identity(os.fstat(fp.fileno())) != identity:
+                return None
+
+            data = fp.read(identity[3] + 1)
+
+    except OSError:
+        return None
+
+    if len(data) != identity[3]:
+        # changed in place, the mtime is not updated yet
+        return None
+
+    return data
+
+
+async def _load_extra_property(
+    file: Path, executor: Optional[Executor] = None
+) -> dict[DAVPropertyIdentity, str]:
+    async with aiofiles.open(file, "r", executor=executor) as fp:
         tmp = await fp.read()
         try:
             data = json.loads(tmp)
 
         except json.JSONDecodeError as e:
-            print(e)
+            logger.warning(f"Parse property file {file} failed: {e}")
             return dict()
 
     return _parser_property_from_json(data)
 
 
 async def _update_extra_property(
-    file: Path, property_patches: list[DAVPropertyPatches]
+    file: Path,
+    property_patches: list[DAVPropertyPatches],
+    executor: Optional[Executor] = None,
 ) -> bool:
-    if not file.exists():
-        file.touch()
+    await asyncio.get_running_loop().run_in_executor(executor, file.touch)
 
-    async with aiofiles.open(file, "r+") as fp:
+    async with aiofiles.open(file, "r+", executor=executor) as fp:
         tmp = await fp.read()
         if len(tmp) == 0:
             data = {}
@@ -84,7 +161,7 @@ async def _update_extra_property(
                 data = json.loads(tmp)
 
             except json.JSONDecodeError as e:
-                print(e)
+                logger.warning(f"Parse property file {file} failed: {e}")
                 return False
 
             data = _parser_property_from_json(data)
@@ -109,22 +186,136 @@ async def _update_extra_property(
 async def _dav_response_data_generator(
     resource_abs_path: Path,
     content_range_start: Optional[int] = None,
-    content_range_end: Optional[int] = None,  # TODO!!
+    content_range_end: Optional[int] = None,  # included
+    executor: Optional[Executor] = None,
 ) -> AsyncGenerator[bytes, bool]:
-    async with aiofiles.open(resource_abs_path, mode="rb") as f:
+    async with aiofiles.open(resource_abs_path, mode="rb", executor=executor) as f:
         if content_range_start is not None:
             await f.seek(content_range_start)
 
+        if content_range_end is None:
+            remaining = None
+        else:
+            remaining = content_range_end - (content_range_start or 0) + 1
+
         more_body = True
         while more_body:
-            data = await f.read(RESPONSE_DATA_BLOCK_SIZE)
-            more_body = len(data) == RESPONSE_DATA_BLOCK_SIZE
+            if remaining is None:
+                size = RESPONSE_DATA_BLOCK_SIZE
+            else:
+                size = min(RESPONSE_DATA_BLOCK_SIZE, remaining)
+                remaining -= size
+
+            data = await f.read(size)
+            more_body = len(data) == size and remaining != 0
 
             yield data, more_body
 
 
+async def _dav_response_data_generator_read_ahead(
+    resource_abs_path: Path,
+    executor: DAVExecutor,
+    open_file_cache: Optional[OpenFileCache] = None,
+    content_range_start: Optional[int] = None,
+    content_range_end: Optional[int] = None,  # included
+    block_size: int = RESPONSE_DATA_BLOCK_SIZE,
+    max_buffer_size: int = 0,
+) -> AsyncGenerator[bytes, bool]:
+    """
+    The next blocks are read(os.pread) in the executor while the current one is
+    being sent, the bytes in flight are up to max_buffer_size(one block at
+    least). The block grows from RESPONSE_DATA_BLOCK_SIZE up to block_size, the
+    small file is still read in small blocks.
+    """
+
+    def open_() -> tuple[int, Optional[OpenFile]]:
+        if open_file_cache is None:
+            flags = os.O_RDONLY | getattr(os, "O_CLOEXEC", 0)
+            return os.open(resource_abs_path, flags), None
+
+        opened_file = open_file_cache.acquire(resource_abs_path)
+        return opened_file.fd, opened_file
+
+    def close(opened: tuple[int, Optional[OpenFile]], futures: list[Future]):
+        wait(futures)
+        if opened[1] is None:
+            os.close(opened[0])
+        else:
+            open_file_cache.release(opened[1])
+
+    def close_when_opened(future: Future):
+        if not future.cancelled() and future.exception() is None:
+            executor.submit(close, future.result(), [])
+
+    open_future = executor.submit(open_)
+    try:
+        fd, open_file = await asyncio.wrap_future(open_future)
+    except asyncio.CancelledError:
+        # an open already running can't be cancelled, close the result of it
+        open_future.add_done_callback(close_when_opened)
+        raise
+
+    offset = content_range_start or 0
+    end_offset = None if content_range_end is None else content_range_end + 1
+    size = min(RESPONSE_DATA_BLOCK_SIZE, block_size)
+    pending: deque[tuple[Future, int]] = deque()  # (read, size)
+    pending_size = 0
+
+    def read_ahead():
+        nonlocal offset, size, pending_size
+        while end_offset is None or offset < end_offset:
+            n = size if end_offset is None else min(size, end_offset - offset)
+            if pending and pending_size + n > max_buffer_size:
+                return
+
+            # positional read, the descriptor may be shared by the readers
+            pending.append((executor.submit(os.pread, fd, n, offset), n))
+            pending_size += n
+            offset += n
+            size = min(size * 2, block_size)
+
+    try:
+        read_ahead()
+        if len(pending) == 0:
+            yield b"", False
+            return
+
+        while pending:
+            # keep it in pending until it's done, the finally waits for it
+            future, n = pending[0]
+            data = await asyncio.wrap_future(future)
+            pending.popleft()
+            pending_size -= n
+            if len(data) < n:
+                # end of file
+                yield data, False
+                return
+
+            read_ahead()
+            yield data, len(pending) > 0
+
+    finally:
+        # the reads in flight are dropped, they never touch the file offset; but
+        # a running one can't be cancelled, the descriptor is closed/released
+        # after it's done
+        for future, _ in pending:
+            future.cancel()
+
+        # shielded, closed even if the response is cancelled
+        await asyncio.shield(
+            executor.run(close, (fd, open_file), [future for future, _ in pending])
+        )
+
+
 class FileSystemProvider(DAVProvider):
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        metadata_cache_invalidation: Optional[MetadataCacheInvalidation] = None,
+        read_ahead: Optional[ProviderReadAhead] = None,
+        content_cache: Optional[DAVLRUCache] = None,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
 
         self.root_path = Path(self.uri[7:])
@@ -134,6 +325,76 @@ class FileSystemProvider(DAVProvider):
                 f'Init FileSystemProvider failed, "{self.root_path}" is not exists.'
             )
 
+        # all blocking file system operations run in it
+        self.io_executor = DAVExecutor(
+            name=f"FileSystemProvider({self.prefix})",
+            max_workers=self.config.provider_io_max_workers,
+        )
+        register_metrics(self.io_executor.name, self.io_executor.get_metrics)
+
+        # open file cache, key: file system path
+        self.open_file_cache: Optional[OpenFileCache] = None
+        open_file_cache_config = self.config.provider_open_file_cache
+        if open_file_cache_config.enable:
+            if hasattr(os, "pread"):
+                self.open_file_cache = OpenFileCache(
+                    max_size=open_file_cache_config.max_size,
+                    inactive=open_file_cache_config.inactive,
+                )
+                register_metrics(
+                    f"{self.io_executor.name} open file cache",
+                    self.open_file_cache.get_metrics,
+                )
+            else:
+                logger.warning("os.pread is unavailable, disable open file cache")
+
+        # metadata cache, key: file system path
+        self.metadata_cache: Optional[DAVLRUCache] = None
+        self.fs_watcher: Optional[FileSystemWatcher] = None
+        cache_config = self.config.provider_metadata_cache
+        if cache_config.enable:
+            if metadata_cache_invalidation is None:
+                metadata_cache_invalidation = cache_config.invalidation
+
+            if metadata_cache_invalidation == MetadataCacheInvalidation.INOTIFY:
+                try:
+                    self.fs_watcher = FileSystemWatcher(
+                        name=self.io_executor.name,
+                        on_change=self._invalidate_metadata,
+                    )
+                except (RuntimeError, OSError) as e:
+                    logger.warning(f"{e}, metadata cache fallback to ttl")
+
+            self.metadata_cache = DAVLRUCache(
+                max_size=cache_config.max_size,
+                ttl=None if self.fs_watcher else cache_config.ttl,
+                on_remove=self._on_metadata_removed,
+            )
+            register_metrics(
+                f"{self.io_executor.name} metadata cache",
+                self.metadata_cache.get_metrics,
+            )
+            if self.fs_watcher is not None:
+                register_metrics(
+                    f"{self.io_executor.name} watcher", self.fs_watcher.get_metrics
+                )
+
+        # read ahead, the one of provider overrides the global one
+        if read_ahead is None:
+            read_ahead = self.config.provider_read_ahead
+        if read_ahead.enable:
+            self.read_ahead_block_size = max(read_ahead.block_size, 1)
+            self.read_ahead_max_buffer_size = read_ahead.max_buffer_size
+        else:
+            self.read_ahead_block_size = RESPONSE_DATA_BLOCK_SIZE
+            self.read_ahead_max_buffer_size = 0
+
+        # content cache of small files, key: (file system path, *identity); it's
+        #   shared by the providers(one byte budget), created by WebDAV
+        self.content_cache = content_cache
+        self.content_cache_max_file_size = (
+            self.config.provider_content_cache.max_file_size
+        )
 
         self.support_content_range = True
 
@@ -153,106 +414,423 @@ class FileSystemProvider(DAVProvider):
     def _get_fs_properties_path(path: Path) -> Path:
         return path.parent.joinpath(f"{path.name}.{DAV_EXTENSION_INFO_FILE_EXTENSION}")
 
-    async def _get_dav_property(
-        self, request: DAVRequest, href_path: DAVPath, fs_path: Path
-    ) -> DAVProperty:
-        stat_result = await aio_stat(fs_path)
-        is_collection = S_ISDIR(stat_result.st_mode)
-
-        # basic
-        if is_collection:
-            basic_data = DAVPropertyBasicData(
-                is_collection=S_ISDIR(stat_result.st_mode),
-                display_name=href_path.name,
-                creation_date=DAVTime(stat_result.st_ctime),
-                last_modified=DAVTime(stat_result.st_mtime),
+    def _invalidate_metadata(self, fs_path: Optional[Path], recursive: bool = False):
+        """fs_path: None means all; it's thread safe"""
+        if self.open_file_cache is not None:
+            # close the descriptor of the deleted/replaced file in time
+            self._invalidate_open_file(fs_path, recursive)
+
+        if self.metadata_cache is None:
+            return
+
+        if fs_path is None:
+            self.metadata_cache.clear()
+            return
+
+        if fs_path.suffix == f".{DAV_EXTENSION_INFO_FILE_EXTENSION}":
+            # .WebDAV file is a part of metadata
+            fs_path = fs_path.with_suffix("")
+
+        self.metadata_cache.pop(fs_path)
+        if recursive:
+            prefix = f"{fs_path}{os.sep}"
+            self.metadata_cache.pop_matching(lambda k: str(k).startswith(prefix))
+
+    def _unwatch(self, watched_paths: list[Path]):
+        if self.fs_watcher is not None and watched_paths:
+            self.fs_watcher.unwatch(watched_paths)
+
+    def _on_metadata_removed(self, fs_path: Path, metadata: FileSystemMetadata):
+        # the watches are only needed by the cached metadata
+        self._unwatch(metadata.watched_paths)
+
+    def _invalidate_open_file(self, fs_path: Optional[Path], recursive: bool):
+        if fs_path is None:
+            self.open_file_cache.clear()
+            return
+
+        self.open_file_cache.pop(fs_path)
+        if recursive:
+            prefix = f"{fs_path}{os.sep}"
+            self.open_file_cache.pop_matching(lambda k: str(k).startswith(prefix))
+
+    def _create_data_generator(
+        self,
+        fs_path: Path,
+        content_range_start: Optional[int] = None,
+        content_range_end: Optional[int] = None,
+    ) -> AsyncGenerator[bytes, bool]:
+        if not hasattr(os, "pread"):
+            return _dav_response_data_generator(
+                fs_path,
+                content_range_start=content_range_start,
+                content_range_end=content_range_end,
+                executor=self.io_executor,
             )
 
+        return _dav_response_data_generator_read_ahead(
+            fs_path,
+            self.io_executor,
+            open_file_cache=self.open_file_cache,
+            content_range_start=content_range_start,
+            content_range_end=content_range_end,
+            block_size=self.read_ahead_block_size,
+            max_buffer_size=self.read_ahead_max_buffer_size,
+        )
+
+    def _invalidate_metadata_after_write(self, fs_path: Path, recursive: bool = False):
+        self._invalidate_metadata(fs_path, recursive)
+        self._invalidate_metadata(fs_path.parent)  # mtime of parent dir
+
+    def _fs_stat(self, fs_path: Path) -> Optional[FileSystemStat]:
+        """return None if fs_path is not exists"""
+        watched_paths = []
+        if self.fs_watcher is None:
+            is_watched = False
         else:
-            content_type, content_encoding = guess_type(self.config, fs_path)
-            if self.config.text_file_charset_detect.enable:
-                charset = await detect_charset(fs_path, content_type)
-                if charset is None:
-                    charset = self.config.text_file_charset_detect.default
-            else:
-                charset = None
+            # watch before stat, any change after stat will be caught
+            is_watched = self.fs_watcher.watch(fs_path.parent)
+            if is_watched:
+                watched_paths.append(fs_path.parent)
 
-            basic_data = DAVPropertyBasicData(
-                is_collection=S_ISDIR(stat_result.st_mode),
-                display_name=href_path.name,
+        try:
+            stat_result = os.stat(fs_path)
+            if is_watched and S_ISDIR(stat_result.st_mode):
+                # mtime of dir changes when its children change, watch it and
+                #   stat again
+                is_watched = self.fs_watcher.watch(fs_path)
+                if is_watched:
+                    watched_paths.append(fs_path)
+                stat_result = os.stat(fs_path)
+
+        except (FileNotFoundError, NotADirectoryError):
+            self._unwatch(watched_paths)
+            return None
+
+        return FileSystemStat(
+            stat_result=stat_result,
+            extra_property_exists=self._get_fs_properties_path(fs_path).exists(),
+            is_watched=is_watched,
+            watched_paths=watched_paths,
+        )
+
+    def _fs_scandir(
+        self, base_fs_path: Path, load_extra_property: bool
+    ) -> list[FileSystemListingEntry]:
+        """
+        list the children of base_fs_path in one call, the stat of children come
+        from the metadata cache or os.DirEntry.stat(), the .WebDAV file is detected
+        from the same listing
+        """
+        if self.fs_watcher is None:
+            base_is_watched = False
+        else:
+            base_is_watched = self.fs_watcher.watch(base_fs_path)
+
+        try:
+            return self._fs_scandir_watched(
+                base_fs_path, base_is_watched, load_extra_property
+            )
+
+        finally:
+            # the children hold their own references
+            if base_is_watched:
+                self._unwatch([base_fs_path])
+
+    def _fs_scandir_watched(
+        self, base_fs_path: Path, base_is_watched: bool, load_extra_property: bool
+    ) -> list[FileSystemListingEntry]:
+        try:
+            with os.scandir(base_fs_path) as it:
+                dir_entries = list(it)
+
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+        names = {dir_entry.name for dir_entry in dir_entries}
+        result = []
+        for dir_entry in dir_entries:
+            fs_path = base_fs_path.joinpath(dir_entry.name)
+            properties_path = self._get_fs_properties_path(fs_path)
+            extra_property_exists = properties_path.name in names
+
+            entry = FileSystemListingEntry(fs_path=fs_path)
+            if self.metadata_cache is not None:
+                entry.metadata = self.metadata_cache.get(fs_path)
+
+            if entry.metadata is None:
+                is_watched = base_is_watched and self.fs_watcher.watch(base_fs_path)
+                watched_paths = [base_fs_path] if is_watched else []
+                try:
+                    if is_watched and dir_entry.is_dir():
+                        # watch before stat
+                        is_watched = self.fs_watcher.watch(fs_path)
+                        if is_watched:
+                            watched_paths.append(fs_path)
+
+                    # cached by os.DirEntry
+                    stat_result = dir_entry.stat()
+
+                except FileNotFoundError:
+                    # removed after listing
+                    self._unwatch(watched_paths)
+                    continue
+
+                entry.fs_stat = FileSystemStat(
+                    stat_result=stat_result,
+                    extra_property_exists=extra_property_exists,
+                    is_watched=is_watched,
+                    watched_paths=watched_paths,
+                )
+
+            if load_extra_property and extra_property_exists:
+                entry.extra_data = _read_extra_property(properties_path)
+
+            result.append(entry)
+
+        return result
+
+    async def _create_fs_metadata(
+        self,
+        fs_path: Path,
+        display_name: str,
+        fs_stat: FileSystemStat,
+        generation: Optional[int],
+    ) -> FileSystemMetadata:
+        """create metadata from stat and put it into the metadata cache"""
+        metadata = FileSystemMetadata(
+            basic_data=await self._create_basic_data(
+                fs_path, display_name, fs_stat.stat_result
+            ),
+            extra_property_exists=fs_stat.extra_property_exists,
+            identity=get_file_identity(fs_stat.stat_result),
+            watched_paths=fs_stat.watched_paths,
+        )
+
+        ttl = None if fs_stat.is_watched else self.config.provider_metadata_cache.ttl
+        if self.metadata_cache is None or not self.metadata_cache.set(
+            fs_path, metadata, ttl=ttl, generation=generation
+        ):
+            # not cached, nothing relies on the watches
+            self._unwatch(metadata.watched_paths)
+
+        return metadata
+
+    async def _get_fs_metadata(
+        self, fs_path: Path, display_name: str
+    ) -> Optional[FileSystemMetadata]:
+        """return None if fs_path is not exists"""
+        if self.metadata_cache is None:
+            generation = None
+        else:
+            metadata = self.metadata_cache.get(fs_path)
+            if metadata is not None:
+                return metadata
+
+            generation = self.metadata_cache.generation
+
+        fs_stat = await self.io_executor.run(self._fs_stat, fs_path)
+        if fs_stat is None:
+            return None
+
+        return await self._create_fs_metadata(
+            fs_path, display_name, fs_stat, generation
+        )
+
+    async def _create_basic_data(
+        self, fs_path: Path, display_name: str, stat_result: os.stat_result
+    ) -> DAVPropertyBasicData:
+        if S_ISDIR(stat_result.st_mode):
+            return DAVPropertyBasicData(
+                is_collection=True,
+                display_name=display_name,
                 creation_date=DAVTime(stat_result.st_ctime),
                 last_modified=DAVTime(stat_result.st_mtime),
-                content_type=content_type,
-                content_charset=charset,
-                content_length=stat_result.st_size,
-                content_encoding=content_encoding,
             )
 
+        content_type, content_encoding = guess_type(self.config, fs_path)
+        if self.config.text_file_charset_detect.enable:
+            charset = await detect_charset(
+                fs_path, content_type, executor=self.io_executor
+            )
+            if charset is None:
+                charset = self.config.text_file_charset_detect.default
+        else:
+            charset = None
+
+        return DAVPropertyBasicData(
+            is_collection=False,
+            display_name=display_name,
+            creation_date=DAVTime(stat_result.st_ctime),
+            last_modified=DAVTime(stat_result.st_mtime),
+            content_type=content_type,
+            content_charset=charset,
+            content_length=stat_result.st_size,
+            content_encoding=content_encoding,
+        )
+
+    async def _get_dav_property(
+        self, request: DAVRequest, href_path: DAVPath, fs_path: Path
+    ) -> Optional[DAVProperty]:
+        """return None if fs_path is not exists"""
+        metadata = await self._get_fs_metadata(fs_path, href_path.name)
+        if metadata is None:
+            return None
+
         dav_property = DAVProperty(
-            href_path=href_path, is_collection=is_collection, basic_data=basic_data
+            href_path=href_path,
+            is_collection=metadata.basic_data.is_collection,
+            basic_data=metadata.basic_data,
         )
 
         # extra
         if request.propfind_only_fetch_basic:
             return dav_property
 
-        properties_path = self._get_fs_properties_path(fs_path)
-        if properties_path.exists():
-            extra_data = await _load_extra_property(properties_path)
-            dav_property.extra_data = extra_data
+        if metadata.extra_property_exists:
+            properties_path = self._get_fs_properties_path(fs_path)
+            try:
+                extra_data = await _load_extra_property(
+                    properties_path, executor=self.io_executor
+                )
+            except FileNotFoundError:
+                self._invalidate_metadata(fs_path)
+                return dav_property
 
-            s = set(request.propfind_extra_keys) - set(extra_data.keys())
-            dav_property.extra_not_found = list(s)
+            self._set_extra_data(request, dav_property, extra_data)
 
         return dav_property
 
-    async def _do_propfind(self, request: DAVRequest) -> dict[DAVPath, DAVProperty]:
+    @staticmethod
+    def _set_extra_data(
+        request: DAVRequest,
+        dav_property: DAVProperty,
+        extra_data: dict[DAVPropertyIdentity, str],
+    ):
+        dav_property.extra_data = extra_data
+
+        s = set(request.propfind_extra_keys) - set(extra_data.keys())
+        dav_property.extra_not_found = list(s)
+
+    async def _get_children_dav_properties(
+        self, request: DAVRequest, base_href_path: DAVPath, base_fs_path: Path
+    ) -> dict[DAVPath, DAVProperty]:
+        """the properties of depth 1 children, in one executor call"""
+        if self.metadata_cache is None:
+            generation = None
+        else:
+            generation = self.metadata_cache.generation
+
+        entries = await self.io_executor.run(
+            self._fs_scandir, base_fs_path, not request.propfind_only_fetch_basic
+        )
+
         dav_properties = {}
+        for entry in entries:
+            name = entry.fs_path.name
+            href_path = base_href_path.add_child(name)
+            if entry.metadata is None:
+                entry.metadata = await self._create_fs_metadata(
+                    entry.fs_path, name, entry.fs_stat, generation
+                )
+
+            dav_property = DAVProperty(
+                href_path=href_path,
+                is_collection=entry.metadata.basic_data.is_collection,
+                basic_data=entry.metadata.basic_data,
+            )
+            if entry.extra_data is not None:
+                self._set_extra_data(request, dav_property, entry.extra_data)
 
-        base_fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
+            dav_properties[href_path] = dav_property
+
+        return dav_properties
+
+    @staticmethod
+    def _fs_count_entries(
+        base_fs_path: Path, excluded_fs_paths: set[Path], limit: int
+    ) -> int:
+        """count the entries of tree, stop counting over limit"""
         if not base_fs_path.exists():
-            return dav_properties
+            return 0
 
-        child_fs_paths = []
-        if request.depth != DAVDepth.d0 and base_fs_path.is_dir():
-            if request.depth == DAVDepth.d1:
-                glob_param = "*"
-            elif request.depth == DAVDepth.infinity:
-                # raise TODO !!!
-                glob_param = "**"
-            else:
-                raise
+        count = 1
+        dirs = [base_fs_path] if base_fs_path.is_dir() else []
+        while len(dirs) > 0:
+            try:
+                with os.scandir(dirs.pop()) as it:
+                    for dir_entry in it:
+                        fs_path = Path(dir_entry.path)
+                        if fs_path in excluded_fs_paths:
+                            continue
+
+                        count += 1
+                        if count > limit:
+                            return count
+
+                        if dir_entry.is_dir():
+                            dirs.append(fs_path)
+
+            except (FileNotFoundError, NotADirectoryError):
+                # removed after listing
+                continue
+
+        return count
+
+    async def count_propfind_depth_infinity(
+        self, request: DAVRequest, excluded_paths: list[DAVPath], limit: int
+    ) -> int:
+        username = request.user.username
+        excluded_fs_paths = {
+            self._get_fs_path(path.get_child(self.prefix), username)
+            for path in excluded_paths
+        }
+        return await self.io_executor.run(
+            self._fs_count_entries,
+            self._get_fs_path(request.dist_src_path, username),
+            excluded_fs_paths,
+            limit,
+        )
 
-            child_fs_paths = base_fs_path.glob(glob_param)
+    async def _do_propfind(self, request: DAVRequest) -> dict[DAVPath, DAVProperty]:
+        """depth 0 or 1, depth infinity is in do_propfind_depth_infinity()"""
+        dav_properties = {}
 
+        base_fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
         dav_property = await self._get_dav_property(
             request, request.src_path, base_fs_path
         )
-        dav_properties[request.src_path] = dav_property
+        if dav_property is None:
+            return dav_properties
 
-        for item in child_fs_paths:
-            new_href_path = request.src_path.add_child(item.name)
-            dav_property = await self._get_dav_property(request, new_href_path, item)
-            dav_properties[new_href_path] = dav_property
+        dav_properties[request.src_path] = dav_property
+        if request.depth == DAVDepth.d0 or not dav_property.is_collection:
+            return dav_properties
 
+        dav_properties.update(
+            await self._get_children_dav_properties(
+                request, request.src_path, base_fs_path
+            )
+        )
         return dav_properties
 
     async def _do_proppatch(self, request: DAVRequest) -> int:
         fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
         properties_path = self._get_fs_properties_path(fs_path)
-        if not fs_path.exists():
+        if not await self.io_executor.run(fs_path.exists):
             return 404
 
         sucess = await _update_extra_property(
-            properties_path, request.proppatch_entries
+            properties_path, request.proppatch_entries, executor=self.io_executor
         )
+        self._invalidate_metadata(fs_path)
         if sucess:
             return 207
 
         return 409
 
-    async def _do_mkcol(self, request: DAVRequest) -> int:
-        fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
+    @staticmethod
+    def _fs_mkcol(fs_path: Path) -> int:
         if fs_path.exists():
             return 405
 
@@ -268,42 +846,102 @@ class FileSystemProvider(DAVProvider):
 
         return 201
 
+    async def _do_mkcol(self, request: DAVRequest) -> int:
+        fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
+        http_status = await self.io_executor.run(self._fs_mkcol, fs_path)
+        self._invalidate_metadata_after_write(fs_path)
+        return http_status
+
     async def _do_get(
         self, request: DAVRequest
-    ) -> tuple[int, Optional[DAVPropertyBasicData], Optional[AsyncGenerator]]:
+    ) -> tuple[
+        int,
+        Optional[DAVPropertyBasicData],
+        Optional[AsyncGenerator | DAVFileBody | bytes],
+    ]:
         fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
-        if not fs_path.exists():
+        metadata = await self._get_fs_metadata(fs_path, request.src_path.name)
+        if metadata is None:
             return 404, None, None
 
-        dav_property = await self._get_dav_property(request, request.src_path, fs_path)
-
-        if fs_path.is_dir():
-            return 200, dav_property.basic_data, None
+        if metadata.basic_data.is_collection:
+            return 200, metadata.basic_data, None
 
         # is file
-        if request.content_range:
-            data = _dav_response_data_generator(
-                fs_path, content_range_start=request.content_range_start
+        basic_data = metadata.basic_data
+        file_size = basic_data.content_length
+        if (
+            self.content_cache is not None
+            and file_size <= self.content_cache_max_file_size
+            and not request.content_range
+            # the body of 304/412 isn't sent, don't read the file for it
+            and request.evaluate_preconditions(
+                basic_data.etag, basic_data.last_modified.timestamp
             )
-            http_status = 206
-        else:
-            data = _dav_response_data_generator(fs_path)
-            http_status = 200
-
-        return http_status, dav_property.basic_data, data
+            is None
+        ):
+            content = await self._get_file_content(fs_path, metadata.identity)
+            if content is not None:
+                return 200, metadata.basic_data, content
+
+        data = DAVFileBody(
+            path=fs_path,
+            offset=0,
+            count=file_size,
+            file_size=file_size,
+            data=self._create_data_generator(fs_path, content_range_end=file_size - 1),
+        )
+        return 200, metadata.basic_data, data
+
+    async def _get_file_content(
+        self, fs_path: Path, identity: tuple
+    ) -> Optional[bytes]:
+        """
+        from the content cache, or read it and put it into the cache; return None
+        if the file is changed since the metadata was taken
+        """
+        key = (fs_path, *identity)
+        content = self.content_cache.get(key)
+        if content is not None:
+            return content
+
+        content = await self.io_executor.run(_read_small_file, fs_path, identity)
+        if content is not None:
+            # the key changes with the file, the stale one is evicted by LRU
+            self.content_cache.set(key, content)
+
+        return content
+
+    async def _do_get_content_range(
+        self,
+        request: DAVRequest,
+        property_basic_data: DAVPropertyBasicData,
+        start: int,
+        end: int,
+    ) -> DAVFileBody:
+        fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
+        return DAVFileBody(
+            path=fs_path,
+            offset=start,
+            count=end - start + 1,
+            file_size=property_basic_data.content_length,
+            data=self._create_data_generator(
+                fs_path, content_range_start=start, content_range_end=end
+            ),
+        )
 
     async def _do_head(
         self, request: DAVRequest
     ) -> tuple[int, Optional[DAVPropertyBasicData]]:
         fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
-        if not fs_path.exists():  # TODO macOS 不区分大小写
+        # TODO macOS 不区分大小写
+        metadata = await self._get_fs_metadata(fs_path, request.src_path.name)
+        if metadata is None:
             return 404, None
 
-        dav_property = await self._get_dav_property(request, request.src_path, fs_path)
-        return 200, dav_property.basic_data
+        return 200, metadata.basic_data
 
-    def _fs_delete(self, path: DAVPath, username: Optional[str]) -> int:
-        fs_path = self._get_fs_path(path, username)
+    def _fs_delete(self, fs_path: Path) -> int:
         properties_path = self._get_fs_properties_path(fs_path)
         if not fs_path.exists():
             return 404
@@ -316,27 +954,35 @@ class FileSystemProvider(DAVProvider):
         return 204
 
     async def _do_delete(self, request: DAVRequest) -> int:
-        return self._fs_delete(request.dist_src_path, request.user.username)
+        fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
+        http_status = await self.io_executor.run(self._fs_delete, fs_path)
+        self._invalidate_metadata_after_write(fs_path, recursive=True)
+        return http_status
 
     async def _do_put(self, request: DAVRequest) -> int:
         fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
-        if fs_path.exists() and fs_path.is_dir():
+        if await self.io_executor.run(fs_path.is_dir):
             return 405
 
-        async with aiofiles.open(fs_path, "wb") as f:
-            more_body = True
-            while more_body:
-                request_data = await request.receive()
-                more_body = request_data.get("more_body")
+        try:
+            async with aiofiles.open(fs_path, "wb", executor=self.io_executor) as f:
+                more_body = True
+                while more_body:
+                    request_data = await request.receive()
+                    more_body = request_data.get("more_body")
+
+                    data = request_data.get("body", b"")
+                    await f.write(data)
 
-                data = request_data.get("body", b"")
-                await f.write(data)
+        finally:
+            self._invalidate_metadata_after_write(fs_path)
 
         return 201
 
     async def _do_get_etag(self, request: DAVRequest) -> str:
         fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
-        stat_result = await aio_stat(fs_path)
+        # the precondition of PUT, don't use the metadata cache
+        stat_result = await self.io_executor.run(os.stat, fs_path)
         return generate_etag(stat_result.st_size, stat_result.st_mtime)
 
     @staticmethod
@@ -369,20 +1015,20 @@ class FileSystemProvider(DAVProvider):
         shutil.copy2(property_src_path, property_des_path)
         return
 
-    async def _do_copy(self, request: DAVRequest) -> int:
+    def _fs_copy(
+        self, src_fs_path: Path, dst_fs_path: Path, depth: DAVDepth, overwrite: bool
+    ) -> int:
         def sucess_return() -> int:
-            return 204 if request.overwrite else 201
+            return 204 if overwrite else 201
 
         # check src_path
-        src_fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
         if not src_fs_path.exists():
             return 403
 
         # check dst_path
-        dst_fs_path = self._get_fs_path(request.dist_dst_path, request.user.username)
         if not dst_fs_path.parent.exists():
             return 409
-        if not request.overwrite and dst_fs_path.exists():
+        if not overwrite and dst_fs_path.exists():
             return 412
 
         # below ---
@@ -395,17 +1041,26 @@ class FileSystemProvider(DAVProvider):
             return sucess_return()
 
         # copy dir
-        if request.depth != DAVDepth.d0:
-            shutil.copytree(src_fs_path, dst_fs_path, dirs_exist_ok=request.overwrite)
+        if depth != DAVDepth.d0:
+            shutil.copytree(src_fs_path, dst_fs_path, dirs_exist_ok=overwrite)
             self._copy_property_file(src_fs_path, dst_fs_path)
             return sucess_return()
 
-        if self._copy_dir_depth0(src_fs_path, dst_fs_path, request.overwrite):
+        if self._copy_dir_depth0(src_fs_path, dst_fs_path, overwrite):
             self._copy_property_file(src_fs_path, dst_fs_path)
             return sucess_return()
 
         return 412
 
+    async def _do_copy(self, request: DAVRequest) -> int:
+        src_fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
+        dst_fs_path = self._get_fs_path(request.dist_dst_path, request.user.username)
+        http_status = await self.io_executor.run(
+            self._fs_copy, src_fs_path, dst_fs_path, request.depth, request.overwrite
+        )
+        self._invalidate_metadata_after_write(dst_fs_path, recursive=True)
+        return http_status
+
     @staticmethod
     def _move_with_overwrite(src_absolute_path: Path, dst_absolute_path: Path):
         shutil.copytree(src_absolute_path, dst_absolute_path, dirs_exist_ok=True)
@@ -434,9 +1089,9 @@ class FileSystemProvider(DAVProvider):
         shutil.move(property_src_path, property_des_path)
         return
 
-    async def _do_move(self, request: DAVRequest) -> int:
+    def _fs_move(self, src_fs_path: Path, dst_fs_path: Path, overwrite: bool) -> int:
         def sucess_return() -> int:
-            return 204 if request.overwrite else 201
+            return 204 if overwrite else 201
 
         # https://tools.ietf.org/html/rfc4918#page-58
         # If a resource exists at the destination and the Overwrite header is
@@ -445,8 +1100,6 @@ class FileSystemProvider(DAVProvider):
         # if overwrite:
         #     self._fs_delete(dst_path)
 
-        src_fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
-        dst_fs_path = self._get_fs_path(request.dist_dst_path, request.user.username)
         src_exists = src_fs_path.exists()
         src_is_dir = src_fs_path.is_dir()
         dst_exists = dst_fs_path.exists()
@@ -459,7 +1112,7 @@ class FileSystemProvider(DAVProvider):
         # check dst_path
         if not dst_fs_path.parent.exists():
             return 409
-        if not request.overwrite and dst_exists:
+        if not overwrite and dst_exists:
             return 412
 
         # below ---
@@ -474,7 +1127,7 @@ class FileSystemProvider(DAVProvider):
             self._move_property_file(src_fs_path, dst_fs_path)
             return sucess_return()
 
-        if request.overwrite and dst_exists and (src_is_dir != dst_is_dir):
+        if overwrite and dst_exists and (src_is_dir != dst_is_dir):
             if dst_is_dir:
                 shutil.rmtree(dst_fs_path)
             else:
@@ -487,3 +1140,13 @@ class FileSystemProvider(DAVProvider):
         self._move_with_overwrite(src_fs_path, dst_fs_path)
         self._move_property_file(src_fs_path, dst_fs_path)
         return sucess_return()
+
+    async def _do_move(self, request: DAVRequest) -> int:
+        src_fs_path = self._get_fs_path(request.dist_src_path, request.user.username)
+        dst_fs_path = self._get_fs_path(request.dist_dst_path, request.user.username)
+        http_status = await self.io_executor.run(
+            self._fs_move, src_fs_path, dst_fs_path, request.overwrite
+        )
+        self._invalidate_metadata_after_write(src_fs_path, recursive=True)
+        self._invalidate_metadata_after_write(dst_fs_path, recursive=True)
+        return http_status
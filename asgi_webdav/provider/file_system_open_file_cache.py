@@ -0,0 +1,156 @@
+import os
+import threading
+from time import monotonic
+from pathlib import Path
+from collections import OrderedDict
+from collections.abc import Callable
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class OpenFile:
+    """A read-only descriptor, shared by the readers; read it with os.pread only"""
+
+    def __init__(self, fd: int, identity: tuple):
+        self.fd = fd
+        self.identity = identity  # (st_dev, st_ino, st_mtime_ns, st_size)
+
+        self.refs = 0
+        self.last_used = monotonic()
+        self.evicted = False
+
+
+def get_file_identity(stat_result: os.stat_result) -> tuple:
+    return (
+        stat_result.st_dev,
+        stat_result.st_ino,
+        stat_result.st_mtime_ns,
+        stat_result.st_size,
+    )
+
+
+class OpenFileCache:
+    """
+    Like nginx's open_file_cache, a bounded set of the read-only descriptors,
+    keyed by file system path, validated by inode and mtime(a stat of the path)
+    when it's acquired. The readers share one descriptor by the positional read
+    (os.pread), so the range requests of a file(e.g. seek in a video) don't
+    reopen it.
+
+    - max_size: the max number of the cached descriptors
+    - inactive: seconds, the descriptor which is not used for it is closed
+
+    A descriptor is closed after it's evicted/invalidated and released by all
+    the readers. The methods are blocking(syscall), run them in the executor;
+    they are thread safe.
+    """
+
+    def __init__(self, max_size: int, inactive: float):
+        self.max_size = max_size
+        self.inactive = inactive
+
+        self._data: OrderedDict[Path, OpenFile] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, path: Path) -> OpenFile:
+        """raise OSError(e.g. FileNotFoundError) like os.open()"""
+        identity = get_file_identity(os.stat(path))
+        with self._lock:
+            self._remove_inactive()
+
+            open_file = self._data.get(path)
+            if open_file is not None:
+                if open_file.identity == identity:
+                    self._data.move_to_end(path)
+                    open_file.refs += 1
+                    open_file.last_used = monotonic()
+                    self.hits += 1
+                    return open_file
+
+                # changed
+                self._remove(path)
+
+            self.misses += 1
+
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        try:
+            open_file = OpenFile(fd, get_file_identity(os.fstat(fd)))
+        except OSError:
+            os.close(fd)
+            raise
+
+        open_file.refs = 1
+        with self._lock:
+            if path in self._data:
+                # opened by another reader meanwhile
+                self._remove(path)
+
+            self._data[path] = open_file
+            while len(self._data) > self.max_size:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+        return open_file
+
+    def release(self, open_file: OpenFile):
+        with self._lock:
+            open_file.refs -= 1
+            open_file.last_used = monotonic()
+            if open_file.evicted and open_file.refs == 0:
+                os.close(open_file.fd)
+
+    def _remove(self, path: Path):
+        """must be called with self._lock"""
+        open_file = self._data.pop(path)
+        open_file.evicted = True
+        if open_file.refs == 0:
+            os.close(open_file.fd)
+
+    def _remove_inactive(self):
+        """must be called with self._lock, the least recently used is the first"""
+        expire_time = monotonic() - self.inactive
+        paths = []
+        for path, open_file in self._data.items():
+            if open_file.last_used > expire_time:
+                break
+
+            if open_file.refs == 0:
+                paths.append(path)
+
+        for path in paths:
+            self._remove(path)
+
+    def pop(self, path: Path):
+        with self._lock:
+            if path in self._data:
+                self._remove(path)
+
+    def pop_matching(self, predicate: Callable[[Path], bool]):
+        with self._lock:
+            for path in [path for path in self._data.keys() if predicate(path)]:
+                self._remove(path)
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._data.keys()):
+                self._remove(path)
+
+    def get_metrics(self) -> dict[str, int | float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "in_use": sum(
+                    1 for open_file in self._data.values() if open_file.refs > 0
+                ),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
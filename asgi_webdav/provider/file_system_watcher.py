@@ -0,0 +1,175 @@
+import threading
+from pathlib import Path
+from collections.abc import Callable, Iterable
+from logging import getLogger
+from typing import Optional
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+logger = getLogger(__name__)
+
+
+class FileSystemWatcher:
+    """
+    Watch the directories with inotify(Linux only) in a daemon thread.
+
+    on_change(path, recursive) is called from the thread when something in a
+    watched directory is changed:
+    - path: the changed path, None means everything may be changed
+    - recursive: the descendants of path are changed too
+
+    A directory is watched while it's referenced: every successful watch() holds
+    a reference, release it by unwatch() when the cached data relied on the
+    watch is removed; the watch is removed with the last reference, so the
+    watches don't grow up to fs.inotify.max_user_watches with a large tree.
+    """
+
+    def __init__(self, name: str, on_change: Callable[[Optional[Path], bool], None]):
+        if inotify_simple is None:
+            raise RuntimeError("inotify is unavailable, package inotify_simple needed")
+
+        self.name = name
+        self.on_change = on_change
+
+        # OSError if the platform is not Linux
+        self._inotify = inotify_simple.INotify()
+
+        flags = inotify_simple.flags
+        self._watch_flags = (
+            flags.ATTRIB
+            | flags.MODIFY
+            | flags.CLOSE_WRITE
+            | flags.CREATE
+            | flags.DELETE
+            | flags.MOVED_FROM
+            | flags.MOVED_TO
+            | flags.DELETE_SELF
+            | flags.MOVE_SELF
+            | flags.ONLYDIR
+        )
+        self._recursive_flags = flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO
+
+        self._lock = threading.Lock()
+        self._wd_to_path: dict[int, Path] = {}
+        self._path_to_wd: dict[Path, int] = {}
+        self._path_to_refs: dict[Path, int] = {}
+
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"{name}-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def watch(self, path: Path) -> bool:
+        """
+        path must be a directory, return False if it can not be watched; hold a
+        reference of the watch if it's True
+        """
+        if self._closed or not self._thread.is_alive():
+            return False
+
+        with self._lock:
+            if path not in self._path_to_wd:
+                try:
+                    wd = self._inotify.add_watch(path, self._watch_flags)
+                except OSError as e:
+                    # ENOSPC: over fs.inotify.max_user_watches
+                    logger.debug(f"inotify add_watch {path} failed: {e}")
+                    return False
+
+                self._wd_to_path[wd] = path
+                self._path_to_wd[path] = wd
+
+            self._path_to_refs[path] = self._path_to_refs.get(path, 0) + 1
+
+        return True
+
+    def unwatch(self, paths: Iterable[Path]):
+        """release the references held by watch()"""
+        with self._lock:
+            for path in paths:
+                refs = self._path_to_refs.get(path, 0) - 1
+                if refs > 0:
+                    self._path_to_refs[path] = refs
+                    continue
+
+                self._path_to_refs.pop(path, None)
+                wd = self._path_to_wd.pop(path, None)
+                if wd is None:
+                    # removed by the kernel(IN_IGNORED) already
+                    continue
+
+                self._wd_to_path.pop(wd, None)
+                try:
+                    self._inotify.rm_watch(wd)
+                except OSError:
+                    pass
+
+    def get_metrics(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                "watches": len(self._path_to_wd),
+            }
+
+    def _forget(self, wd: int):
+        with self._lock:
+            path = self._wd_to_path.pop(wd, None)
+            if path is not None:
+                self._path_to_wd.pop(path, None)
+
+        return path
+
+    def _process_event(self, event):
+        flags = inotify_simple.flags
+
+        if event.mask & flags.Q_OVERFLOW:
+            logger.warning(f"{self.name}: inotify event queue overflow")
+            self.on_change(None, True)
+            return
+
+        with self._lock:
+            dir_path = self._wd_to_path.get(event.wd)
+        if dir_path is None:
+            return
+
+        if event.mask & (flags.DELETE_SELF | flags.MOVE_SELF | flags.IGNORED):
+            if event.mask & flags.MOVE_SELF:
+                # the new location is unknown, watch it again when it's cached
+                try:
+                    self._inotify.rm_watch(event.wd)
+                except OSError:
+                    pass
+
+            self._forget(event.wd)
+            self.on_change(dir_path, True)
+            return
+
+        # mtime of directory is changed too
+        self.on_change(dir_path, False)
+        if event.name:
+            self.on_change(
+                dir_path.joinpath(event.name),
+                bool(event.mask & flags.ISDIR and event.mask & self._recursive_flags),
+            )
+
+    def _run(self):
+        while not self._closed:
+            try:
+                events = self._inotify.read(timeout=1000)
+            except OSError as e:
+                if not self._closed:
+                    logger.error(f"{self.name}: inotify read failed: {e}")
+                    self.on_change(None, True)
+                return
+
+            for event in events:
+                self._process_event(event)
+
+    def close(self):
+        self._closed = True
+        self._thread.join()
+        self._inotify.close()
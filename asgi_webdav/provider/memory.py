@@ -121,9 +121,34 @@ class FileSystemMember:
 
         return fs_member
 
-    def get_all_child_member_path(self, depth: DAVDepth) -> list[DAVPath]:
-        """depth == DAVDepth.d1 or DAVDepth.infinity"""
-        return [DAVPath(f"/{fs_member.name}") for fs_member in self.children.values()]
+    def get_all_child_member_path(self, path: DAVPath) -> list[DAVPath]:
+        """path: the path of self, depth 1 only"""
+        return [path.add_child(fs_member.name) for fs_member in self.children.values()]
+
+    def count_members(
+        self, path: DAVPath, excluded_paths: list[DAVPath], limit: int
+    ) -> int:
+        """
+        path: the path of self; count self and the descendants which are not in
+        excluded_paths, stop counting over limit
+        """
+        count = 1
+        members = [(path, self)] if self.is_path else []
+        while len(members) > 0:
+            member_path, fs_member = members.pop()
+            for child_member in fs_member.children.values():
+                child_path = member_path.add_child(child_member.name)
+                if any(child_path.startswith(p) for p in excluded_paths):
+                    continue
+
+                count += 1
+                if count > limit:
+                    return count
+
+                if child_member.is_path:
+                    members.append((child_path, child_member))
+
+        return count
 
     def member_exists(self, path: DAVPath) -> bool:
         point = self.get_member(path)
@@ -224,6 +249,8 @@ class MemoryProvider(DAVProvider):
         )
         self.fs_lock = Lock()
 
+        self.support_content_range = True
+
     def __repr__(self):
         return "memory:///"
 
@@ -264,9 +291,12 @@ class MemoryProvider(DAVProvider):
             if fs_member is None:
                 return dav_properties
 
+            # depth infinity is in do_propfind_depth_infinity()
             member_paths = [request.dist_src_path]
             if fs_member.is_path and request.depth != DAVDepth.d0:
-                member_paths += fs_member.get_all_child_member_path(request.depth)
+                member_paths += fs_member.get_all_child_member_path(
+                    request.dist_src_path
+                )
 
             for member_path in member_paths:
                 href_path = self.prefix.add_child(member_path)
@@ -276,6 +306,17 @@ class MemoryProvider(DAVProvider):
 
             return dav_properties
 
+    async def count_propfind_depth_infinity(
+        self, request: DAVRequest, excluded_paths: list[DAVPath], limit: int
+    ) -> int:
+        """count the members without creating their properties"""
+        async with self.fs_lock:
+            fs_member = self.fs_root.get_member(request.dist_src_path)
+            if fs_member is None:
+                return 0
+
+            return fs_member.count_members(request.src_path, excluded_paths, limit)
+
     async def _do_proppatch(self, request: DAVRequest) -> int:
         async with self.fs_lock:
             fs_member = self.fs_root.get_member(request.dist_src_path)
@@ -310,6 +351,22 @@ class MemoryProvider(DAVProvider):
                 get_data_generator_from_content(member.content),
             )
 
+    async def _do_get_content_range(
+        self,
+        request: DAVRequest,
+        property_basic_data: DAVPropertyBasicData,
+        start: int,
+        end: int,
+    ) -> AsyncGenerator:
+        async with self.fs_lock:
+            member = self.fs_root.get_member(request.dist_src_path)
+            if member is None or member.content is None:
+                content = b""
+            else:
+                content = member.content[start : end + 1]
+
+        return get_data_generator_from_content(content)
+
     async def _do_head(
         self, request: DAVRequest
     ) -> tuple[int, Optional[DAVPropertyBasicData]]:
@@ -1,12 +1,13 @@
 from typing import Optional
+import re
 import pprint
 from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
 from uuid import UUID
 from urllib.parse import (
     urlparse,
     unquote as decode_path_name_for_url,
 )
-from collections import OrderedDict
 from collections.abc import Callable
 
 from pyexpat import ExpatError
@@ -18,15 +19,26 @@ from asgi_webdav.constants import (
     DAVDepth,
     DAVLockScope,
     DAVUser,
-    DAV_PROPERTY_BASIC_KEYS,
     DAVPropertyIdentity,
     DAVPropertyPatches,
     DAVAcceptEncoding,
+    REQUEST_BODY_XML_MAX_SIZE,
+    REQUEST_HEADER_RANGE_MAX_COUNT,
+)
+from asgi_webdav.helpers import receive_all_data_in_one_call
+from asgi_webdav.xml_parser import (
+    parse_propfind_body,
+    parse_proppatch_body,
+    parse_lock_body,
 )
-from asgi_webdav.helpers import receive_all_data_in_one_call, dav_xml2dict
 from asgi_webdav.exception import NotASGIRequestException
 
 
+# up to 19 digits(a 64-bit offset), the longer one is ignored as an invalid header;
+# int() refuses a string over 4300 digits
+_HEADER_RANGE_SPEC_PATTERN = re.compile(r"(\d{0,19})-(\d{0,19})", re.ASCII)
+
+
 @dataclass
 class DAVRequest:
     """Information from Request
@@ -55,11 +67,22 @@ class DAVRequest:
     def path(self) -> DAVPath:
         return self.src_path
 
-    # Range
-    # only response first range
+    # Range, https://datatracker.ietf.org/doc/html/rfc7233
+    # (first-byte-pos, last-byte-pos), (None, suffix-length) for suffix range
     content_range: bool = False
-    content_range_start: Optional[int] = None
-    content_range_end: Optional[int] = None
+    content_ranges: list[tuple[Optional[int], Optional[int]]] = field(
+        default_factory=list
+    )
+    content_range_start: Optional[int] = None  # first range
+    content_range_end: Optional[int] = None  # first range
+    if_range: Optional[str] = None
+
+    # Conditional(GET/HEAD), https://datatracker.ietf.org/doc/html/rfc7232
+    # entity-tags, ["*"] for any; timestamp; None when it's absent or invalid
+    if_match: Optional[list[str]] = None
+    if_none_match: Optional[list[str]] = None
+    if_modified_since: Optional[float] = None
+    if_unmodified_since: Optional[float] = None
 
     # body's info ---
     body: bytes = field(init=False)
@@ -93,6 +116,7 @@ class DAVRequest:
     user: Optional[DAVUser] = None  # update in WebDAV.__call__()
     authorization_info: Optional[bytes] = None
     authorization_method: Optional[str] = None
+    authorization_nonce_stale: bool = False  # Digest, response stale=true
 
     # response info
     accept_encoding: DAVAcceptEncoding = field(default_factory=DAVAcceptEncoding)
@@ -203,6 +227,10 @@ class DAVRequest:
         if self.method == DAVMethod.GET:
             self._parser_header_range()
 
+        # header: conditional
+        if self.method in {DAVMethod.GET, DAVMethod.HEAD}:
+            self._parser_header_conditional()
+
         return
 
     def _parser_client_ip_address(self):
@@ -296,13 +324,20 @@ class DAVRequest:
         if self.dst_path:
             self.dist_dst_path = self.dst_path.get_child(dist_prefix)
 
-    @staticmethod
-    def _cut_ns_key(ns_key: str) -> tuple[str, str]:
-        index = ns_key.rfind(":")
-        return ("", ns_key) if index == -1 else (ns_key[:index], ns_key[index + 1 :])
+    async def _receive_xml_body(self) -> bool:
+        self.body = await receive_all_data_in_one_call(
+            self.receive, max_size=REQUEST_BODY_XML_MAX_SIZE
+        )
+        if self.body is None:
+            self.body = b""
+            return False
+
+        return True
 
     async def _parser_body_propfind(self) -> bool:
-        self.body = await receive_all_data_in_one_call(self.receive)
+        if not await self._receive_xml_body():
+            return False
+
         """
         A client may choose not to submit a request body.  An empty PROPFIND
            request body MUST be treated as if it were an 'allprop' request.
@@ -311,83 +346,23 @@ class DAVRequest:
             # allprop
             return True
 
-        data = dav_xml2dict(self.body)
-        if data is None:
-            return False
-
-        find_symbol = "DAV::propfind"
-        if "propname" in data[find_symbol]:
-            self.propfind_only_fetch_property_name = True
-            return True
-
-        if "DAV::allprop" in data[find_symbol]:
-            return True
-        else:
-            self.propfind_fetch_all_property = False
-
-        if "DAV::prop" not in data[find_symbol]:
-            # TODO error
-            return False
-
-        for ns_key in data[find_symbol]["DAV::prop"]:
-            ns, key = self._cut_ns_key(ns_key)
-            if key in DAV_PROPERTY_BASIC_KEYS:
-                self.propfind_basic_keys.add(key)
-            else:
-                self.propfind_extra_keys.append((ns, key))
-
-        if len(self.propfind_extra_keys) == 0:
-            self.propfind_only_fetch_basic = True
-
-        return True
+        return parse_propfind_body(self, self.body)
 
     async def _parser_body_proppatch(self) -> bool:
-        self.body = await receive_all_data_in_one_call(self.receive)
-        data = dav_xml2dict(self.body)
-        if data is None:
+        if not await self._receive_xml_body():
             return False
 
-        update_symbol = "DAV::propertyupdate"
-        for action in data[update_symbol]:
-            _, key = self._cut_ns_key(action)
-            method = key == "set"
-            for item in data[update_symbol][action]:
-                if isinstance(item, OrderedDict):
-                    ns_key, value = item["DAV::prop"].popitem()
-                else:
-                    ns_key, value = data[update_symbol][action][item].popitem()
-                    if isinstance(value, OrderedDict):
-                        # value namespace: drop namespace info # TODO ???
-                        value, _ = value.popitem()
-                        _, value = self._cut_ns_key(value)
-                        # value = "<{} xmlns='{}'>".format(vns_key, vns_ns)
-
-                ns, key = self._cut_ns_key(ns_key)
-                if not isinstance(value, str):
-                    value = str(value)
-
-                self.proppatch_entries.append(((ns, key), value, method))
-
-        return True
+        return parse_proppatch_body(self, self.body)
 
     async def _parser_body_lock(self) -> bool:
-        self.body = await receive_all_data_in_one_call(self.receive)
+        if not await self._receive_xml_body():
+            return False
+
         if len(self.body) == 0:
             # LOCK accept empty body
             return True
 
-        data = dav_xml2dict(self.body)
-        if data is None:
-            return False
-
-        if "DAV::exclusive" in data["DAV::lockinfo"]["DAV::lockscope"]:
-            self.lock_scope = DAVLockScope.exclusive
-        else:
-            self.lock_scope = DAVLockScope.shared
-
-        lock_owner = data["DAV::lockinfo"]["DAV::owner"]
-        self.lock_owner = str(lock_owner)
-        return True
+        return parse_lock_body(self, self.body)
 
     async def parser_body(self) -> bool:
         if self.method == DAVMethod.PROPFIND:
@@ -413,6 +388,7 @@ class DAVRequest:
 
     def _parser_header_range(self):
         # https://developer.mozilla.org/zh-CN/docs/Web/HTTP/Headers/Range
+        # the invalid header is ignored, rfc7233:3.1
         header_range = self.headers.get(b"range")
         if header_range is None:
             return
@@ -421,26 +397,160 @@ class DAVRequest:
         if header_range[:6] != "bytes=":
             return
 
-        content_ranges = header_range[6:].split(",")
-        if len(content_ranges) < 1:
-            return
+        content_ranges = []
+        for range_spec in header_range[6:].split(","):
+            range_spec = range_spec.strip()
+            if len(range_spec) == 0:
+                continue
+
+            m = _HEADER_RANGE_SPEC_PATTERN.fullmatch(range_spec)
+            if m is None:
+                return
+
+            first = int(m.group(1)) if m.group(1) else None
+            last = int(m.group(2)) if m.group(2) else None
+            if first is None and last is None:
+                return
+            if first is not None and last is not None and last < first:
+                return
+
+            content_ranges.append((first, last))
 
-        content_range = content_ranges[0].split("-")
-        if len(content_range) != 2:
+        if not 0 < len(content_ranges) <= REQUEST_HEADER_RANGE_MAX_COUNT:
             return
 
         self.content_range = True
-        try:
-            self.content_range_start = int(content_range[0])
-        except ValueError:
-            pass
-        try:
-            self.content_range_end = int(content_range[1])
-        except ValueError:
-            pass
+        self.content_ranges = content_ranges
+        self.content_range_start, self.content_range_end = content_ranges[0]
+
+        if header_if_range := self.headers.get(b"if-range"):
+            self.if_range = header_if_range.decode("utf-8").strip()
 
         return
 
+    def get_content_ranges(self, file_size: int) -> list[tuple[int, int]]:
+        """
+        resolve the ranges with the size of file, return the satisfiable ranges
+        (first-byte-pos, last-byte-pos), sorted and the overlapping/adjacent
+        ones are coalesced(rfc7233:4.1); empty if none of them is satisfiable
+        """
+        content_ranges = []
+        for first, last in self.content_ranges:
+            if first is None:
+                # suffix range
+                if last == 0 or file_size == 0:
+                    continue
+
+                first = max(file_size - last, 0)
+                last = file_size - 1
+
+            else:
+                if first >= file_size:
+                    continue
+
+                last = file_size - 1 if last is None else min(last, file_size - 1)
+
+            content_ranges.append((first, last))
+
+        content_ranges.sort()
+        result = []
+        for first, last in content_ranges:
+            if result and first <= result[-1][1] + 1:
+                result[-1] = (result[-1][0], max(result[-1][1], last))
+            else:
+                result.append((first, last))
+
+        return result
+
+    def match_if_range(self, etag: str, last_modified: float) -> bool:
+        """
+        https://datatracker.ietf.org/doc/html/rfc7233#section-3.2
+        False: the representation is changed, response the whole one
+        """
+        if self.if_range is None:
+            return True
+
+        if self.if_range.startswith('W/"'):
+            # strong comparison, a weak validator never matches; rfc7233:3.2
+            return False
+
+        if self.if_range.startswith('"'):
+            return not etag.startswith('W/"') and self.if_range == etag
+
+        date = self._parser_header_http_date(self.if_range.encode("utf-8"))
+        return date is not None and int(last_modified) == date
+
+    @staticmethod
+    def _parser_header_entity_tags(value: bytes) -> list[str]:
+        return [
+            entity_tag.strip()
+            for entity_tag in value.decode("utf-8").split(",")
+            if entity_tag.strip()
+        ]
+
+    @staticmethod
+    def _parser_header_http_date(value: bytes) -> Optional[float]:
+        try:
+            return parsedate_to_datetime(value.decode("utf-8")).timestamp()
+        except (TypeError, ValueError, IndexError):
+            # an invalid date is ignored, rfc7232:3.3
+            return None
+
+    def _parser_header_conditional(self):
+        if header_if_match := self.headers.get(b"if-match"):
+            self.if_match = self._parser_header_entity_tags(header_if_match)
+        if header_if_none_match := self.headers.get(b"if-none-match"):
+            self.if_none_match = self._parser_header_entity_tags(header_if_none_match)
+        if header_if_modified_since := self.headers.get(b"if-modified-since"):
+            self.if_modified_since = self._parser_header_http_date(
+                header_if_modified_since
+            )
+        if header_if_unmodified_since := self.headers.get(b"if-unmodified-since"):
+            self.if_unmodified_since = self._parser_header_http_date(
+                header_if_unmodified_since
+            )
+
+    @staticmethod
+    def _match_entity_tag(entity_tags: list[str], etag: str, weak: bool) -> bool:
+        """
+        rfc7232:2.3.2, strong comparison for If-Match, weak comparison for
+        If-None-Match; all of our ETags are weak, they never match in strong
+        comparison, only "*" does
+        """
+        if "*" in entity_tags:
+            return True
+
+        if not weak:
+            return not etag.startswith("W/") and etag in entity_tags
+
+        etag = etag.removeprefix("W/")
+        return any(entity_tag.removeprefix("W/") == etag for entity_tag in entity_tags)
+
+    def evaluate_preconditions(self, etag: str, last_modified: float) -> Optional[int]:
+        """
+        https://datatracker.ietf.org/doc/html/rfc7232#section-6
+        evaluate the preconditions of GET/HEAD against the selected
+        representation, return 304/412, or None to response the representation
+        """
+        # HTTP-date has no fraction of second
+        last_modified = int(last_modified)
+
+        if self.if_match is not None:
+            if not self._match_entity_tag(self.if_match, etag, weak=False):
+                return 412
+        elif self.if_unmodified_since is not None:
+            if last_modified > self.if_unmodified_since:
+                return 412
+
+        if self.if_none_match is not None:
+            if self._match_entity_tag(self.if_none_match, etag, weak=True):
+                return 304
+        elif self.if_modified_since is not None:
+            if last_modified <= self.if_modified_since:
+                return 304
+
+        return None
+
     def __repr__(self):
         simple_fields = ["method", "src_path", "accept_encoding"]
         rich_fields = []
@@ -4,7 +4,9 @@ import gzip
 import pprint
 from enum import Enum, auto
 from io import BytesIO
-from collections.abc import AsyncGenerator
+from pathlib import Path
+from dataclasses import dataclass
+from collections.abc import AsyncGenerator, Iterable
 from logging import getLogger
 
 from asgi_webdav.constants import (
@@ -12,6 +14,7 @@ from asgi_webdav.constants import (
     DEFAULT_COMPRESSION_CONTENT_TYPE_RULE,
     DAVCompressLevel,
 )
+from asgi_webdav.cache import DAVLRUCache
 from asgi_webdav.config import Config, get_config
 from asgi_webdav.helpers import get_data_generator_from_content
 from asgi_webdav.request import DAVRequest
@@ -31,6 +34,32 @@ class DAVResponseType(Enum):
     UNDECIDED = auto()
 
 
+@dataclass
+class DAVFileBody:
+    """
+    A response body which is a (part of) file in the file system, the ASGI server
+    can send it by itself without copy the data in Python.
+
+    - https://asgi.readthedocs.io/en/latest/extensions.html#path-send
+    - https://asgi.readthedocs.io/en/latest/extensions.html#zero-copy-send
+    """
+
+    path: Path
+    offset: int
+    count: int
+    file_size: int
+
+    # fallback, when the ASGI server does not support any zero copy extension
+    data: AsyncGenerator
+
+    @property
+    def is_whole_file(self) -> bool:
+        return self.offset == 0 and self.count == self.file_size
+
+    def __aiter__(self):
+        return self.data
+
+
 class DAVResponse:
     """provider.implement => provider.DavProvider => WebDAV"""
 
@@ -40,11 +69,17 @@ class DAVResponse:
     def get_content(self):
         return self._content
 
-    def set_content(self, value: bytes | AsyncGenerator):
+    def set_content(self, value: bytes | AsyncGenerator | DAVFileBody):
+        self._content_bytes = None
         if isinstance(value, bytes):
             self._content = get_data_generator_from_content(value)
+            self._content_bytes = value
             self.content_length = len(value)
 
+        elif isinstance(value, DAVFileBody):
+            self._content = value
+            self.content_length = value.count
+
         elif isinstance(value, AsyncGenerator):
             self._content = value
             self.content_length = None
@@ -53,7 +88,8 @@ class DAVResponse:
             raise
 
     content = property(fget=get_content, fset=set_content)
-    _content: AsyncGenerator
+    _content: AsyncGenerator | DAVFileBody
+    _content_bytes: bytes | None  # the content is in memory, send it in one message
     content_length: int | None
     content_range: bool = False
     content_range_start: int | None = None
@@ -64,7 +100,7 @@ class DAVResponse:
         status: int,
         headers: dict[bytes, bytes] | None = None,  # extend headers
         response_type: DAVResponseType = DAVResponseType.HTML,
-        content: bytes | AsyncGenerator = b"",
+        content: bytes | AsyncGenerator | DAVFileBody = b"",
         content_length: int | None = None,  # don't assignment when data is bytes
         content_range_start: int | None = None,
         content_range_end: int | None = None,
@@ -90,20 +126,25 @@ class DAVResponse:
         if content_length is not None:
             self.content_length = content_length
 
-        # if content_range_start is not None or content_range_end is not None:
+        # content_length is the complete length of the representation, the content
+        # is the range [content_range_start, content_range_end] of it
         if content_length is not None and content_range_start is not None:
-            # TODO Incomplete implementation
+            if content_range_end is None:
+                content_range_end = content_length - 1
+
             self.content_range = True
             self.content_range_start = content_range_start
-            self.content_length = content_length - content_range_start
+            self.content_range_end = content_range_end
+            self.content_length = content_range_end - content_range_start + 1
 
             # https://developer.mozilla.org/zh-CN/docs/Web/HTTP/Headers/Content-Range
             # Content-Range: <unit> <range-start>-<range-end>/<size>
             self.headers.update(
                 {
-                    b"Content-Range": f"bytes {content_range_start}-{content_length}/{content_length}".encode(
-                        "utf-8"
-                    )
+                    b"Content-Range": (
+                        f"bytes {content_range_start}-{content_range_end}"
+                        f"/{content_length}"
+                    ).encode("utf-8")
                 }
             )
 
@@ -163,6 +204,20 @@ class DAVResponse:
             }
         )
         # send data
+        if isinstance(self._content, DAVFileBody) and get_config().enable_zero_copy:
+            if await self._send_file_body_in_zero_copy(request, self._content):
+                return
+
+        if self._content_bytes is not None:
+            await request.send(
+                {
+                    "type": "http.response.body",
+                    "body": self._content_bytes,
+                    "more_body": False,
+                }
+            )
+            return
+
         async for data, more_body in self._content:
             await request.send(
                 {
@@ -172,11 +227,53 @@ class DAVResponse:
                 }
             )
 
+    @staticmethod
+    async def _send_file_body_in_zero_copy(
+        request: DAVRequest, file_body: DAVFileBody
+    ) -> bool:
+        """return False if the ASGI server does not support any zero copy extension"""
+        extensions = request.scope.get("extensions") or {}
+
+        if "http.response.pathsend" in extensions and file_body.is_whole_file:
+            await request.send(
+                {
+                    "type": "http.response.pathsend",
+                    "path": str(file_body.path.absolute()),
+                }
+            )
+            return True
+
+        if "http.response.zerocopy" in extensions:
+            f = await asyncio.to_thread(open, file_body.path, "rb")
+            try:
+                await request.send(
+                    {
+                        "type": "http.response.zerocopy",
+                        "file": f,
+                        "offset": file_body.offset,
+                        "count": file_body.count,
+                        "more_body": False,
+                    }
+                )
+            finally:
+                await asyncio.to_thread(f.close)
+
+            return True
+
+        return False
+
     def __repr__(self):
+        if isinstance(self._content, DAVFileBody):
+            content_type = "DAVFileBody"
+        elif self._content_bytes is not None:
+            content_type = "bytes"
+        else:
+            content_type = "AsyncGenerator"
+
         fields = [
             self.status,
             self.content_length,
-            "bytes" if isinstance(self._content, bytes) else "AsyncGenerator",
+            content_type,
             self.content_range,
             self.content_range_start,
             self.content_range_end,
@@ -316,6 +413,11 @@ class BrotliSender(CompressionSenderAbc):
 
 
 class DAVHideFileInDir:
+    """
+    The rules are compiled once; the client(UA) is resolved to the compiled rule
+    of its UA class(the UA regexes it matched) via a bounded LRU cache.
+    """
+
     _data_rules: dict[str, str]
     _data_rules_default: str | None
 
@@ -324,12 +426,8 @@ class DAVHideFileInDir:
         if not self.enable:
             return
 
-        self._ua_to_rule_mapping = {}
-        self._ua_to_rule_mapping_lock = asyncio.Lock()
-
         self._data_rules = {}
         self._data_rules_default = None
-        self._data_skipped_ua_set = set()  # for missed ua regex: ""
 
         if config.hide_file_in_dir.enable_default_rules:
             self._data_rules.update(DEFAULT_HIDE_FILE_IN_DIR_RULES)
@@ -343,31 +441,54 @@ class DAVHideFileInDir:
         if "" in self._data_rules:
             self._data_rules_default = self._data_rules.pop("")
 
+        self._ua_regexes = [re.compile(ua_regex) for ua_regex in self._data_rules]
+        self._ua_rules = list(self._data_rules.values())
+        # UA class(indexes of matched UA regexes): compiled rule or None
+        self._ua_class_to_pattern: dict[tuple[int, ...], re.Pattern | None] = {}
+        # ua: compiled rule, or False for no rule
+        self._ua_to_pattern = DAVLRUCache(config.hide_file_in_dir.ua_cache_max_size)
+
     @staticmethod
     def _merge_rules(rules_a: str | None, rules_b: str) -> str:
         return rules_b if rules_a is None else f"{rules_a}|{rules_b}"
 
-    def get_rule_by_client_user_agent(self, ua: str) -> str | None:
-        ua_matched = False
-        result = None
-
-        for ua_regex in self._data_rules.keys():
-            # if len(ua_regex) == 0 or re.match(ua_regex, ua) is not None:
-            if re.match(ua_regex, ua) is not None:
-                ua_matched = True
+    def _get_ua_class(self, ua: str) -> tuple[int, ...]:
+        return tuple(
+            index
+            for index, ua_regex in enumerate(self._ua_regexes)
+            if ua_regex.match(ua) is not None
+        )
 
-                result = self._merge_rules(result, self._data_rules.get(ua_regex))
+    def _get_rule_by_ua_class(self, ua_class: tuple[int, ...]) -> str | None:
+        result = None
+        for index in ua_class:
+            result = self._merge_rules(result, self._ua_rules[index])
 
         if self._data_rules_default is not None:
             result = self._merge_rules(result, self._data_rules_default)
 
-        if not ua_matched:
-            self._data_skipped_ua_set.add(ua)
-
         return result
 
+    def get_rule_by_client_user_agent(self, ua: str) -> str | None:
+        return self._get_rule_by_ua_class(self._get_ua_class(ua))
+
+    def get_pattern_by_client_user_agent(self, ua: str) -> re.Pattern | None:
+        pattern = self._ua_to_pattern.get(ua)
+        if pattern is None:
+            ua_class = self._get_ua_class(ua)
+            if ua_class in self._ua_class_to_pattern:
+                pattern = self._ua_class_to_pattern[ua_class]
+            else:
+                rule = self._get_rule_by_ua_class(ua_class)
+                pattern = None if rule is None else re.compile(rule)
+                self._ua_class_to_pattern[ua_class] = pattern
+
+            self._ua_to_pattern.set(ua, False if pattern is None else pattern)
+
+        return pattern or None
+
     @staticmethod
-    def is_match_file_name(rule: str, file_name: str) -> bool:
+    def is_match_file_name(rule: str | re.Pattern, file_name: str) -> bool:
         if re.match(rule, file_name):
             logger.debug(f"Rule:{rule}, File:{file_name}, hide it")
             return True
@@ -380,23 +501,20 @@ class DAVHideFileInDir:
             return False
 
         # match rule with ua
-        if ua in self._data_skipped_ua_set:
-            if self._data_rules_default is None:
-                return False
-
-            rule = self._data_rules_default
+        pattern = self.get_pattern_by_client_user_agent(ua)
+        if pattern is None:
+            return False
 
-        else:
-            async with self._ua_to_rule_mapping_lock:
-                if ua in self._ua_to_rule_mapping:
-                    rule = self._ua_to_rule_mapping.get(ua)
+        # match file name with rule
+        return self.is_match_file_name(pattern, file_name)
 
-                else:
-                    rule = self.get_rule_by_client_user_agent(ua)
-                    if rule is None:
-                        return False
+    def filter_listing(self, ua: str, names: Iterable[str]) -> set[str]:
+        """the names should be displayed to the client, for a whole listing"""
+        if not self.enable:
+            return set(names)
 
-                    self._ua_to_rule_mapping.update({ua: rule})
+        pattern = self.get_pattern_by_client_user_agent(ua)
+        if pattern is None:
+            return set(names)
 
-        # match file name with rule
-        return self.is_match_file_name(rule, file_name)
+        return {name for name in names if pattern.match(name) is None}
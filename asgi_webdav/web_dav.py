@@ -1,5 +1,9 @@
+import asyncio
 from dataclasses import dataclass
 from copy import copy
+from uuid import uuid4
+from contextlib import aclosing
+from collections.abc import AsyncGenerator
 from logging import getLogger
 
 from asgi_webdav import __version__
@@ -11,13 +15,21 @@ from asgi_webdav.constants import (
 )
 from asgi_webdav.config import Config
 from asgi_webdav.request import DAVRequest
+from asgi_webdav.cache import DAVLRUCache
+from asgi_webdav.metrics import register_metrics
 
 from asgi_webdav.provider.dev_provider import DAVProvider
 from asgi_webdav.provider.file_system import FileSystemProvider
 from asgi_webdav.provider.memory import MemoryProvider
-from asgi_webdav.property import DAVProperty
+from asgi_webdav.property import DAVProperty, DAVPropertyBasicData
 from asgi_webdav.response import DAVResponse, DAVResponseType, DAVHideFileInDir
-from asgi_webdav.helpers import empty_data_generator, is_browser_user_agent
+from asgi_webdav.helpers import (
+    empty_data_generator,
+    generate_content_etag,
+    is_browser_user_agent,
+    dav_dict2xml,
+    async_iter,
+)
 
 
 logger = getLogger(__name__)
@@ -62,6 +74,12 @@ _CONTENT_TEMPLATE = """<!DOCTYPE html>
 </body>
 </html>"""
 
+_PROPFIND_FINITE_DEPTH_ERROR = dav_dict2xml(
+    {"D:error": {"@xmlns:D": "DAV:", "D:propfind-finite-depth": None}}
+)
+
+_PROPFIND_CHILD_PROVIDER_TIMEOUT_STATUS = "HTTP/1.1 504 Gateway Timeout"
+
 _CONTENT_TBODY_DIR_TEMPLATE = """<tr><td><a href="{}"><b>{}<b></a></td><td>{}</td>
 <td class="align-right">{}</td><td class="align-right">{}</td></tr>"""
 _CONTENT_TBODY_FILE_TEMPLATE = """<tr><td><a href="{}">{}</a></td><td>{}</td>
@@ -80,14 +98,48 @@ class PrefixProviderInfo:
         return f"{self.prefix} => {self.provider}"
 
 
+class _PrefixProviderTrieNode:
+    __slots__ = ("children", "provider", "child_providers", "descendant_providers")
+
+    def __init__(self):
+        self.children: dict[str, _PrefixProviderTrieNode] = {}
+        self.provider: DAVProvider | None = None  # mounted at this node
+
+        # precomputed when the trie is built
+        self.child_providers: list[DAVProvider] = []  # depth 1
+        self.descendant_providers: list[DAVProvider] = []
+
+
 class WebDAV:
-    prefix_provider_mapping: list = list()
+    """
+    The prefixes of providers are indexed by a trie of the parts of prefix, the
+    routing is O(depth of path), it's not affected by the number of providers.
+    """
+
+    prefix_provider_mapping: list[PrefixProviderInfo]
 
     def __init__(self, config: Config):
+        # the content cache of small files, one byte budget for all providers
+        content_cache = None
+        if config.provider_content_cache.enable:
+            content_cache = DAVLRUCache(
+                max_size=config.provider_content_cache.max_size, get_weight=len
+            )
+            register_metrics(
+                "FileSystemProvider content cache", content_cache.get_metrics
+            )
+
         # init prefix => provider
+        self.prefix_provider_mapping = list()
         for pm in config.provider_mapping:
+            provider_kwargs = dict()
             if pm.uri.startswith("file://"):
                 provider_factory = FileSystemProvider
+                provider_kwargs[
+                    "metadata_cache_invalidation"
+                ] = pm.metadata_cache_invalidation
+                provider_kwargs["read_ahead"] = pm.read_ahead
+                provider_kwargs["content_cache"] = content_cache
 
             elif pm.uri.startswith("memory://"):
                 provider_factory = MemoryProvider
@@ -100,6 +152,7 @@ class WebDAV:
                 prefix=DAVPath(pm.prefix),
                 uri=pm.uri,
                 home_dir=pm.home_dir,
+                **provider_kwargs,
             )
             ppi = PrefixProviderInfo(
                 prefix=DAVPath(pm.prefix),
@@ -113,29 +166,63 @@ class WebDAV:
         self.prefix_provider_mapping.sort(
             key=lambda x: getattr(x, "prefix_weight"), reverse=True
         )
+        self._prefix_provider_trie = self._build_prefix_provider_trie()
 
         # init dir browser config
         self.enable_dir_browser = config.enable_dir_browser
 
+        # init PROPFIND depth infinity config
+        self.propfind_depth_infinity = config.propfind_depth_infinity
+        self.propfind_child_provider = config.propfind_child_provider
+
         # init hide file in dir
         self._hide_file_in_dir = DAVHideFileInDir(config)
 
-    def match_provider(self, request: DAVRequest) -> DAVProvider | None:
-        weight = None
-        provider = None
-
-        # match provider
+    def _build_prefix_provider_trie(self) -> _PrefixProviderTrieNode:
+        root = _PrefixProviderTrieNode()
+        # self.prefix_provider_mapping is sorted by prefix_weight(desc)
         for ppi in self.prefix_provider_mapping:
-            if not request.src_path.startswith(ppi.prefix):
+            chain = [root]
+            for name in ppi.prefix.parts:
+                chain.append(
+                    chain[-1].children.setdefault(name, _PrefixProviderTrieNode())
+                )
+
+            node = chain[-1]
+            if node.provider is not None:
+                logger.warning(f"Duplicate prefix, ignored: {ppi}")
                 continue
 
-            if weight is None:  # or ppm.weight < weight:
-                weight = ppi.prefix_weight
-                provider = ppi.provider
-                break  # self.prefix_provider_mapping is sorted!
+            node.provider = ppi.provider
+            if len(chain) >= 2:
+                chain[-2].child_providers.append(ppi.provider)
+            for ancestor in chain[:-1]:
+                ancestor.descendant_providers.append(ppi.provider)
 
-        if weight is None:
-            return None
+        return root
+
+    def _get_prefix_provider_trie_node(
+        self, path: DAVPath
+    ) -> _PrefixProviderTrieNode | None:
+        node = self._prefix_provider_trie
+        for name in path.parts:
+            node = node.children.get(name)
+            if node is None:
+                return None
+
+        return node
+
+    def match_provider(self, request: DAVRequest) -> DAVProvider | None:
+        # the provider of the longest prefix
+        node = self._prefix_provider_trie
+        provider = node.provider
+        for name in request.src_path.parts:
+            node = node.children.get(name)
+            if node is None:
+                break
+
+            if node.provider is not None:
+                provider = node.provider
 
         return provider
 
@@ -208,12 +295,18 @@ class WebDAV:
         return response
 
     def get_depth_1_child_provider(self, prefix: DAVPath) -> list[DAVProvider]:
-        return [
-            ppm.provider
-            for ppm in self.prefix_provider_mapping
-            if ppm.prefix.startswith(prefix)
-            and ppm.prefix.get_child(prefix).count == 1
-        ]
+        node = self._get_prefix_provider_trie_node(prefix)
+        if node is None:
+            return []
+
+        return node.child_providers
+
+    def get_descendant_provider(self, prefix: DAVPath) -> list[DAVProvider]:
+        node = self._get_prefix_provider_trie_node(prefix)
+        if node is None:
+            return []
+
+        return node.descendant_providers
 
     async def do_propfind(
         self, request: DAVRequest, provider: DAVProvider
@@ -222,59 +315,218 @@ class WebDAV:
             # TODO ??? 40x?
             return DAVResponse(400)
 
-        dav_properties = await self._do_propfind(request, provider)
+        if request.depth == DAVDepth.infinity:
+            return await self._do_propfind_depth_infinity(request, provider)
+
+        dav_properties, timeout_paths = await self._do_propfind(request, provider)
         if len(dav_properties) == 0:
             return DAVResponse(404)
 
-        message = await provider.create_propfind_response(request, dav_properties)
+        if request.depth == DAVDepth.d0:
+            content = await provider.create_propfind_response(
+                request, dav_properties
+            )
+        else:
+            content = provider.create_propfind_response_generator(
+                request,
+                async_iter(dav_properties.values()),
+                {
+                    path: _PROPFIND_CHILD_PROVIDER_TIMEOUT_STATUS
+                    for path in timeout_paths
+                },
+            )
+
         return DAVResponse(
-            status=207, content=message, response_type=DAVResponseType.XML
+            status=207, content=content, response_type=DAVResponseType.XML
         )
 
     async def _do_propfind_hide_file_in_dir(
         self, request: DAVRequest, data: dict[DAVPath, DAVProperty]
     ) -> dict[DAVPath, DAVProperty]:
+        visible_names = self._hide_file_in_dir.filter_listing(
+            request.client_user_agent, (k.name for k in data.keys())
+        )
         for k in list(data.keys()):
-            if await self._hide_file_in_dir.is_match_hide_file_in_dir(
-                request.client_user_agent, k.name
-            ):
+            if k.name not in visible_names:
                 data.pop(k)
 
         return data
 
+    @staticmethod
+    def _filter_propfind_permission(
+        request: DAVRequest, data: dict[DAVPath, DAVProperty]
+    ) -> dict[DAVPath, DAVProperty]:
+        allowed_paths = request.user.filter_paths_permission(data.keys())
+        if len(allowed_paths) == len(data):
+            return data
+
+        return {path: data[path] for path in allowed_paths}
+
+    async def _do_propfind_child_provider(
+        self,
+        request: DAVRequest,
+        child_provider: DAVProvider,
+        semaphore: asyncio.Semaphore,
+    ) -> dict[DAVPath, DAVProperty] | None:
+        """return None if it's timeout"""
+        child_request = copy(request)
+        child_request.depth = DAVDepth.d0
+        child_request.src_path = child_provider.prefix
+        child_request.update_distribute_info(child_provider.prefix)
+
+        async def do_propfind() -> dict[DAVPath, DAVProperty]:
+            async with semaphore:
+                return await child_provider.do_propfind(child_request)
+
+        # the time waiting for the semaphore is included, all the child providers
+        # are started together, so they share one deadline
+        try:
+            child_dav_properties = await asyncio.wait_for(
+                do_propfind(), self.propfind_child_provider.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"PROPFIND child provider timeout: {child_provider}")
+            return None
+
+        if not child_provider.home_dir:
+            # remove disallow item in child provider path
+            child_dav_properties = self._filter_propfind_permission(
+                request, child_dav_properties
+            )
+
+        return child_dav_properties
+
     async def _do_propfind(
         self, request: DAVRequest, provider: DAVProvider
-    ) -> dict[DAVPath, DAVProperty]:
+    ) -> tuple[dict[DAVPath, DAVProperty], list[DAVPath]]:
+        """return (dav_properties, the prefixes of timeout child providers)"""
         dav_properties = await provider.do_propfind(request)
         if provider.home_dir:
-            return await self._do_propfind_hide_file_in_dir(request, dav_properties)
+            return (
+                await self._do_propfind_hide_file_in_dir(request, dav_properties),
+                [],
+            )
 
         # remove disallow item in base path
-        for path in list(dav_properties.keys()):
-            if not request.user.check_paths_permission([path]):
-                dav_properties.pop(path)
+        dav_properties = self._filter_propfind_permission(request, dav_properties)
 
+        timeout_paths = []
         if request.depth != DAVDepth.d0:
-            for child_provider in self.get_depth_1_child_provider(request.src_path):
-                child_request = copy(request)
-                if request.depth == DAVDepth.d1:
-                    child_request.depth = DAVDepth.d0
-                elif request.depth == DAVDepth.infinity:
-                    child_request.depth = DAVDepth.d1  # TODO support infinity
+            # concurrently, the response isn't delayed by the sum of them
+            child_providers = self.get_depth_1_child_provider(request.src_path)
+            semaphore = asyncio.Semaphore(self.propfind_child_provider.max_concurrency)
+            results = await asyncio.gather(
+                *[
+                    self._do_propfind_child_provider(request, child_provider, semaphore)
+                    for child_provider in child_providers
+                ]
+            )
+            for child_provider, child_dav_properties in zip(child_providers, results):
+                if child_dav_properties is not None:
+                    dav_properties.update(child_dav_properties)
+                    continue
+
+                path = child_provider.prefix
+                if (
+                    child_provider.home_dir
+                    or request.user.filter_paths_permission([path])
+                ) and not await self._hide_file_in_dir.is_match_hide_file_in_dir(
+                    request.client_user_agent, path.name
+                ):
+                    timeout_paths.append(path)
+
+        return (
+            await self._do_propfind_hide_file_in_dir(request, dav_properties),
+            timeout_paths,
+        )
 
-                child_request.src_path = child_provider.prefix
-                child_request.update_distribute_info(child_provider.prefix)
-                child_dav_properties = await child_provider.do_propfind(child_request)
+    async def _do_propfind_depth_infinity(
+        self, request: DAVRequest, provider: DAVProvider
+    ) -> DAVResponse:
+        max_entries = self.propfind_depth_infinity.max_entries
+        if not self.propfind_depth_infinity.enable:
+            return DAVResponse(
+                403,
+                content=_PROPFIND_FINITE_DEPTH_ERROR,
+                response_type=DAVResponseType.XML,
+            )
 
-                if not child_provider.home_dir:
-                    # remove disallow item in child provider path
-                    for path in list(child_dav_properties.keys()):
-                        if not request.user.check_paths_permission([path]):
-                            child_dav_properties.pop(path)
+        # the tree of each provider: (provider, request, excluded paths)
+        if provider.home_dir:
+            child_providers = []
+        else:
+            child_providers = self.get_descendant_provider(request.src_path)
+        walks = [(provider, request, [p.prefix for p in child_providers])]
+        for child_provider in child_providers:
+            child_request = copy(request)
+            child_request.src_path = child_provider.prefix
+            child_request.update_distribute_info(child_provider.prefix)
+            excluded_paths = [
+                p.prefix
+                for p in child_providers
+                if p.prefix.startswith(child_provider.prefix)
+                and p.prefix.count > child_provider.prefix.count
+            ]
+            walks.append((child_provider, child_request, excluded_paths))
+
+        # the response can't be changed to 403 after it's started, count first
+        count = 0
+        for walk_provider, walk_request, excluded_paths in walks:
+            count += await walk_provider.count_propfind_depth_infinity(
+                walk_request, excluded_paths, max_entries - count
+            )
+            if count > max_entries:
+                logger.info(f"PROPFIND depth infinity over {max_entries}: {request}")
+                return DAVResponse(
+                    403,
+                    content=_PROPFIND_FINITE_DEPTH_ERROR,
+                    response_type=DAVResponseType.XML,
+                )
 
-                dav_properties.update(child_dav_properties)
+        if count == 0:
+            return DAVResponse(404)
 
-        return await self._do_propfind_hide_file_in_dir(request, dav_properties)
+        content = provider.create_propfind_response_generator(
+            request,
+            self._walk_propfind_depth_infinity(request, walks, max_entries),
+        )
+        return DAVResponse(
+            status=207, content=content, response_type=DAVResponseType.XML
+        )
+
+    async def _walk_propfind_depth_infinity(
+        self,
+        request: DAVRequest,
+        walks: list[tuple[DAVProvider, DAVRequest, list[DAVPath]]],
+        max_entries: int,
+    ) -> AsyncGenerator[DAVProperty, None]:
+        count = 0
+        for walk_provider, walk_request, excluded_paths in walks:
+            async with aclosing(
+                walk_provider.do_propfind_depth_infinity(walk_request, excluded_paths)
+            ) as dav_properties:
+                async for dav_property in dav_properties:
+                    count += 1
+                    if count > max_entries:
+                        # the tree grew after counting
+                        logger.warning(f"PROPFIND depth infinity truncated: {request}")
+                        return
+
+                    # not cached, the paths of a walk are checked only once
+                    if (
+                        not walk_provider.home_dir
+                        and not request.user.filter_paths_permission(
+                            [dav_property.href_path]
+                        )
+                    ):
+                        continue
+
+                    if await self._hide_file_in_dir.is_match_hide_file_in_dir(
+                        request.client_user_agent, dav_property.href_path.name
+                    ):
+                        continue
+
+                    yield dav_property
 
     async def do_get(self, request: DAVRequest, provider: DAVProvider) -> DAVResponse:
         http_status, property_basic_data, data = await provider.do_get(request)
@@ -284,6 +536,12 @@ class WebDAV:
 
         # is a file
         if data is not None:
+            # the body is lazy, the file is not opened if it's not sent
+            if response := provider.create_preconditions_response(
+                request, property_basic_data.etag, property_basic_data.last_modified
+            ):
+                return response
+
             headers = property_basic_data.get_get_head_response_headers()
             if provider.support_content_range:
                 headers.update(
@@ -291,17 +549,19 @@ class WebDAV:
                         b"Accept-Ranges": b"bytes",
                     }
                 )
-                content_range_start = request.content_range_start
-
-            else:
-                content_range_start = None
+                if request.content_range and request.match_if_range(
+                    property_basic_data.etag,
+                    property_basic_data.last_modified.timestamp,
+                ):
+                    return await self._do_get_content_ranges(
+                        request, provider, property_basic_data, headers
+                    )
 
             return DAVResponse(
                 http_status,
                 headers=headers,
                 content=data,
                 content_length=property_basic_data.content_length,
-                content_range_start=content_range_start,
             )
 
         # is a dir
@@ -309,6 +569,11 @@ class WebDAV:
             not self.enable_dir_browser
             or not is_browser_user_agent(request.headers.get(b"user-agent"))
         ):
+            if response := provider.create_preconditions_response(
+                request, property_basic_data.etag, property_basic_data.last_modified
+            ):
+                return response
+
             headers = property_basic_data.get_get_head_response_headers()
             data = empty_data_generator()
             return DAVResponse(200, headers=headers, content=data, content_length=0)
@@ -317,15 +582,32 @@ class WebDAV:
         new_request = copy(request)
         new_request.change_from_get_to_propfind_d1_for_dir_browser()
 
-        dav_properties = await self._do_propfind(new_request, provider)
-        content = await self._create_dir_browser_content(
+        dav_properties, _ = await self._do_propfind(new_request, provider)
+        content, etag = await self._create_dir_browser_content(
             request.client_user_agent, request.src_path, dav_properties
         )
 
+        last_modified = max(
+            (
+                dav_property.basic_data.last_modified
+                for dav_property in dav_properties.values()
+            ),
+            key=lambda dav_time: dav_time.timestamp,
+            default=property_basic_data.last_modified,
+        )
+        if response := provider.create_preconditions_response(
+            request, etag, last_modified
+        ):
+            return response
+
+        # the property_basic_data maybe shared with provider's cache
+        property_basic_data = copy(property_basic_data)
         property_basic_data.content_type = "text/html"
         property_basic_data.content_length = len(content)
+        property_basic_data.last_modified = last_modified
 
         headers = property_basic_data.get_get_head_response_headers()
+        headers[b"ETag"] = etag.encode("utf-8")
         return DAVResponse(
             200,
             headers=headers,
@@ -333,12 +615,93 @@ class WebDAV:
             content_length=property_basic_data.content_length,
         )
 
+    async def _do_get_content_ranges(
+        self,
+        request: DAVRequest,
+        provider: DAVProvider,
+        property_basic_data: DAVPropertyBasicData,
+        headers: dict[bytes, bytes],
+    ) -> DAVResponse:
+        file_size = property_basic_data.content_length
+        content_ranges = request.get_content_ranges(file_size)
+        if len(content_ranges) == 0:
+            return DAVResponse(
+                416,
+                headers={
+                    b"Accept-Ranges": b"bytes",
+                    b"Content-Range": f"bytes */{file_size}".encode("utf-8"),
+                },
+            )
+
+        if len(content_ranges) == 1:
+            start, end = content_ranges[0]
+            return DAVResponse(
+                206,
+                headers=headers,
+                content=await provider.do_get_content_range(
+                    request, property_basic_data, start, end
+                ),
+                content_length=file_size,
+                content_range_start=start,
+                content_range_end=end,
+            )
+
+        # https://datatracker.ietf.org/doc/html/rfc7233#appendix-A
+        boundary = uuid4().hex
+        part_headers = [
+            (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {headers[b'Content-Type'].decode('utf-8')}\r\n"
+                f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+            ).encode("utf-8")
+            for start, end in content_ranges
+        ]
+        closing = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        content_length = (
+            sum(len(part_header) for part_header in part_headers)
+            + sum(end - start + 1 for start, end in content_ranges)
+            + len(closing)
+        )
+
+        async def data_generator():
+            for part_header, (start, end) in zip(part_headers, content_ranges):
+                yield part_header, True
+
+                # one part is opened at a time
+                part = await provider.do_get_content_range(
+                    request, property_basic_data, start, end
+                )
+                async for data, _ in part:
+                    yield data, True
+
+            yield closing, False
+
+        headers = {
+            b"ETag": headers[b"ETag"],
+            b"Last-Modified": headers[b"Last-Modified"],
+            b"Accept-Ranges": b"bytes",
+            b"Content-Type": f"multipart/byteranges; boundary={boundary}".encode(
+                "utf-8"
+            ),
+        }
+        return DAVResponse(
+            206,
+            headers=headers,
+            content=data_generator(),
+            content_length=content_length,
+        )
+
     async def _create_dir_browser_content(
         self,
         client_user_agent: str,
         root_path: DAVPath,
         dav_properties: dict[DAVPath, DAVProperty],
-    ) -> bytes:
+    ) -> tuple[bytes, str]:
+        """
+        return (content, etag); the page is changed with any entry in it, not
+        only with the dir. The etag comes from the listing, not the rendering
+        time in the page, so it's stable until the listing is changed.
+        """
         if root_path.count == 0:
             tbody_parent = str()
         else:
@@ -348,14 +711,19 @@ class WebDAV:
 
         tbody_dir = str()
         tbody_file = str()
+        visible_names = self._hide_file_in_dir.filter_listing(
+            client_user_agent,
+            (
+                dav_property.basic_data.display_name
+                for dav_property in dav_properties.values()
+            ),
+        )
         dav_path_list = sorted(dav_properties.keys())
         for dav_path in dav_path_list:
             basic_data = dav_properties[dav_path].basic_data
             if dav_path == root_path:
                 continue
-            if await self._hide_file_in_dir.is_match_hide_file_in_dir(
-                client_user_agent, basic_data.display_name
-            ):
+            if basic_data.display_name not in visible_names:
                 continue
 
             if basic_data.is_collection:
@@ -375,11 +743,15 @@ class WebDAV:
                     basic_data.last_modified.ui_display(),
                 )
 
+        tbody = tbody_parent + tbody_dir + tbody_file
+        etag = generate_content_etag(
+            f"{root_path.raw}\n{__version__}\n{tbody}".encode("utf-8")
+        )
         content = _CONTENT_TEMPLATE.format(
             root_path.raw,
             root_path.raw,
-            tbody_parent + tbody_dir + tbody_file,
+            tbody,
             __version__,
             DAVTime().ui_display(),
         )
-        return content.encode("utf-8")
+        return content.encode("utf-8"), etag
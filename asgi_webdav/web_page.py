@@ -1,5 +1,6 @@
 from asgi_webdav.request import DAVRequest
 from asgi_webdav.log import get_log_messages
+from asgi_webdav.metrics import get_metrics
 
 
 class WebPage:
@@ -23,13 +24,20 @@ class WebPage:
             # route /_/admin/logging
             status, data = await self.get_logging_page()
 
+        elif request.path.parts[2] == "metrics":
+            # route /_/admin/metrics
+            status, data = await self.get_metrics_page()
+
         else:
             status, data = 500, "something wrong"
 
         return status, data
 
     def get_index_page(self) -> str:
-        return '<a href="/_/admin/logging">Logging page</a>'
+        return (
+            '<a href="/_/admin/logging">Logging page</a><br>'
+            '<a href="/_/admin/metrics">Metrics page</a>'
+        )
 
     async def get_logging_page(self) -> (int, str):
         # return 200, "this is page /_/admin/logs"
@@ -37,3 +45,12 @@ class WebPage:
         for message in get_log_messages():
             data += f'{message}<br>'
         return 200, data
+
+    async def get_metrics_page(self) -> (int, str):
+        data = str()
+        for name, metrics in get_metrics().items():
+            data += f"<b>{name}</b><br>"
+            for key, value in metrics.items():
+                data += f"{key}: {value}<br>"
+
+        return 200, data
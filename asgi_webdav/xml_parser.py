@@ -0,0 +1,269 @@
+"""
+Specialised expat based parsers of the request body of PROPFIND/PROPPATCH/LOCK,
+fill the fields of DAVRequest in the callbacks of expat, without building any
+intermediate dict like xmltodict.
+
+The small PROPFIND bodies are parsed once, the results are cached by the body.
+"""
+
+from typing import TYPE_CHECKING, NamedTuple, Optional
+from pyexpat import ParserCreate, ExpatError
+
+from asgi_webdav.constants import (
+    DAV_PROPERTY_BASIC_KEYS,
+    DAVLockScope,
+    DAVPropertyIdentity,
+    REQUEST_BODY_XML_MAX_DEPTH,
+    REQUEST_BODY_PROPFIND_CACHE_MAX_SIZE,
+    REQUEST_BODY_PROPFIND_CACHE_MAX_BODY_SIZE,
+)
+from asgi_webdav.cache import DAVLRUCache
+from asgi_webdav.metrics import register_metrics
+
+if TYPE_CHECKING:
+    from asgi_webdav.request import DAVRequest
+
+_DAV = "DAV:"
+
+
+class DAVXMLBodyException(Exception):
+    pass
+
+
+class _DAVXMLBodyParser:
+    """
+    The namespace and the local name of element are separated by " ", like:
+        "DAV: prop", "http://ns.example.com/z/ author", "no_namespace_key"
+    """
+
+    root: tuple[str, str]
+
+    def __init__(self, request: "DAVRequest"):
+        self.request = request
+        self.stack: list[tuple[str, str]] = []
+
+        self.parser = ParserCreate(namespace_separator=" ")
+        self.parser.StartElementHandler = self._start_element
+        self.parser.EndElementHandler = self._end_element
+        if type(self).character_data is not _DAVXMLBodyParser.character_data:
+            # a callback per text node, only if it's used
+            self.parser.buffer_text = True
+            self.parser.CharacterDataHandler = self.character_data
+        # no DTD, no entity expansion
+        self.parser.StartDoctypeDeclHandler = self._reject
+        self.parser.EntityDeclHandler = self._reject
+
+    @staticmethod
+    def _reject(*_):
+        raise DAVXMLBodyException("DTD is not allowed")
+
+    def _start_element(self, name: str, _):
+        if len(self.stack) >= REQUEST_BODY_XML_MAX_DEPTH:
+            raise DAVXMLBodyException("too deep")
+
+        ns, _, key = name.rpartition(" ")
+        if len(self.stack) == 0 and (ns, key) != self.root:
+            raise DAVXMLBodyException(f"bad root element: {name}")
+
+        self.stack.append((ns, key))
+        self.start_element(ns, key)
+
+    def _end_element(self, _):
+        ns, key = self.stack.pop()
+        self.end_element(ns, key)
+
+    def start_element(self, ns: str, key: str):
+        pass
+
+    def end_element(self, ns: str, key: str):
+        pass
+
+    def character_data(self, data: str):
+        pass
+
+    def finish(self) -> bool:
+        return True
+
+    def parse(self, body: bytes) -> bool:
+        try:
+            self.parser.Parse(body, True)
+
+        except (ExpatError, DAVXMLBodyException):
+            return False
+
+        return self.finish()
+
+
+class _PropfindBody(NamedTuple):
+    only_fetch_property_name: bool
+    fetch_all_property: bool
+    only_fetch_basic: bool
+    basic_keys: frozenset[str]
+    extra_keys: tuple[DAVPropertyIdentity, ...]
+
+    def apply(self, request: "DAVRequest"):
+        request.propfind_only_fetch_property_name = self.only_fetch_property_name
+        request.propfind_fetch_all_property = self.fetch_all_property
+        request.propfind_only_fetch_basic = self.only_fetch_basic
+        request.propfind_basic_keys = set(self.basic_keys)
+        request.propfind_extra_keys = list(self.extra_keys)
+
+
+class _PropfindBodyParser(_DAVXMLBodyParser):
+    """fill result instead of the request, it can be cached"""
+
+    root = (_DAV, "propfind")
+
+    def __init__(self, request: "DAVRequest"):
+        super().__init__(request)
+        self.found_allprop = False
+        self.found_prop = False
+        self.only_fetch_property_name = False
+        self.basic_keys: set[str] = set()
+        self.extra_keys: list[DAVPropertyIdentity] = []
+        self.result: Optional[_PropfindBody] = None
+
+    def start_element(self, ns: str, key: str):
+        depth = len(self.stack)
+        if depth == 2 and ns == _DAV:
+            if key == "allprop":
+                self.found_allprop = True
+            elif key == "prop":
+                self.found_prop = True
+            elif key == "propname":
+                self.only_fetch_property_name = True
+
+        elif depth == 3 and self.stack[1] == (_DAV, "prop"):
+            if key in DAV_PROPERTY_BASIC_KEYS:
+                self.basic_keys.add(key)
+            else:
+                self.extra_keys.append((ns, key))
+
+    def finish(self) -> bool:
+        if self.only_fetch_property_name or self.found_allprop:
+            fetch_all_property = True
+        elif self.found_prop:
+            fetch_all_property = False
+        else:
+            # TODO error
+            return False
+
+        self.result = _PropfindBody(
+            only_fetch_property_name=self.only_fetch_property_name,
+            fetch_all_property=fetch_all_property,
+            only_fetch_basic=not fetch_all_property and len(self.extra_keys) == 0,
+            basic_keys=frozenset(self.basic_keys),
+            extra_keys=tuple(self.extra_keys),
+        )
+        return True
+
+
+class _ProppatchBodyParser(_DAVXMLBodyParser):
+    root = (_DAV, "propertyupdate")
+
+    def __init__(self, request: "DAVRequest"):
+        super().__init__(request)
+        self.is_set_method = True
+        self.property_key = None
+        self.property_value = []
+        self.property_child_key = None
+
+    def start_element(self, ns: str, key: str):
+        depth = len(self.stack)
+        if depth == 2:
+            if ns != _DAV or key not in {"set", "remove"}:
+                raise DAVXMLBodyException(f"bad element: {ns} {key}")
+
+            self.is_set_method = key == "set"
+
+        elif depth == 4 and self.stack[2] == (_DAV, "prop"):
+            self.property_key = (ns, key)
+            self.property_value = []
+            self.property_child_key = None
+
+        elif depth == 5 and self.property_child_key is None:
+            # value namespace: drop namespace info # TODO ???
+            self.property_child_key = key
+
+    def character_data(self, data: str):
+        if len(self.stack) == 4 and self.property_key is not None:
+            self.property_value.append(data)
+
+    def end_element(self, ns: str, key: str):
+        if len(self.stack) != 3 or self.property_key is None:
+            return
+
+        value = "".join(self.property_value).strip()
+        if not value and self.property_child_key is not None:
+            value = self.property_child_key
+
+        self.request.proppatch_entries.append(
+            (self.property_key, value, self.is_set_method)
+        )
+        self.property_key = None
+
+
+class _LockBodyParser(_DAVXMLBodyParser):
+    root = (_DAV, "lockinfo")
+
+    def __init__(self, request: "DAVRequest"):
+        super().__init__(request)
+        self.lock_scope = DAVLockScope.shared
+        self.lock_owner = None
+
+    def start_element(self, ns: str, key: str):
+        depth = len(self.stack)
+        if depth == 2 and (ns, key) == (_DAV, "owner"):
+            self.lock_owner = []
+
+        elif depth == 3 and self.stack[1] == (_DAV, "lockscope"):
+            if (ns, key) == (_DAV, "exclusive"):
+                self.lock_scope = DAVLockScope.exclusive
+
+    def character_data(self, data: str):
+        if len(self.stack) >= 2 and self.stack[1] == (_DAV, "owner"):
+            self.lock_owner.append(data)
+
+    def finish(self) -> bool:
+        self.request.lock_scope = self.lock_scope
+        if self.lock_owner is not None:
+            self.request.lock_owner = "".join(self.lock_owner).strip()
+
+        return True
+
+
+# body: _PropfindBody, or None for an invalid body
+_propfind_body_cache = DAVLRUCache(REQUEST_BODY_PROPFIND_CACHE_MAX_SIZE)
+register_metrics("PROPFIND body cache", _propfind_body_cache.get_metrics)
+
+
+def parse_propfind_body(request: "DAVRequest", body: bytes) -> bool:
+    cacheable = len(body) <= REQUEST_BODY_PROPFIND_CACHE_MAX_BODY_SIZE
+    if cacheable:
+        item = _propfind_body_cache.get(body)
+        if item is not None:
+            result = item[0]
+            if result is None:
+                return False
+
+            result.apply(request)
+            return True
+
+    parser = _PropfindBodyParser(request)
+    parser.parse(body)
+    if cacheable:
+        _propfind_body_cache.set(body, (parser.result,))
+
+    if parser.result is None:
+        return False
+
+    parser.result.apply(request)
+    return True
+
+
+def parse_proppatch_body(request: "DAVRequest", body: bytes) -> bool:
+    return _ProppatchBodyParser(request).parse(body)
+
+
+def parse_lock_body(request: "DAVRequest", body: bytes) -> bool:
+    return _LockBodyParser(request).parse(body)
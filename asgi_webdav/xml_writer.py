@@ -0,0 +1,137 @@
+"""
+A purpose-built writer of WebDAV XML response, replace xmltodict.unparse in the
+hot path(PROPFIND).
+
+The value of element is compatible with xmltodict:
+    None => <tag/>
+    str/int => <tag>escaped text</tag>
+    dict => child elements, "@key" is attribute, "#text" is text
+    list => repeated elements
+"""
+from collections.abc import Iterable
+
+DAV_NAMESPACE = "DAV:"
+DAV_NAMESPACE_PREFIX = "D"
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="utf-8"?>'
+
+_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+_ESCAPE_ATTRIBUTE_TABLE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}
+)
+
+
+def escape_text(value: str) -> str:
+    return value.translate(_ESCAPE_TABLE)
+
+
+def escape_attribute(value: str) -> str:
+    return value.translate(_ESCAPE_ATTRIBUTE_TABLE)
+
+
+def write_element(buffer: list[str], tag: str, value) -> None:
+    if value is None:
+        buffer.append(f"<{tag}/>")
+
+    elif isinstance(value, str):
+        buffer.append(f"<{tag}>{escape_text(value)}</{tag}>")
+
+    elif isinstance(value, dict):
+        attributes = []
+        children = []
+        text = None
+        for k, v in value.items():
+            if k.startswith("@"):
+                attributes.append(f' {k[1:]}="{escape_attribute(str(v))}"')
+            elif k == "#text":
+                text = escape_text(str(v))
+            else:
+                write_element(children, k, v)
+
+        attributes = "".join(attributes)
+        if text is None and len(children) == 0:
+            buffer.append(f"<{tag}{attributes}/>")
+            return
+
+        buffer.append(f"<{tag}{attributes}>")
+        if text is not None:
+            buffer.append(text)
+        buffer.extend(children)
+        buffer.append(f"</{tag}>")
+
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            write_element(buffer, tag, item)
+
+    else:
+        buffer.append(f"<{tag}>{escape_text(str(value))}</{tag}>")
+
+
+class DAVMultiStatusWriter:
+    """
+    Write <D:multistatus> incrementally, one <D:response> per call.
+
+    The prefixes of namespaces are allocated once(ns1, ns2...) and are stable
+    in the whole document; each <D:response> declares the namespaces it uses,
+    so it's a standalone fragment and can be cached/spliced.
+    """
+
+    def __init__(self):
+        self._prefixes: dict[str, str] = {DAV_NAMESPACE: DAV_NAMESPACE_PREFIX}
+        self._declarations: dict[str, str] = {}
+
+    @staticmethod
+    def start() -> bytes:
+        return XML_DECLARATION + b'<D:multistatus xmlns:D="DAV:">'
+
+    @staticmethod
+    def end() -> bytes:
+        return b"</D:multistatus>"
+
+    def get_tag(self, ns: str, key: str, used_ns: set[str]) -> str:
+        if not ns:
+            # no namespace
+            return key
+
+        prefix = self._prefixes.get(ns)
+        if prefix is None:
+            prefix = f"ns{len(self._prefixes)}"
+            self._prefixes[ns] = prefix
+            self._declarations[ns] = f' xmlns:{prefix}="{escape_attribute(ns)}"'
+
+        if ns != DAV_NAMESPACE:
+            used_ns.add(ns)
+
+        return f"{prefix}:{key}"
+
+    def write_response(
+        self,
+        href: str,
+        propstats: Iterable[tuple[str, list[str]]],
+        used_ns: set[str],
+    ) -> bytes:
+        """
+        href: must be quoted
+        propstats: [(status, [element of property, ...]), ...]
+        used_ns: the namespaces used in the elements, from get_tag()
+        """
+        declarations = "".join(self._declarations[ns] for ns in sorted(used_ns))
+        buffer = [f"<D:response{declarations}><D:href>{href}</D:href>"]
+        for status, elements in propstats:
+            buffer.append("<D:propstat><D:prop>")
+            buffer.extend(elements)
+            buffer.append(f"</D:prop><D:status>{status}</D:status></D:propstat>")
+
+        buffer.append("</D:response>")
+        return "".join(buffer).encode("utf-8")
+
+    @staticmethod
+    def write_status_response(href: str, status: str) -> bytes:
+        """
+        the <D:response> without property, only the status of href
+        href: must be quoted
+        """
+        return (
+            f"<D:response><D:href>{href}</D:href><D:status>{status}</D:status>"
+            "</D:response>"
+        ).encode("utf-8")
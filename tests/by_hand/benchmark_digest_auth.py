@@ -0,0 +1,90 @@
+"""
+Digest verification per second, with the precompiled passwords(HA1) of
+DAVAuth and without them(parse the password string on every request).
+
+    python tests/by_hand/benchmark_digest_auth.py
+"""
+import asyncio
+from time import perf_counter
+
+from asgi_webdav.auth import DAVAuth, HTTPDigestAuth
+from asgi_webdav.config import update_config_from_obj, get_config
+from asgi_webdav.request import DAVRequest
+
+NUMBER = 50000
+
+USERNAME = "username"
+PASSWORD = "password"
+URI = "/a/b/c.txt"
+CNONCE = "0a4f113b"
+
+
+def create_request(dav_auth: DAVAuth, nonce: str, nc: str) -> DAVRequest:
+    digest_auth = dav_auth.http_digest_auth
+    ha1 = digest_auth.build_md5_digest([USERNAME, dav_auth.realm, PASSWORD])
+    ha2 = digest_auth.build_md5_digest(["GET", URI])
+    response = digest_auth.build_md5_digest([ha1, nonce, nc, CNONCE, "auth", ha2])
+    authorization = "Digest " + HTTPDigestAuth.authorization_string_build_from_data(
+        {
+            "username": USERNAME,
+            "realm": dav_auth.realm,
+            "nonce": nonce,
+            "uri": URI,
+            "response": response,
+            "algorithm": "MD5",
+            "opaque": digest_auth.opaque,
+            "qop": "auth",
+            "nc": nc,
+            "cnonce": CNONCE,
+        }
+    )
+    return DAVRequest(
+        scope={
+            "method": "GET",
+            "headers": {b"authorization": authorization.encode("utf-8")},
+            "path": URI,
+        },
+        receive=None,
+        send=None,
+    )
+
+
+async def run(dav_auth: DAVAuth) -> float:
+    # every request has a new nonce-count, or it's a replay
+    nonce = dav_auth.http_digest_auth.nonce
+    requests = [
+        create_request(dav_auth, nonce, f"{nc:08x}") for nc in range(1, NUMBER + 1)
+    ]
+
+    start = perf_counter()
+    for request in requests:
+        user, _ = await dav_auth.pick_out_user(request)
+        assert user is not None
+
+    return NUMBER / (perf_counter() - start)
+
+
+async def main():
+    update_config_from_obj(
+        {
+            "account_mapping": [
+                {"username": USERNAME, "password": PASSWORD, "permissions": ["+"]}
+            ]
+        }
+    )
+    dav_auth = DAVAuth(get_config())
+
+    precompiled = await run(dav_auth)
+
+    dav_auth.password_mapping = {}
+    parse_every_time = await run(dav_auth)
+
+    print(
+        f"Digest: precompiled {precompiled:.0f}/s, "
+        f"parse every time {parse_every_time:.0f}/s, "
+        f"{precompiled / parse_every_time:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
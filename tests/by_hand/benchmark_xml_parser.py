@@ -0,0 +1,65 @@
+"""
+Compare the expat based body parser with the xmltodict one; PROPFIND is also
+measured with the parsed body cache(the same body again and again).
+
+    python tests/by_hand/benchmark_xml_parser.py
+"""
+from timeit import timeit
+
+from asgi_webdav.helpers import dav_xml2dict
+from asgi_webdav.request import DAVRequest
+from asgi_webdav.xml_parser import (
+    parse_propfind_body,
+    parse_proppatch_body,
+    _propfind_body_cache,
+)
+
+NUMBER = 20000
+
+PROPFIND_BODY = b"""<?xml version="1.0" encoding="utf-8" ?>
+<D:propfind xmlns:D="DAV:" xmlns:Z="http://ns.example.com/z/">
+  <D:prop>
+    <D:displayname/><D:getetag/><D:getlastmodified/><D:getcontentlength/>
+    <D:getcontenttype/><D:resourcetype/><D:creationdate/><Z:author/>
+  </D:prop>
+</D:propfind>"""
+
+PROPPATCH_BODY = b"""<?xml version="1.0" encoding="utf-8" ?>
+<D:propertyupdate xmlns:D="DAV:" xmlns:Z="http://ns.example.com/z/">
+  <D:set><D:prop><Z:author>Jim</Z:author><Z:title>Title</Z:title></D:prop></D:set>
+  <D:remove><D:prop><Z:copyright/></D:prop></D:remove>
+</D:propertyupdate>"""
+
+
+def create_request() -> DAVRequest:
+    return DAVRequest(
+        scope={"method": "PROPFIND", "headers": {}, "path": "/"},
+        receive=None,
+        send=None,
+    )
+
+
+def parse_without_cache(request: DAVRequest, body: bytes) -> bool:
+    _propfind_body_cache.clear()
+    return parse_propfind_body(request, body)
+
+
+def main():
+    for name, body, parser in [
+        ("PROPFIND", PROPFIND_BODY, parse_without_cache),
+        ("PROPFIND(cached)", PROPFIND_BODY, parse_propfind_body),
+        ("PROPPATCH", PROPPATCH_BODY, parse_proppatch_body),
+    ]:
+        # a new request per call, the parsed fields don't pile up
+        requests = iter([create_request() for _ in range(NUMBER)])
+        t_xmltodict = timeit(lambda: dav_xml2dict(body), number=NUMBER)
+        t_expat = timeit(lambda: parser(next(requests), body), number=NUMBER)
+        print(
+            f"{name}: xmltodict {t_xmltodict / NUMBER * 1e6:.1f}us, "
+            f"expat {t_expat / NUMBER * 1e6:.1f}us, "
+            f"{t_xmltodict / t_expat:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,28 @@
+import asyncio
 from base64 import b64encode
+from time import time
 
 import pytest
 
 from asgi_webdav.constants import DAVPath, DAVUser
-from asgi_webdav.config import update_config_from_obj, get_config
-from asgi_webdav.auth import DAVPassword, DAVPasswordType, DAVAuth
+from asgi_webdav.config import update_config_from_obj, get_config, User
+from asgi_webdav.auth import DAVPassword, DAVPasswordType, DAVAuth, HTTPDigestAuth
 from asgi_webdav.request import DAVRequest
 
 USERNAME = "username"
 PASSWORD = "password"
 USERNAME_HASHLIB = "user-hashlib"
 PASSWORD_HASHLIB = "<hashlib>:sha256:salt:291e247d155354e48fec2b579637782446821935fc96a5a08a0b7885179c408b"
+USERNAME_SCRYPT = "user-scrypt"
+PASSWORD_SCRYPT = (
+    "<scrypt>:1024:8:1:salt:"
+    "16dbc8906763c7f048977a68f9d305f7710e068ca2cd95dab372125bb3f19608"
+    "175003c79f9cdee65d2e45fc1f169afde0a6806f5d4f2ba0584249d2e66c2c96"
+)
+PASSWORD_PBKDF2 = (
+    "<pbkdf2>:sha256:1000:salt:"
+    "632c2812e46d4604102ba7618e9d6d7d2f8128f6266b4a03264d2a0460b7dcb3"
+)
 USERNAME_DIGEST = "user-digest"
 PASSWORD_DIGEST = "<digest>:ASGI-WebDAV:c1d34f1e0f457c4de05b7468d5165567"
 
@@ -29,6 +41,28 @@ def get_basic_authorization(username, password) -> bytes:
     return b"Basic " + b64encode(f"{username}:{password}".encode("utf-8"))
 
 
+def get_digest_authorization(
+    digest_auth: HTTPDigestAuth, username, password, nonce, nc, uri="/"
+) -> bytes:
+    ha1 = digest_auth.build_md5_digest([username, digest_auth.realm, password])
+    ha2 = digest_auth.build_md5_digest(["GET", uri])
+    response = digest_auth.build_md5_digest([ha1, nonce, nc, "cnonce", "auth", ha2])
+    return b"Digest " + digest_auth.authorization_string_build_from_data(
+        {
+            "username": username,
+            "realm": digest_auth.realm,
+            "nonce": nonce,
+            "uri": uri,
+            "response": response,
+            "algorithm": "MD5",
+            "opaque": digest_auth.opaque,
+            "qop": "auth",
+            "nc": nc,
+            "cnonce": "cnonce",
+        }
+    ).encode("utf-8")
+
+
 def fake_call():
     pass
 
@@ -79,6 +113,43 @@ def test_dev_password_class():
     valid, message = pw_obj.check_digest_password("username", "bad-password")
     assert not valid
 
+    # precompiled HA1
+    pw_obj.compile_ha1("username", "ASGI-WebDAV")
+    assert pw_obj.ha1 == "f73de4cba3dd4ea2acb0228b90f3f4f9"
+
+    pw_obj = DAVPassword("password")
+    pw_obj.compile_ha1("username", "ASGI-WebDAV")
+    assert pw_obj.ha1 == "f73de4cba3dd4ea2acb0228b90f3f4f9"
+
+    pw_obj = DAVPassword(PASSWORD_HASHLIB)
+    pw_obj.compile_ha1("username", "ASGI-WebDAV")
+    assert pw_obj.ha1 is None
+
+    # scrypt
+    pw_obj = DAVPassword(PASSWORD_SCRYPT)
+    assert pw_obj.type == DAVPasswordType.SCRYPT
+
+    valid, message = pw_obj.check_scrypt_password("password")
+    assert valid
+
+    valid, message = pw_obj.check_scrypt_password("bad-password")
+    assert not valid
+
+    pw_obj = DAVPassword(PASSWORD_SCRYPT.replace(":1024:", ":1000:"))
+    valid, message = pw_obj.check_scrypt_password("password")
+    assert not valid
+    assert message is not None
+
+    # pbkdf2
+    pw_obj = DAVPassword(PASSWORD_PBKDF2)
+    assert pw_obj.type == DAVPasswordType.PBKDF2
+
+    valid, message = pw_obj.check_pbkdf2_password("password")
+    assert valid
+
+    valid, message = pw_obj.check_pbkdf2_password("bad-password")
+    assert not valid
+
     # ldap
     pw_obj = DAVPassword(
         "<ldap>#1#ldaps://rexzhang.myds.me#SIMPLE#"
@@ -223,3 +294,236 @@ def test_verify_permission():
     assert not dav_user.check_paths_permission(
         [DAVPath("/a/b2")],
     )
+
+    # bulk
+    paths = [DAVPath("/a"), DAVPath("/a/b1"), DAVPath("/a/b2"), DAVPath("/b")]
+    assert dav_user.filter_paths_permission(paths) == paths[:2]
+
+    dav_user = DAVUser(username, password, ["+"], admin)
+    assert dav_user.filter_paths_permission(paths) == paths
+
+    # can't be combined into one regex, the global flag must be at the start
+    permissions = ["+^/a$", "+(?i)^/B"]
+    dav_user = DAVUser(username, password, permissions, admin)
+    assert dav_user.check_paths_permission([DAVPath("/a")])
+    assert dav_user.check_paths_permission([DAVPath("/b/c")])
+    assert not dav_user.check_paths_permission([DAVPath("/c")])
+
+    # cached decision
+    assert not dav_user.check_paths_permission([DAVPath("/c")])
+    assert dav_user._permission_cache.get_metrics()["hits"] == 1
+
+    # can't be combined, the backreference would point to the group of another rule
+    permissions = ["+^/", "-^/(x)y", "-^/(a)/\\1$"]
+    dav_user = DAVUser(username, password, permissions, admin)
+    assert not dav_user.check_paths_permission([DAVPath("/a/a")])
+    assert dav_user.check_paths_permission([DAVPath("/a/b")])
+    assert not dav_user.check_paths_permission([DAVPath("/xy")])
+    assert dav_user.check_paths_permission([DAVPath("/c")])
+
+
+@pytest.mark.asyncio
+async def test_basic_access_authentication_cache():
+    update_config_from_obj(
+        {
+            "account_mapping": [
+                {"username": USERNAME, "password": PASSWORD, "permissions": list()},
+            ]
+        }
+    )
+    dav_auth = DAVAuth(get_config())
+    http_basic_auth = dav_auth.http_basic_auth
+
+    request.headers[b"authorization"] = get_basic_authorization(USERNAME, PASSWORD)
+    user, message = await dav_auth.pick_out_user(request)
+    assert isinstance(user, DAVUser)
+    user, message = await dav_auth.pick_out_user(request)
+    assert isinstance(user, DAVUser)
+    metrics = http_basic_auth.get_metrics()
+    assert metrics["size"] == 1
+    assert metrics["hits"] == 1
+
+    # negative cache
+    request.headers[b"authorization"] = get_basic_authorization(
+        USERNAME, "bad-password"
+    )
+    for _ in range(3):
+        user, message = await dav_auth.pick_out_user(request)
+        assert user is None
+    metrics = http_basic_auth.get_metrics()
+    assert metrics["negative_size"] == 1
+    assert metrics["negative_hits"] == 2
+
+    # account changed, the cached authentications are dropped
+    dav_auth.update_user_mapping(
+        [User(username=USERNAME, password="bad-password", permissions=[])]
+    )
+    assert http_basic_auth.get_metrics()["size"] == 0
+    user, message = await dav_auth.pick_out_user(request)
+    assert isinstance(user, DAVUser)
+
+    request.headers[b"authorization"] = get_basic_authorization(USERNAME, PASSWORD)
+    user, message = await dav_auth.pick_out_user(request)
+    assert user is None
+
+
+@pytest.mark.asyncio
+async def test_digest_access_authentication():
+    update_config_from_obj(
+        {
+            "account_mapping": [
+                {"username": USERNAME, "password": PASSWORD, "permissions": list()},
+            ],
+            "http_digest_auth": {"nonce_ttl": 300},
+        }
+    )
+    dav_auth = DAVAuth(get_config())
+    digest_auth = dav_auth.http_digest_auth
+
+    def create_request(authorization: bytes) -> DAVRequest:
+        return DAVRequest(
+            {
+                "method": "GET",
+                "headers": {b"authorization": authorization},
+                "path": "/",
+            },
+            fake_call,
+            fake_call,
+        )
+
+    nonce = digest_auth.nonce
+    request_1 = create_request(
+        get_digest_authorization(digest_auth, USERNAME, PASSWORD, nonce, "00000001")
+    )
+    user, message = await dav_auth.pick_out_user(request_1)
+    assert isinstance(user, DAVUser)
+    assert b"nextnonce" not in request_1.authorization_info
+
+    # replay
+    user, message = await dav_auth.pick_out_user(request_1)
+    assert user is None
+
+    # out of order, in the window
+    for nc in ("00000003", "00000002"):
+        request = create_request(
+            get_digest_authorization(digest_auth, USERNAME, PASSWORD, nonce, nc)
+        )
+        user, message = await dav_auth.pick_out_user(request)
+        assert isinstance(user, DAVUser)
+
+    # a large jump, the window is restarted
+    for nc, accepted in (("ffffffff", True), ("00000004", False)):
+        request = create_request(
+            get_digest_authorization(digest_auth, USERNAME, PASSWORD, nonce, nc)
+        )
+        user, message = await dav_auth.pick_out_user(request)
+        assert isinstance(user, DAVUser) is accepted
+
+    # the nc is not exactly 8 hex digits
+    for nc in ("f" * 40, "1", "0000000g"):
+        request = create_request(
+            get_digest_authorization(digest_auth, USERNAME, PASSWORD, nonce, nc)
+        )
+        user, message = await dav_auth.pick_out_user(request)
+        assert user is None
+
+    # forged nonce
+    forged_nonce = f"{int(time()):08x}" + "0" * 64
+    request = create_request(
+        get_digest_authorization(
+            digest_auth, USERNAME, PASSWORD, forged_nonce, "00000001"
+        )
+    )
+    user, message = await dav_auth.pick_out_user(request)
+    assert user is None
+    assert not request.authorization_nonce_stale
+
+    # stale nonce
+    stale_nonce = digest_auth.create_nonce(time() - 301)
+    request = create_request(
+        get_digest_authorization(
+            digest_auth, USERNAME, PASSWORD, stale_nonce, "00000001"
+        )
+    )
+    user, message = await dav_auth.pick_out_user(request)
+    assert user is None
+    assert request.authorization_nonce_stale
+    response = dav_auth.create_response_401(request, message)
+    assert b'stale="true"' in response.headers[b"WWW-Authenticate"]
+
+    request = create_request(
+        get_digest_authorization(
+            digest_auth, USERNAME, "bad-password", stale_nonce, "00000001"
+        )
+    )
+    user, message = await dav_auth.pick_out_user(request)
+    assert user is None
+    assert not request.authorization_nonce_stale
+
+    # aging nonce, the client get a nextnonce
+    aging_nonce = digest_auth.create_nonce(time() - 200)
+    request = create_request(
+        get_digest_authorization(
+            digest_auth, USERNAME, PASSWORD, aging_nonce, "00000001"
+        )
+    )
+    user, message = await dav_auth.pick_out_user(request)
+    assert isinstance(user, DAVUser)
+    assert b"nextnonce" in request.authorization_info
+
+
+@pytest.mark.asyncio
+async def test_basic_access_authentication_password_hash():
+    update_config_from_obj(
+        {
+            "account_mapping": [
+                {
+                    "username": USERNAME_SCRYPT,
+                    "password": PASSWORD_SCRYPT,
+                    "permissions": list(),
+                },
+                {
+                    "username": "user-pbkdf2",
+                    "password": PASSWORD_PBKDF2,
+                    "permissions": list(),
+                },
+            ],
+            "http_basic_auth": {"password_hash_max_pending": 1},
+        }
+    )
+    dav_auth = DAVAuth(get_config())
+    http_basic_auth = dav_auth.http_basic_auth
+
+    def create_request(username, password) -> DAVRequest:
+        return DAVRequest(
+            {
+                "method": "GET",
+                "headers": {
+                    b"authorization": get_basic_authorization(username, password)
+                },
+                "path": "/",
+            },
+            fake_call,
+            fake_call,
+        )
+
+    user, message = await dav_auth.pick_out_user(
+        create_request(USERNAME_SCRYPT, PASSWORD)
+    )
+    assert isinstance(user, DAVUser)
+    user, message = await dav_auth.pick_out_user(
+        create_request("user-pbkdf2", PASSWORD)
+    )
+    assert isinstance(user, DAVUser)
+    assert http_basic_auth.password_hash_executor.get_metrics()["completed"] == 2
+
+    # over the max pending
+    results = await asyncio.gather(
+        dav_auth.pick_out_user(create_request(USERNAME_SCRYPT, "bad-password-1")),
+        dav_auth.pick_out_user(create_request(USERNAME_SCRYPT, "bad-password-2")),
+    )
+    assert all(user is None for user, _ in results)
+    metrics = http_basic_auth.get_metrics()
+    assert metrics["password_hash_rejected"] == 1
+    # the rejected one is not a wrong password, it's not cached
+    assert metrics["negative_size"] == 1
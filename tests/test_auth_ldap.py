@@ -0,0 +1,222 @@
+import asyncio
+from base64 import b64encode
+
+import pytest
+
+from asgi_webdav.auth import DAVAuth
+from asgi_webdav.auth_ldap import DAVLDAPAuth, DAVLDAPConnectionAbc
+from asgi_webdav.config import update_config_from_obj, get_config
+from asgi_webdav.constants import DAVUser
+from asgi_webdav.request import DAVRequest
+
+LDAP_URL = "ldap://127.0.0.1"
+BIND_DN = "uid=user-ldap,cn=users,dc=example,dc=com"
+PASSWORD = "password"
+
+
+class LDAPServerStandIn:
+    """a local LDAP server stand-in, count the connections and binds"""
+
+    def __init__(self, latency: float = 0):
+        self.directory = {BIND_DN: PASSWORD}
+        self.latency = latency
+        self.failures = 0  # the next binds raise an error
+
+        self.connections = 0
+        self.binds = 0
+        self.concurrent_binds = 0
+        self.max_concurrent_binds = 0
+
+    async def create_connection(self, url: str, timeout: float):
+        assert url == LDAP_URL
+        self.connections += 1
+        return LDAPConnectionStandIn(self)
+
+
+class LDAPConnectionStandIn(DAVLDAPConnectionAbc):
+    def __init__(self, server: LDAPServerStandIn):
+        self.server = server
+
+    async def bind(self, mechanism: str, bind_dn: str, password: str) -> bool:
+        server = self.server
+        server.binds += 1
+        if server.failures > 0:
+            server.failures -= 1
+            raise ConnectionError("LDAP server is down")
+
+        server.concurrent_binds += 1
+        server.max_concurrent_binds = max(
+            server.max_concurrent_binds, server.concurrent_binds
+        )
+        try:
+            await asyncio.sleep(server.latency)
+        finally:
+            server.concurrent_binds -= 1
+
+        return server.directory.get(bind_dn) == password
+
+    def close(self):
+        pass
+
+
+def create_ldap_auth(server: LDAPServerStandIn, **kwargs) -> DAVLDAPAuth:
+    return DAVLDAPAuth(connection_factory=server.create_connection, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_ldap_auth_pool_and_cache():
+    server = LDAPServerStandIn()
+    ldap_auth = create_ldap_auth(server)
+
+    valid, message = await ldap_auth.check_password(
+        LDAP_URL, "SIMPLE", BIND_DN, "bad-password"
+    )
+    assert not valid
+    for _ in range(3):
+        valid, message = await ldap_auth.check_password(
+            LDAP_URL, "SIMPLE", BIND_DN, PASSWORD
+        )
+        assert valid
+
+    # the connection is reused, the verified credential is cached
+    assert server.connections == 1
+    assert server.binds == 2
+    metrics = ldap_auth.get_metrics()
+    assert metrics["hits"] == 2
+    assert metrics["pool_idle"] == 1
+
+
+@pytest.mark.asyncio
+async def test_ldap_auth_pool_bounded():
+    server = LDAPServerStandIn(latency=0.01)
+    ldap_auth = create_ldap_auth(server, pool_max_size=2)
+
+    results = await asyncio.gather(
+        *[
+            ldap_auth.check_password(LDAP_URL, "SIMPLE", BIND_DN, f"password-{i}")
+            for i in range(20)
+        ]
+    )
+    assert all(not valid for valid, _ in results)
+    assert server.binds == 20
+    assert server.connections == 2
+    assert server.max_concurrent_binds == 2
+
+
+@pytest.mark.asyncio
+async def test_ldap_auth_circuit_breaker():
+    server = LDAPServerStandIn(latency=1)
+    ldap_auth = create_ldap_auth(
+        server,
+        bind_timeout=0.05,
+        circuit_breaker_failure_threshold=2,
+        circuit_breaker_reset_timeout=0.1,
+    )
+
+    for _ in range(2):
+        valid, message = await ldap_auth.check_password(
+            LDAP_URL, "SIMPLE", BIND_DN, PASSWORD
+        )
+        assert not valid
+        assert message == "LDAP timeout"
+
+    # open, fail fast
+    valid, message = await ldap_auth.check_password(
+        LDAP_URL, "SIMPLE", BIND_DN, PASSWORD
+    )
+    assert not valid
+    assert server.binds == 2
+    metrics = ldap_auth.get_metrics()
+    assert metrics["circuit_open"] == 1
+    assert metrics["rejected"] == 1
+    assert metrics["timeouts"] == 2
+
+    # half open, the trial is succeeded
+    await asyncio.sleep(0.15)
+    server.latency = 0
+    valid, message = await ldap_auth.check_password(
+        LDAP_URL, "SIMPLE", BIND_DN, PASSWORD
+    )
+    assert valid
+    assert ldap_auth.get_metrics()["circuit_open"] == 0
+
+
+@pytest.mark.asyncio
+async def test_ldap_auth_circuit_breaker_trial_cancelled():
+    server = LDAPServerStandIn()
+    server.failures = 1
+    ldap_auth = create_ldap_auth(
+        server,
+        circuit_breaker_failure_threshold=1,
+        circuit_breaker_reset_timeout=0.05,
+    )
+    valid, message = await ldap_auth.check_password(
+        LDAP_URL, "SIMPLE", BIND_DN, PASSWORD
+    )
+    assert valid is None
+    assert ldap_auth.get_metrics()["circuit_open"] == 1
+
+    # the trial is cancelled(e.g. the client is disconnected)
+    await asyncio.sleep(0.1)
+    server.latency = 1
+    task = asyncio.create_task(
+        ldap_auth.check_password(LDAP_URL, "SIMPLE", BIND_DN, PASSWORD)
+    )
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # the server is recovered, the next call is the trial
+    server.latency = 0
+    valid, message = await ldap_auth.check_password(
+        LDAP_URL, "SIMPLE", BIND_DN, PASSWORD
+    )
+    assert valid
+    assert ldap_auth.get_metrics()["circuit_open"] == 0
+
+
+@pytest.mark.asyncio
+async def test_basic_access_authentication_ldap():
+    update_config_from_obj(
+        {
+            "account_mapping": [
+                {
+                    "username": "user-ldap",
+                    "password": f"<ldap>#1#{LDAP_URL}#SIMPLE#{BIND_DN}",
+                    "permissions": list(),
+                },
+            ]
+        }
+    )
+    dav_auth = DAVAuth(get_config())
+    server = LDAPServerStandIn()
+    dav_auth.ldap_auth.connection_factory = server.create_connection
+
+    for password, expected in [(PASSWORD, True), ("bad-password", False)]:
+        request = DAVRequest(
+            {
+                "method": "GET",
+                "headers": {
+                    b"authorization": b"Basic "
+                    + b64encode(f"user-ldap:{password}".encode("utf-8"))
+                },
+                "path": "/",
+            },
+            None,
+            None,
+        )
+        user, message = await dav_auth.pick_out_user(request)
+        assert isinstance(user, DAVUser) is expected
+
+    # the server is unavailable, the right credential is not cached as failed
+    request.headers[b"authorization"] = b"Basic " + b64encode(
+        f"user-ldap:{PASSWORD}".encode("utf-8")
+    )
+    dav_auth.http_basic_auth.clear_cache()
+    dav_auth.ldap_auth._cache.clear()
+    server.failures = 1
+    user, message = await dav_auth.pick_out_user(request)
+    assert user is None
+    user, message = await dav_auth.pick_out_user(request)
+    assert isinstance(user, DAVUser)
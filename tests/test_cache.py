@@ -0,0 +1,110 @@
+import time
+
+from asgi_webdav.cache import DAVLRUCache, DAVTTLCache
+
+
+def test_lru_cache():
+    cache = DAVLRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)  # "b" is the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    assert cache.pop("a") == 1
+    assert cache.get("a") is None
+
+    metrics = cache.get_metrics()
+    assert metrics["size"] == 1
+    assert metrics["hits"] == 3
+    assert metrics["misses"] == 2
+    assert metrics["evictions"] == 1
+
+
+def test_lru_cache_ttl():
+    cache = DAVLRUCache(max_size=10, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1
+
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_lru_cache_invalidation():
+    cache = DAVLRUCache(max_size=10)
+    cache.set("/a", 1)
+    cache.set("/a/b", 2)
+    cache.set("/c", 3)
+    assert cache.pop_matching(lambda k: k.startswith("/a")) == 2
+    assert len(cache) == 1
+
+    # invalidated during loading
+    generation = cache.generation
+    cache.pop("/d")
+    cache.set("/d", 4, generation=generation)
+    assert cache.get("/d") is None
+
+    generation = cache.generation
+    cache.set("/d", 4, generation=generation)
+    assert cache.get("/d") == 4
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_lru_cache_weight():
+    cache = DAVLRUCache(max_size=10, get_weight=len)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    cache.set("a", b"123456")  # replace
+    assert cache.get_metrics()["weight"] == 10
+
+    cache.set("c", b"12")  # "b" is the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == b"123456"
+    assert cache.get_metrics()["weight"] == 8
+
+    cache.pop("a")
+    assert cache.get_metrics()["weight"] == 2
+
+
+def test_lru_cache_on_remove():
+    removed = []
+    cache = DAVLRUCache(
+        max_size=2, on_remove=lambda key, value: removed.append((key, value))
+    )
+    cache.set("a", 1)
+    cache.set("a", 2)  # replace
+    cache.set("b", 3)
+    cache.set("c", 4)  # evict "a"
+    cache.pop("b")
+    cache.pop("not_exists")
+    assert removed == [("a", 1), ("a", 2), ("b", 3)]
+
+    # dropped, never cached
+    generation = cache.generation
+    cache.pop("d")
+    assert not cache.set("d", 5, generation=generation)
+
+    cache.clear()
+    assert removed[-1] == ("c", 4)
+
+
+def test_ttl_cache():
+    cache = DAVTTLCache(max_size=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)  # "a" is the oldest inserted
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    time.sleep(0.1)
+    assert cache.get("c") is None
+    assert len(cache) == 1
@@ -1,3 +1,5 @@
+import time
+import asyncio
 from uuid import uuid4
 
 import pytest
@@ -6,7 +8,16 @@ from asgi_webdav.constants import (
     DAVPath,
 )
 from asgi_webdav.request import DAVRequest
-from asgi_webdav.lock import DAVLock, DAVLockInfo, DAVLockScope
+from asgi_webdav.lock import (
+    DAVLock,
+    DAVLockInfo,
+    DAVLockScope,
+    Path2TokenMap,
+)
+from asgi_webdav.lock_sqlite import DAVSQLiteLock
+from asgi_webdav.exception import ProviderInitException
+
+LOCK_STORES = ("memory", "sqlite")
 
 
 def fake_callable():
@@ -29,9 +40,18 @@ def create_request(path: str):
     return request
 
 
+@pytest.fixture
+def lock_store(request, tmp_path) -> DAVLock | DAVSQLiteLock:
+    if request.param == "sqlite":
+        return DAVSQLiteLock(str(tmp_path.joinpath("lock.sqlite3")))
+
+    return DAVLock()
+
+
 @pytest.mark.asyncio
-async def test_lock_basic():
-    lock = DAVLock()
+@pytest.mark.parametrize("lock_store", LOCK_STORES, indirect=True)
+async def test_lock_basic(lock_store):
+    lock = lock_store
     request1 = create_request("/a/b/c")
     request1.lock_scope = DAVLockScope.exclusive
 
@@ -62,8 +82,9 @@ async def test_lock_basic():
 
 
 @pytest.mark.asyncio
-async def test_lock_coll():
-    lock = DAVLock()
+@pytest.mark.parametrize("lock_store", LOCK_STORES, indirect=True)
+async def test_lock_coll(lock_store):
+    lock = lock_store
     request1 = create_request("/a/b/c")
     request1.lock_scope = DAVLockScope.exclusive
 
@@ -79,8 +100,9 @@ async def test_lock_coll():
 
 
 @pytest.mark.asyncio
-async def test_lock_shared():
-    lock = DAVLock()
+@pytest.mark.parametrize("lock_store", LOCK_STORES, indirect=True)
+async def test_lock_shared(lock_store):
+    lock = lock_store
 
     request1 = create_request("/a/b/c")
     request1.lock_scope = DAVLockScope.shared
@@ -103,3 +125,132 @@ async def test_lock_shared():
     assert not await lock.release(info1.token)
     assert await lock.release(info2.token)
     assert not await lock.release(info2.token)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("lock_store", LOCK_STORES, indirect=True)
+async def test_lock_get_info_by_paths(lock_store):
+    lock = lock_store
+    assert await lock.get_info_by_paths(DAVPath("/")) == {}
+
+    info1 = await lock.new(create_request("/a/b"))
+    info2 = await lock.new(create_request("/a/b/c"))
+    info3 = await lock.new(create_request("/x"))
+
+    result = await lock.get_info_by_paths(DAVPath("/a"))
+    assert result == {
+        DAVPath("/a/b"): [info1],
+        DAVPath("/a/b/c"): [info1, info2],
+    }
+    for path, infos in result.items():
+        assert sorted(infos, key=lambda x: str(x.token)) == sorted(
+            await lock.get_info_by_path(path), key=lambda x: str(x.token)
+        )
+
+    result = await lock.get_info_by_paths(DAVPath("/"), {DAVPath("/x")})
+    assert result == {DAVPath("/x"): [info3]}
+
+
+def test_path2token_map():
+    path_map = Path2TokenMap()
+    token1, token2, token3 = uuid4(), uuid4(), uuid4()
+    assert path_map.add(DAVPath("/a"), DAVLockScope.shared, token1)
+    assert path_map.add(DAVPath("/a/b/c"), DAVLockScope.exclusive, token2)
+    assert not path_map.add(DAVPath("/a/b/c"), DAVLockScope.exclusive, token3)
+    assert path_map.add(DAVPath("/x"), DAVLockScope.exclusive, token3)
+
+    assert path_map.get_tokens(DAVPath("/a/b/c/d")) == [token1, token2]
+    assert path_map.get_tokens(DAVPath("/a/b")) == [token1]
+    assert path_map.get_tokens(DAVPath("/b")) == []
+    assert sorted(path_map.get_paths(DAVPath("/a"))) == [
+        DAVPath("/a"),
+        DAVPath("/a/b/c"),
+    ]
+    assert path_map.get_paths(DAVPath("/a/b/c/d")) == []
+
+    assert path_map.remove(DAVPath("/a/b/c"), token2)
+    assert path_map.get_paths(DAVPath("/a/b")) == []
+    assert path_map.get_tokens(DAVPath("/a/b/c")) == [token1]
+    assert len(path_map) == 2
+
+
+@pytest.mark.asyncio
+async def test_lock_reaper():
+    lock = DAVLock()
+    request = create_request("/a/b/c")
+    request.timeout = 0.05
+    info1 = await lock.new(request)
+    request = create_request("/a/b/d")
+    request.timeout = 0.05
+    info2 = await lock.new(request)
+    request = create_request("/x")
+    await lock.new(request)
+    assert lock.get_metrics()["active_locks"] == 3
+
+    # refreshed with a longer timeout
+    info2.timeout = 300
+    await lock.refresh(info2.token)
+
+    await asyncio.sleep(0.2)
+    metrics = lock.get_metrics()
+    assert metrics["active_locks"] == 2
+    assert metrics["reaped"] == 1
+    assert metrics["reaped_per_minute"] == 1
+    assert info1.token not in lock.lock_map
+    assert not await lock.is_locking(DAVPath("/a/b/c"))
+    assert await lock.is_locking(DAVPath("/a/b/d"))
+
+    # the reaper exits when there is no lock
+    lock = DAVLock()
+    request = create_request("/a")
+    request.timeout = 0.05
+    await lock.new(request)
+    assert lock._reaper_task is not None
+    await asyncio.sleep(0.2)
+    assert lock._reaper_task is None
+    assert lock.get_metrics()["active_locks"] == 0
+
+
+@pytest.mark.asyncio
+async def test_lock_sqlite_shared_by_processes(tmp_path):
+    # two stores on the same file, like two worker processes
+    db_path = str(tmp_path.joinpath("lock.sqlite3"))
+    lock_a = DAVSQLiteLock(db_path)
+    lock_b = DAVSQLiteLock(db_path)
+
+    info = await lock_a.new(create_request("/a/b"))
+    assert await lock_b.is_locking(DAVPath("/a/b/c"))
+    assert await lock_b.new(create_request("/a/b")) is None
+    assert (await lock_b.get_info_by_token(info.token)).owner == "lock_owner"
+    await lock_b.update_metrics()
+    assert lock_b.get_metrics()["active_locks"] == 1
+
+    assert await lock_b.release(info.token)
+    assert not await lock_a.is_locking(DAVPath("/a/b/c"))
+
+
+@pytest.mark.asyncio
+async def test_lock_sqlite_metrics_not_blocking(tmp_path):
+    lock = DAVSQLiteLock(str(tmp_path.joinpath("lock.sqlite3")))
+    await lock.new(create_request("/a"))
+
+    # the database is busy, the counters of last update are returned at once
+    lock.executor.submit(time.sleep, 0.5)
+    start = time.monotonic()
+    assert lock.get_metrics()["active_locks"] == 0
+    assert time.monotonic() - start < 0.1
+
+    await lock.update_metrics()
+    assert lock.get_metrics()["active_locks"] == 1
+
+
+def test_lock_sqlite_default_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    lock = DAVSQLiteLock()
+    assert lock.db_path == str(tmp_path.joinpath("asgi-webdav", "lock.sqlite3"))
+    assert tmp_path.joinpath("asgi-webdav").stat().st_mode & 0o777 == 0o700
+
+    # writable by the others
+    tmp_path.joinpath("asgi-webdav").chmod(0o777)
+    with pytest.raises(ProviderInitException):
+        DAVSQLiteLock()
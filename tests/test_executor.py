@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from asgi_webdav.executor import DAVExecutor
+
+
+@pytest.mark.asyncio
+async def test_executor_run():
+    executor = DAVExecutor(name="test", max_workers=1)
+
+    assert await executor.run(sum, [1, 2, 3]) == 6
+    assert await executor.run(int, "ff", base=16) == 255
+
+    metrics = executor.get_metrics()
+    assert metrics["max_workers"] == 1
+    assert metrics["queue_depth"] == 0
+    assert metrics["running"] == 0
+    assert metrics["completed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_executor_wait_time():
+    executor = DAVExecutor(name="test", max_workers=1)
+
+    future_1 = executor.submit(time.sleep, 0.1)
+    future_2 = executor.submit(time.sleep, 0)
+    future_3 = executor.submit(time.sleep, 0)
+    assert executor.get_metrics()["queue_depth"] >= 1
+
+    # cancel a job in the queue
+    assert future_3.cancel()
+
+    future_1.result()
+    future_2.result()
+    metrics = executor.get_metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["completed"] == 2
+    assert metrics["wait_time_max"] >= 0.05
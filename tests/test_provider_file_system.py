@@ -1,11 +1,27 @@
+import os
+import time
+import asyncio
+import threading
 from pathlib import Path
 
 import pytest
 
+from asgi_webdav.constants import DAVPath, DAVUser
+from asgi_webdav.config import (
+    Config,
+    ProviderMetadataCache,
+    ProviderReadAhead,
+    ProviderContentCache,
+)
+from asgi_webdav.cache import DAVLRUCache
+from asgi_webdav.request import DAVRequest
+from asgi_webdav.response import DAVFileBody
 from asgi_webdav.provider.file_system import (
+    FileSystemProvider,
     _load_extra_property,
     _update_extra_property,
 )
+from asgi_webdav.provider.file_system_open_file_cache import OpenFileCache
 
 DAV_FILENAME = "/tmp/test.DAV"
 
@@ -28,3 +44,385 @@ async def test_property_file():
 
     assert await _update_extra_property(Path(DAV_FILENAME), patches_data_3)
     assert len(await _load_extra_property(dav_file)) == 1
+
+
+async def _get_content_length(provider: FileSystemProvider, file: Path) -> int:
+    metadata = await provider._get_fs_metadata(file, file.name)
+    return metadata.basic_data.content_length
+
+
+@pytest.mark.asyncio
+async def test_metadata_cache_ttl(tmp_path):
+    config = Config(
+        provider_metadata_cache=ProviderMetadataCache(invalidation="ttl", ttl=60)
+    )
+    provider = FileSystemProvider(
+        config=config, prefix=DAVPath("/"), uri=f"file://{tmp_path}"
+    )
+    file = tmp_path.joinpath("a.txt")
+    file.write_bytes(b"1")
+
+    assert await _get_content_length(provider, file) == 1
+    file.write_bytes(b"12")
+    assert await _get_content_length(provider, file) == 1  # from cache
+
+    provider._invalidate_metadata_after_write(file)
+    assert await _get_content_length(provider, file) == 2
+    assert provider.metadata_cache.get_metrics()["hits"] == 1
+
+    file.unlink()
+    provider._invalidate_metadata_after_write(file)
+    assert await provider._get_fs_metadata(file, file.name) is None
+
+
+@pytest.mark.asyncio
+async def test_metadata_cache_inotify(tmp_path):
+    pytest.importorskip("inotify_simple")
+
+    config = Config(
+        provider_metadata_cache=ProviderMetadataCache(invalidation="inotify")
+    )
+    provider = FileSystemProvider(
+        config=config, prefix=DAVPath("/"), uri=f"file://{tmp_path}"
+    )
+    assert provider.fs_watcher is not None
+
+    file = tmp_path.joinpath("a.txt")
+    file.write_bytes(b"1")
+    assert await _get_content_length(provider, file) == 1
+
+    # changed by others
+    file.write_bytes(b"12")
+    for _ in range(100):
+        if file not in provider.metadata_cache:
+            break
+        await asyncio.sleep(0.01)
+
+    assert await _get_content_length(provider, file) == 2
+    provider.fs_watcher.close()
+
+
+@pytest.mark.asyncio
+async def test_metadata_cache_inotify_unwatch(tmp_path):
+    pytest.importorskip("inotify_simple")
+
+    config = Config(
+        provider_metadata_cache=ProviderMetadataCache(
+            invalidation="inotify", max_size=2
+        )
+    )
+    provider = FileSystemProvider(
+        config=config, prefix=DAVPath("/"), uri=f"file://{tmp_path}"
+    )
+    for i in range(10):
+        path = tmp_path.joinpath(f"d{i}")
+        path.mkdir()
+        path.joinpath("a").write_bytes(b"1")
+        assert await _get_content_length(provider, path.joinpath("a")) == 1
+
+    # the watches are removed with the evicted metadata
+    assert provider.fs_watcher.get_metrics()["watches"] == 2
+
+    # the children listed hold the watch of their parent
+    for entry in await provider.io_executor.run(
+        provider._fs_scandir, tmp_path.joinpath("d0"), False
+    ):
+        await provider._create_fs_metadata(entry.fs_path, "a", entry.fs_stat, None)
+    assert provider.fs_watcher.get_metrics()["watches"] == 2
+
+    provider.metadata_cache.clear()
+    assert provider.fs_watcher.get_metrics()["watches"] == 0
+    provider.fs_watcher.close()
+
+
+def test_scandir(tmp_path):
+    config = Config(
+        provider_metadata_cache=ProviderMetadataCache(invalidation="ttl", ttl=60)
+    )
+    provider = FileSystemProvider(
+        config=config, prefix=DAVPath("/"), uri=f"file://{tmp_path}"
+    )
+    tmp_path.joinpath("a.txt").write_bytes(b"1")
+    tmp_path.joinpath("a.txt.WebDAV").write_text(
+        '{"property": [[["ns1", "key1"], "v1"]]}'
+    )
+    tmp_path.joinpath("b.txt").write_bytes(b"12")
+    tmp_path.joinpath("dir").mkdir()
+
+    entries = {
+        entry.fs_path.name: entry
+        for entry in provider._fs_scandir(tmp_path, load_extra_property=True)
+    }
+    assert entries["a.txt"].fs_stat.extra_property_exists
+    assert entries["a.txt"].extra_data == {("ns1", "key1"): "v1"}
+    assert not entries["b.txt"].fs_stat.extra_property_exists
+    assert entries["b.txt"].fs_stat.stat_result.st_size == 2
+    assert entries["b.txt"].extra_data is None
+    assert entries["dir"].metadata is None
+
+    entries = provider._fs_scandir(tmp_path, load_extra_property=False)
+    assert all(entry.extra_data is None for entry in entries)
+
+
+def test_open_file_cache(tmp_path):
+    cache = OpenFileCache(max_size=2, inactive=60)
+    file_a = tmp_path.joinpath("a")
+    file_a.write_bytes(b"0123456789")
+
+    # shared by the readers
+    open_file_1 = cache.acquire(file_a)
+    open_file_2 = cache.acquire(file_a)
+    assert open_file_1 is open_file_2
+    assert os.pread(open_file_1.fd, 3, 2) == b"234"
+    cache.release(open_file_1)
+    cache.release(open_file_2)
+    assert cache.get_metrics()["hits"] == 1
+
+    # validated by inode and mtime
+    file_tmp = tmp_path.joinpath("tmp")
+    file_tmp.write_bytes(b"abc")
+    os.replace(file_tmp, file_a)
+    open_file_3 = cache.acquire(file_a)
+    assert open_file_3 is not open_file_1
+    assert open_file_1.evicted
+    assert os.pread(open_file_3.fd, 3, 0) == b"abc"
+
+    # the evicted descriptor is closed after it's released
+    for name in ("b", "c"):
+        file = tmp_path.joinpath(name)
+        file.write_bytes(name.encode("utf-8"))
+        cache.release(cache.acquire(file))
+    assert open_file_3.evicted
+    assert os.pread(open_file_3.fd, 3, 0) == b"abc"
+    cache.release(open_file_3)
+    with pytest.raises(OSError):
+        os.fstat(open_file_3.fd)
+
+    metrics = cache.get_metrics()
+    assert metrics["size"] == 2
+    assert metrics["evictions"] == 1
+
+    with pytest.raises(FileNotFoundError):
+        cache.acquire(tmp_path.joinpath("not_exists"))
+
+
+@pytest.mark.asyncio
+async def test_open_file_cache_range(tmp_path):
+    provider = FileSystemProvider(
+        config=Config(), prefix=DAVPath("/"), uri=f"file://{tmp_path}"
+    )
+    file = tmp_path.joinpath("a")
+    file.write_bytes(b"0123456789")
+
+    async def read(start: int, end: int) -> bytes:
+        data = b""
+        async for chunk, _ in provider._create_data_generator(file, start, end):
+            data += chunk
+
+        return data
+
+    assert await asyncio.gather(read(0, 1), read(2, 4), read(8, 9)) == [
+        b"01",
+        b"234",
+        b"89",
+    ]
+    metrics = provider.open_file_cache.get_metrics()
+    assert metrics["misses"] + metrics["hits"] == 3
+    assert metrics["size"] == 1
+
+    # invalidated after write
+    provider._invalidate_metadata_after_write(file)
+    assert provider.open_file_cache.get_metrics()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_read_ahead(tmp_path, monkeypatch):
+    provider = FileSystemProvider(
+        config=Config(
+            provider_read_ahead=ProviderReadAhead(
+                block_size=128 * 1024, max_buffer_size=512 * 1024
+            )
+        ),
+        prefix=DAVPath("/"),
+        uri=f"file://{tmp_path}",
+    )
+    file = tmp_path.joinpath("a")
+    content = os.urandom(2 * 1024 * 1024 + 123)
+    file.write_bytes(content)
+
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+    pread = os.pread
+
+    def slow_pread(fd: int, n: int, offset: int) -> bytes:
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += n
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.001)
+        try:
+            return pread(fd, n, offset)
+        finally:
+            with lock:
+                in_flight -= n
+
+    monkeypatch.setattr(os, "pread", slow_pread)
+
+    async def read(start, end) -> tuple[bytes, int]:
+        data = b""
+        chunks = 0
+        async for chunk, more_body in provider._create_data_generator(file, start, end):
+            data += chunk
+            chunks += 1
+            if not more_body:
+                break
+
+        return data, chunks
+
+    data, chunks = await read(None, None)
+    assert data == content
+    # the block grows up to block_size
+    assert chunks < len(content) // (64 * 1024)
+    assert 128 * 1024 < max_in_flight <= 512 * 1024
+
+    assert (await read(100, 1024 * 1024))[0] == content[100 : 1024 * 1024 + 1]
+    assert (await read(len(content) - 1, len(content) - 1))[0] == content[-1:]
+    assert (await read(0, -1))[0] == b""
+
+    # the reads in flight are dropped when the response is closed
+    generator = provider._create_data_generator(file, None, None)
+    await generator.__anext__()
+    await generator.aclose()
+    assert provider.open_file_cache.get_metrics()["in_use"] == 0
+
+    # the descriptor is closed after the running reads are done
+    provider.open_file_cache = None
+    errors = []
+
+    def slower_pread(fd: int, n: int, offset: int) -> bytes:
+        time.sleep(0.05)
+        try:
+            return slow_pread(fd, n, offset)
+        except OSError as e:
+            errors.append(e)
+            raise
+
+    monkeypatch.setattr(os, "pread", slower_pread)
+    generator = provider._create_data_generator(file, None, None)
+    await generator.__anext__()
+    await generator.aclose()
+    assert in_flight == 0
+    await asyncio.sleep(0.1)
+    assert errors == []
+
+
+@pytest.mark.asyncio
+async def test_read_ahead_open_cancelled(tmp_path, monkeypatch):
+    provider = FileSystemProvider(
+        config=Config(), prefix=DAVPath("/"), uri=f"file://{tmp_path}"
+    )
+    file = tmp_path.joinpath("a")
+    file.write_bytes(b"0123456789")
+
+    async def cancel_while_opening():
+        task = asyncio.create_task(
+            provider._create_data_generator(file, None, None).__anext__()
+        )
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.1)
+
+    # the open is still running in the executor, its result is released/closed
+    acquire = provider.open_file_cache.acquire
+
+    def slow_acquire(path):
+        time.sleep(0.05)
+        return acquire(path)
+
+    monkeypatch.setattr(provider.open_file_cache, "acquire", slow_acquire)
+    await cancel_while_opening()
+    assert provider.open_file_cache.get_metrics()["in_use"] == 0
+
+    provider.open_file_cache = None
+    opened_fds = []
+    os_open = os.open
+
+    def slow_open(*args):
+        time.sleep(0.05)
+        opened_fds.append(os_open(*args))
+        return opened_fds[-1]
+
+    monkeypatch.setattr(os, "open", slow_open)
+    await cancel_while_opening()
+    assert len(opened_fds) == 1
+    with pytest.raises(OSError):
+        os.fstat(opened_fds[0])
+
+
+@pytest.mark.asyncio
+async def test_content_cache(tmp_path):
+    content_cache = DAVLRUCache(max_size=100, get_weight=len)
+    provider = FileSystemProvider(
+        config=Config(
+            provider_metadata_cache=ProviderMetadataCache(invalidation="ttl"),
+            provider_content_cache=ProviderContentCache(enable=True),
+        ),
+        prefix=DAVPath("/"),
+        uri=f"file://{tmp_path}",
+        content_cache=content_cache,
+    )
+
+    async def get_content(file: Path) -> bytes | None:
+        metadata = await provider._get_fs_metadata(file, file.name)
+        return await provider._get_file_content(file, metadata.identity)
+
+    file = tmp_path.joinpath("a")
+    file.write_bytes(b"0" * 40)
+    assert await get_content(file) == b"0" * 40
+    assert await get_content(file) == b"0" * 40
+    assert content_cache.get_metrics()["hits"] == 1
+
+    # a changed file is a new key
+    file.write_bytes(b"1" * 50)
+    provider._invalidate_metadata_after_write(file)
+    assert await get_content(file) == b"1" * 50
+    assert content_cache.get_metrics()["weight"] == 90
+
+    # changed after the metadata was taken, not cached
+    file = tmp_path.joinpath("c")
+    file.write_bytes(b"2" * 20)
+    metadata = await provider._get_fs_metadata(file, file.name)
+    file.write_bytes(b"2" * 30)
+    assert await provider._get_file_content(file, metadata.identity) is None
+
+    # bounded by bytes
+    tmp_path.joinpath("b").write_bytes(b"3" * 30)
+    assert await get_content(tmp_path.joinpath("b")) == b"3" * 30
+    metrics = content_cache.get_metrics()
+    assert metrics["evictions"] == 1
+    assert metrics["weight"] == 80
+
+    # a conditional GET ends in 304, the file isn't read
+    async def do_get(file: Path, headers: dict[bytes, bytes]):
+        request = DAVRequest(
+            {"method": "GET", "headers": headers, "path": f"/{file.name}"},
+            None,
+            None,
+        )
+        request.user = DAVUser("user", "password", ["+"], False)
+        request.update_distribute_info(DAVPath("/"))
+        return await provider._do_get(request)
+
+    file = tmp_path.joinpath("d")
+    file.write_bytes(b"4" * 10)
+    metadata = await provider._get_fs_metadata(file, file.name)
+    etag = metadata.basic_data.etag.encode("utf-8")
+    misses = content_cache.get_metrics()["misses"]
+    _, _, data = await do_get(file, {b"if-none-match": etag})
+    assert isinstance(data, DAVFileBody)
+    assert content_cache.get_metrics()["misses"] == misses
+    _, _, data = await do_get(file, {})
+    assert data == b"4" * 10
@@ -29,3 +29,10 @@ def test_file_system_member():
     root_p1.add_file_child("f1_1", b"")
     assert root_p1.member_exists(DAVPath("/f1_1"))
     assert root.member_exists(DAVPath("/p1/f1_1"))
+
+    root_p1.add_path_child("p1_1")
+    root_p1.get_member(DAVPath("/p1_1")).add_file_child("f1_1_1", b"")
+    assert root.count_members(DAVPath("/"), [], 100) == 6
+    assert root.count_members(DAVPath("/"), [DAVPath("/p1/p1_1")], 100) == 4
+    assert root.count_members(DAVPath("/"), [], 2) == 3  # stop counting
+    assert root_p1.count_members(DAVPath("/p1"), [], 100) == 4
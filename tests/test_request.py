@@ -1,4 +1,8 @@
+import pytest
+
+from asgi_webdav.constants import DAVLockScope, REQUEST_BODY_XML_MAX_SIZE
 from asgi_webdav.request import DAVRequest
+from asgi_webdav.xml_parser import _propfind_body_cache
 
 
 def fake_call():
@@ -61,3 +65,149 @@ def test_parser_header_range():
     assert request.content_range
     assert request.content_range_start is None
     assert request.content_range_end == 1000
+
+
+def test_get_content_ranges():
+    def get_content_ranges(header_range: bytes, file_size: int = 10):
+        request = create_request(headers={b"range": header_range})
+        if not request.content_range:
+            return None
+
+        return request.get_content_ranges(file_size)
+
+    assert get_content_ranges(b"bytes=2-4") == [(2, 4)]
+    assert get_content_ranges(b"bytes=7-") == [(7, 9)]
+    assert get_content_ranges(b"bytes=-3") == [(7, 9)]
+    assert get_content_ranges(b"bytes=-30") == [(0, 9)]
+    assert get_content_ranges(b"bytes=8-100") == [(8, 9)]
+    assert get_content_ranges(b"bytes=5-6, 0-1") == [(0, 1), (5, 6)]
+    # coalesced
+    assert get_content_ranges(b"bytes=0-1,2-3,3-5") == [(0, 5)]
+    # unsatisfiable
+    assert get_content_ranges(b"bytes=10-") == []
+    assert get_content_ranges(b"bytes=-0") == []
+    assert get_content_ranges(b"bytes=0-", file_size=0) == []
+    # invalid, ignored
+    assert get_content_ranges(b"bytes=5-2") is None
+    assert get_content_ranges(b"bytes=0-" + b"9" * 5000) is None
+    assert get_content_ranges(b"bytes=0-" + b"9" * 19) == [(0, 9)]
+    assert get_content_ranges(b"bytes=-") is None
+    assert get_content_ranges(b"bytes=a-b") is None
+    assert get_content_ranges(b"items=0-1") is None
+    assert get_content_ranges(b"bytes=" + b"0-1," * 65) is None
+
+
+async def parser_body(method: str, body: bytes) -> DAVRequest:
+    async def receive():
+        return {"body": body, "more_body": False}
+
+    request = create_request(method=method)
+    request.receive = receive
+    await request.parser_body()
+    return request
+
+
+@pytest.mark.asyncio
+async def test_parser_body_propfind():
+    request = await parser_body("PROPFIND", b"")
+    assert request.body_is_parsed_success
+    assert request.propfind_fetch_all_property
+
+    request = await parser_body(
+        "PROPFIND",
+        b"""<?xml version="1.0" encoding="utf-8" ?>
+<D:propfind xmlns:D="DAV:" xmlns:Z="http://ns.example.com/z/">
+  <D:prop><D:getetag/><D:displayname/><Z:author/></D:prop>
+</D:propfind>""",
+    )
+    assert request.body_is_parsed_success
+    assert not request.propfind_fetch_all_property
+    assert not request.propfind_only_fetch_basic
+    assert request.propfind_basic_keys == {"getetag", "displayname"}
+    assert request.propfind_extra_keys == [("http://ns.example.com/z/", "author")]
+
+    request = await parser_body("PROPFIND", b'<propfind xmlns="DAV:"/>')
+    assert not request.body_is_parsed_success
+
+    request = await parser_body(
+        "PROPFIND", b'<propfind xmlns="DAV:"><propname/></propfind>'
+    )
+    assert request.body_is_parsed_success
+    assert request.propfind_only_fetch_property_name
+
+    # the parsed body is cached, a request gets its own copy of the keys
+    body = b'<propfind xmlns="DAV:"><prop><getetag/><x/></prop></propfind>'
+    request_1 = await parser_body("PROPFIND", body)
+    hits = _propfind_body_cache.get_metrics()["hits"]
+    request_2 = await parser_body("PROPFIND", body)
+    assert _propfind_body_cache.get_metrics()["hits"] == hits + 1
+    for request in (request_1, request_2):
+        assert request.body_is_parsed_success
+        assert not request.propfind_fetch_all_property
+        assert request.propfind_basic_keys == {"getetag"}
+        assert request.propfind_extra_keys == [("DAV:", "x")]
+    assert request_1.propfind_extra_keys is not request_2.propfind_extra_keys
+
+    # bad XML, bad root, DTD, too deep, too large
+    for body in [
+        b"<D:propfind xmlns:D='DAV:'>",
+        b'<D:lockinfo xmlns:D="DAV:"><D:allprop/></D:lockinfo>',
+        b'<!DOCTYPE x [<!ENTITY a "aaaa">]><propfind xmlns="DAV:"><allprop/>'
+        b"</propfind>",
+        b'<propfind xmlns="DAV:">' + b"<x>" * 100 + b"</x>" * 100 + b"</propfind>",
+        b'<propfind xmlns="DAV:"><allprop/></propfind>'
+        + b" " * REQUEST_BODY_XML_MAX_SIZE,
+    ]:
+        for _ in range(2):  # parsed, cached
+            request = await parser_body("PROPFIND", body)
+            assert not request.body_is_parsed_success
+
+
+@pytest.mark.asyncio
+async def test_parser_body_proppatch():
+    request = await parser_body(
+        "PROPPATCH",
+        b"""<?xml version="1.0" encoding="utf-8" ?>
+<D:propertyupdate xmlns:D="DAV:" xmlns:Z="http://ns.example.com/z/">
+  <D:set>
+    <D:prop><Z:author>Jim &amp; Roy</Z:author><Z:title>T</Z:title></D:prop>
+  </D:set>
+  <D:remove><D:prop><Z:copyright/></D:prop></D:remove>
+  <D:set><D:prop><Z:kind><Z:book/></Z:kind></D:prop></D:set>
+</D:propertyupdate>""",
+    )
+    assert request.body_is_parsed_success
+    assert request.proppatch_entries == [
+        (("http://ns.example.com/z/", "author"), "Jim & Roy", True),
+        (("http://ns.example.com/z/", "title"), "T", True),
+        (("http://ns.example.com/z/", "copyright"), "", False),
+        (("http://ns.example.com/z/", "kind"), "book", True),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_parser_body_lock():
+    request = await parser_body("LOCK", b"")
+    assert request.body_is_parsed_success
+    assert request.lock_scope is None
+
+    request = await parser_body(
+        "LOCK",
+        b"""<?xml version="1.0" encoding="utf-8" ?>
+<D:lockinfo xmlns:D="DAV:">
+  <D:lockscope><D:exclusive/></D:lockscope>
+  <D:locktype><D:write/></D:locktype>
+  <D:owner><D:href>http://example.org/~ejw/contact.html</D:href></D:owner>
+</D:lockinfo>""",
+    )
+    assert request.body_is_parsed_success
+    assert request.lock_scope == DAVLockScope.exclusive
+    assert request.lock_owner == "http://example.org/~ejw/contact.html"
+
+    request = await parser_body(
+        "LOCK",
+        b'<lockinfo xmlns="DAV:"><lockscope><shared/></lockscope></lockinfo>',
+    )
+    assert request.body_is_parsed_success
+    assert request.lock_scope == DAVLockScope.shared
+    assert request.lock_owner is None
@@ -1,7 +1,11 @@
+from pathlib import Path
+
 import pytest
 
 from asgi_webdav.config import Config, update_config_from_obj
-from asgi_webdav.response import DAVHideFileInDir
+from asgi_webdav.helpers import get_data_generator_from_content
+from asgi_webdav.request import DAVRequest
+from asgi_webdav.response import DAVHideFileInDir, DAVResponse, DAVFileBody
 
 
 MACOS_UA = "WebDAVFS/3.0.0 (03008000) Darwin/21.3.0 (x86_64)"
@@ -77,3 +81,131 @@ async def test_hide_file_in_dir_user_rules():
     assert not await hide_file_in_dir.is_match_hide_file_in_dir(
         MACOS_UA, "file.display"
     )
+
+
+def test_hide_file_in_dir_filter_listing():
+    hide_file_in_dir = DAVHideFileInDir(
+        update_config_from_obj(
+            {"hide_file_in_dir": {"user_rules": {}, "ua_cache_max_size": 2}}
+        )
+    )
+
+    names = ["file", "aa.WebDAV", "Thumbs.db", ".DS_Store", "._.test"]
+    assert hide_file_in_dir.filter_listing(MACOS_UA, names) == {
+        "file",
+        ".DS_Store",
+        "._.test",
+    }
+    assert hide_file_in_dir.filter_listing(WINDOWS_UA, names) == {
+        "file",
+        "Thumbs.db",
+    }
+    assert hide_file_in_dir.filter_listing(FIREFOX_UA, names) == {
+        "file",
+        "Thumbs.db",
+        ".DS_Store",
+        "._.test",
+    }
+
+    # the UA cache is bounded, the compiled rules are shared by the UA class
+    for i in range(10):
+        hide_file_in_dir.filter_listing(f"{MACOS_UA} {i}", names)
+    assert len(hide_file_in_dir._ua_to_pattern) == 2
+    assert len(hide_file_in_dir._ua_class_to_pattern) == 3
+
+
+class FakeSend:
+    def __init__(self):
+        self.messages = []
+
+    async def __call__(self, message: dict):
+        self.messages.append(message)
+
+
+def create_file_body(content: bytes, offset: int = 0) -> DAVFileBody:
+    path = Path("/tmp/test_response_file_body")
+    path.write_bytes(content)
+
+    return DAVFileBody(
+        path=path,
+        offset=offset,
+        count=len(content) - offset,
+        file_size=len(content),
+        data=get_data_generator_from_content(content[offset:]),
+    )
+
+
+def create_request(send: FakeSend, extensions: dict) -> DAVRequest:
+    return DAVRequest(
+        {"method": "GET", "headers": {}, "path": "/", "extensions": extensions},
+        fake_call,
+        send,
+    )
+
+
+async def fake_call():
+    return
+
+
+@pytest.mark.asyncio
+async def test_response_file_body_pathsend():
+    send = FakeSend()
+    request = create_request(send, {"http.response.pathsend": {}})
+    response = DAVResponse(200, content=create_file_body(b"0123456789"))
+    await response.send_in_one_call(request)
+
+    assert send.messages[0]["headers"][-1] == (b"Content-Length", b"10")
+    assert send.messages[1] == {
+        "type": "http.response.pathsend",
+        "path": "/tmp/test_response_file_body",
+    }
+
+    # partial content can't be sent by pathsend
+    send = FakeSend()
+    request = create_request(send, {"http.response.pathsend": {}})
+    response = DAVResponse(206, content=create_file_body(b"0123456789", offset=6))
+    await response.send_in_one_call(request)
+
+    assert send.messages[0]["headers"][-1] == (b"Content-Length", b"4")
+    assert send.messages[1]["type"] == "http.response.body"
+    assert send.messages[1]["body"] == b"6789"
+
+
+@pytest.mark.asyncio
+async def test_response_file_body_zerocopy():
+    send = FakeSend()
+    request = create_request(send, {"http.response.zerocopy": {}})
+    response = DAVResponse(206, content=create_file_body(b"0123456789", offset=6))
+    await response.send_in_one_call(request)
+
+    assert send.messages[1]["type"] == "http.response.zerocopy"
+    assert send.messages[1]["offset"] == 6
+    assert send.messages[1]["count"] == 4
+    assert send.messages[1]["file"].closed
+
+
+@pytest.mark.asyncio
+async def test_response_file_body_fallback():
+    send = FakeSend()
+    request = create_request(send, {})
+    response = DAVResponse(200, content=create_file_body(b"0123456789"))
+    await response.send_in_one_call(request)
+
+    assert send.messages[1]["type"] == "http.response.body"
+    assert send.messages[1]["body"] == b"0123456789"
+
+
+@pytest.mark.asyncio
+async def test_response_bytes_in_one_message():
+    send = FakeSend()
+    request = create_request(send, {})
+    content = b"0123456789" * 10000
+    response = DAVResponse(200, content=content)
+    await response.send_in_one_call(request)
+
+    assert len(send.messages) == 2
+    assert send.messages[1] == {
+        "type": "http.response.body",
+        "body": content,
+        "more_body": False,
+    }
@@ -1,14 +1,18 @@
+import time
+import asyncio
 from typing import Optional, Callable
 from uuid import uuid4
 
 import pytest
 import pytest_asyncio
 
-from asgi_webdav.constants import RESPONSE_DATA_BLOCK_SIZE
+from asgi_webdav.constants import RESPONSE_DATA_BLOCK_SIZE, DAVPath
 from asgi_webdav.config import Config, get_config, update_config_from_obj
 from asgi_webdav.exception import NotASGIRequestException
 from asgi_webdav.helpers import dav_dict2xml
+from asgi_webdav.request import DAVRequest
 from asgi_webdav.server import Server
+from asgi_webdav.web_dav import WebDAV
 from asgi_webdav.response import DAVResponse
 
 
@@ -258,3 +262,327 @@ async def test_method_lock_unlock_exclusive(setup, provider_name):
     assert response.status == 201
 
     # LOCK
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider_name", PROVIDER_NAMES)
+async def test_method_propfind_depth_infinity(setup, provider_name):
+    server, base_path = setup
+
+    for method, path, data in (
+        ("MKCOL", f"{base_path}/dir", b""),
+        ("MKCOL", f"{base_path}/dir/sub", b""),
+        ("PUT", f"{base_path}/dir/sub/file", b"1"),
+        ("PUT", f"{base_path}/file", b"2"),
+    ):
+        scope, receive = get_test_scope(method, data, path)
+        _, response = await server.handle(scope, receive, send)
+        assert response.status == 201
+
+    scope, receive = get_test_scope("PROPFIND", b"", base_path)
+    scope["headers"][b"depth"] = b"infinity"
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 207
+    content = await get_response_content(response)
+    for path in ("", "/dir", "/dir/sub", "/dir/sub/file", "/file"):
+        assert f"<D:href>{base_path}{path}</D:href>".encode("utf-8") in content
+
+    # over max_entries
+    server.web_dav.propfind_depth_infinity.max_entries = 4
+    scope, receive = get_test_scope("PROPFIND", b"", base_path)
+    scope["headers"][b"depth"] = b"infinity"
+    _, response = await server.handle(scope, receive, send)
+    server.web_dav.propfind_depth_infinity.max_entries = 10000
+    assert response.status == 403
+    assert b"propfind-finite-depth" in await get_response_content(response)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider_name", PROVIDER_NAMES)
+async def test_method_propfind_response_cache(setup, provider_name):
+    server, base_path = setup
+
+    async def propfind() -> bytes:
+        scope, receive = get_test_scope("PROPFIND", b"", base_path)
+        scope["headers"][b"depth"] = b"1"
+        _, response = await server.handle(scope, receive, send)
+        assert response.status == 207
+        return await get_response_content(response)
+
+    scope, receive = get_test_scope("PUT", b"1", f"{base_path}/file")
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 201
+
+    provider = next(
+        ppi.provider
+        for ppi in server.web_dav.prefix_provider_mapping
+        if ppi.prefix.raw == f"/{provider_name}"
+    )
+    cache = provider.propfind_response_cache
+    hits = cache.hits
+    content = await propfind()
+    assert b"<D:getcontentlength>1</D:getcontentlength>" in content
+    assert await propfind() == content
+    assert cache.hits >= hits + 2
+
+    # invalidated by DELETE/PUT
+    scope, receive = get_test_scope("DELETE", b"", f"{base_path}/file")
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 204
+    scope, receive = get_test_scope("PUT", b"22", f"{base_path}/file")
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 201
+    content = await propfind()
+    assert b"<D:getcontentlength>2</D:getcontentlength>" in content
+
+    # invalidated by PROPPATCH
+    data = (
+        b'<?xml version="1.0" encoding="utf-8" ?>'
+        b'<D:propertyupdate xmlns:D="DAV:" xmlns:Z="http://ns.example.com/z/">'
+        b"<D:set><D:prop><Z:author>me</Z:author></D:prop></D:set>"
+        b"</D:propertyupdate>"
+    )
+    scope, receive = get_test_scope("PROPPATCH", data, f"{base_path}/file")
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 207
+
+    data = (
+        b'<?xml version="1.0" encoding="utf-8" ?>'
+        b'<D:propfind xmlns:D="DAV:" xmlns:Z="http://ns.example.com/z/">'
+        b"<D:prop><D:getetag/><Z:author/></D:prop></D:propfind>"
+    )
+    scope, receive = get_test_scope("PROPFIND", data, f"{base_path}/file")
+    scope["headers"][b"depth"] = b"0"
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 207
+    assert b">me</ns1:author>" in await get_response_content(response)
+
+
+def test_match_provider():
+    config = Config.parse_obj(
+        {
+            "provider_mapping": [
+                {"prefix": prefix, "uri": "memory:///"}
+                for prefix in ("/", "/a", "/a/b/c", "/a/d", "/x/y")
+            ],
+        }
+    )
+    web_dav = WebDAV(config)
+    providers = {
+        ppi.prefix.raw: ppi.provider for ppi in web_dav.prefix_provider_mapping
+    }
+
+    def match(path: str):
+        request = DAVRequest(
+            {"method": "GET", "headers": {}, "path": path}, fake_call, fake_call
+        )
+        return web_dav.match_provider(request)
+
+    assert match("/") is providers["/"]
+    assert match("/file") is providers["/"]
+    assert match("/a") is providers["/a"]
+    assert match("/a/b") is providers["/a"]
+    assert match("/a/b/c/d") is providers["/a/b/c"]
+    assert match("/ab") is providers["/"]
+    assert match("/x") is providers["/"]
+    assert match("/x/y/z") is providers["/x/y"]
+
+    assert web_dav.get_depth_1_child_provider(DAVPath("/")) == [providers["/a"]]
+    assert web_dav.get_depth_1_child_provider(DAVPath("/a")) == [providers["/a/d"]]
+    assert web_dav.get_depth_1_child_provider(DAVPath("/a/b")) == [providers["/a/b/c"]]
+    assert web_dav.get_depth_1_child_provider(DAVPath("/a/b/c/d")) == []
+    assert sorted(
+        provider.prefix.raw
+        for provider in web_dav.get_descendant_provider(DAVPath("/a"))
+    ) == ["/a/b/c", "/a/d"]
+    assert len(web_dav.get_descendant_provider(DAVPath("/"))) == 4
+
+
+@pytest.mark.asyncio
+async def test_method_propfind_child_provider_timeout():
+    slow_prefixes = ("/slow1", "/slow2", "/slow3")
+    config = Config.parse_obj(
+        {
+            "account_mapping": CONFIG_OBJECT["account_mapping"],
+            "provider_mapping": [
+                {"prefix": prefix, "uri": "memory:///"}
+                for prefix in ("/", "/fast") + slow_prefixes
+            ],
+            "propfind_child_provider": {"timeout": 0.1, "max_concurrency": 1},
+        }
+    )
+    server = Server(config)
+
+    async def slow_do_propfind(request):
+        await asyncio.sleep(10)
+
+    for ppi in server.web_dav.prefix_provider_mapping:
+        if ppi.prefix.raw in slow_prefixes:
+            ppi.provider.do_propfind = slow_do_propfind
+
+    scope, receive = get_test_scope("PROPFIND", b"", "/")
+    scope["headers"][b"depth"] = b"1"
+    start_time = time.monotonic()
+    _, response = await server.handle(scope, receive, send)
+    # one deadline for all of them, the time waiting for the semaphore included
+    assert time.monotonic() - start_time < 0.25
+    assert response.status == 207
+    content = await get_response_content(response)
+    assert b"<D:href>/fast</D:href>" in content
+    for prefix in slow_prefixes:
+        assert (
+            f"<D:response><D:href>{prefix}</D:href>"
+            "<D:status>HTTP/1.1 504 Gateway Timeout</D:status></D:response>"
+        ).encode() in content
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider_name", PROVIDER_NAMES)
+async def test_method_get_head_conditional(setup, provider_name, monkeypatch):
+    server, base_path = setup
+
+    async def request(method: str, path: str, headers: dict) -> DAVResponse:
+        scope, receive = get_test_scope(method, b"", path)
+        scope["headers"].update(headers)
+        _, response = await server.handle(scope, receive, send)
+        return response
+
+    scope, receive = get_test_scope("PUT", b"1", f"{base_path}/file")
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 201
+
+    path = f"{base_path}/file"
+    response = await request("GET", path, {})
+    assert response.status == 200
+    etag = response.headers[b"ETag"]
+    last_modified = response.headers[b"Last-Modified"]
+
+    for method in ("GET", "HEAD"):
+        response = await request(method, path, {b"if-none-match": etag})
+        assert response.status == 304
+        assert response.headers[b"ETag"] == etag
+        assert response.content_length == 0
+        response = await request(method, path, {b"if-none-match": b'W/"other"'})
+        assert response.status == 200
+        response = await request(method, path, {b"if-modified-since": last_modified})
+        assert response.status == 304
+        response = await request(
+            method,
+            path,
+            {b"if-modified-since": b"Thu, 01 Jan 1970 00:00:00 GMT"},
+        )
+        assert response.status == 200
+        # If-None-Match takes precedence over If-Modified-Since
+        response = await request(
+            method,
+            path,
+            {b"if-none-match": b'W/"other"', b"if-modified-since": last_modified},
+        )
+        assert response.status == 200
+
+        response = await request(method, path, {b"if-match": b'"other"'})
+        assert response.status == 412
+        # strong comparison, the weak ETag never matches
+        response = await request(method, path, {b"if-match": etag})
+        assert response.status == 412
+        response = await request(method, path, {b"if-match": b"*"})
+        assert response.status == 200
+        response = await request(
+            method,
+            path,
+            {b"if-unmodified-since": b"Thu, 01 Jan 1970 00:00:00 GMT"},
+        )
+        assert response.status == 412
+
+    # dir browser page
+    browser_ua = {b"user-agent": b"Mozilla/5.0 Firefox/97.0"}
+    response = await request("GET", base_path, browser_ua)
+    assert response.status == 200
+    etag = response.headers[b"ETag"]
+    response = await request("GET", base_path, {**browser_ua, b"if-none-match": etag})
+    assert response.status == 304
+
+    # the rendering time in the page is not a part of etag
+    now = time.time()
+    monkeypatch.setattr("asgi_webdav.constants.time", lambda: now + 10)
+    response = await request("GET", base_path, {**browser_ua, b"if-none-match": etag})
+    assert response.status == 304
+    monkeypatch.undo()
+
+    # changed with the entries in it
+    scope, receive = get_test_scope("PUT", b"2", f"{base_path}/file2")
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 201
+    response = await request("GET", base_path, {**browser_ua, b"if-none-match": etag})
+    assert response.status == 200
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider_name", PROVIDER_NAMES)
+async def test_method_get_content_range(setup, provider_name):
+    server, base_path = setup
+    path = f"{base_path}/file"
+
+    async def get(headers: dict) -> (DAVResponse, bytes):
+        scope, receive = get_test_scope("GET", b"", path)
+        scope["headers"].update(headers)
+        _, response = await server.handle(scope, receive, send)
+        return response, await get_response_content(response)
+
+    scope, receive = get_test_scope("PUT", b"0123456789", path)
+    _, response = await server.handle(scope, receive, send)
+    assert response.status == 201
+
+    for header_range, content, content_range in (
+        (b"bytes=2-4", b"234", b"bytes 2-4/10"),
+        (b"bytes=7-", b"789", b"bytes 7-9/10"),
+        (b"bytes=-3", b"789", b"bytes 7-9/10"),
+        (b"bytes=8-100", b"89", b"bytes 8-9/10"),
+        (b"bytes=0-1,1-3", b"0123", b"bytes 0-3/10"),
+    ):
+        response, data = await get({b"range": header_range})
+        assert response.status == 206
+        assert response.headers[b"Content-Range"] == content_range
+        assert response.content_length == len(content)
+        assert data == content
+
+    # unsatisfiable
+    response, data = await get({b"range": b"bytes=20-"})
+    assert response.status == 416
+    assert response.headers[b"Content-Range"] == b"bytes */10"
+
+    # invalid, ignored
+    response, data = await get({b"range": b"bytes=5-2"})
+    assert response.status == 200
+    assert data == b"0123456789"
+
+    # multipart/byteranges
+    response, data = await get({b"range": b"bytes=0-1,5-6"})
+    assert response.status == 206
+    content_type = response.headers[b"Content-Type"].decode("utf-8")
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+    assert response.content_length == len(data)
+    assert data == (
+        f"\r\n--{boundary}\r\n"
+        "Content-Type: application/octet-stream\r\n"
+        "Content-Range: bytes 0-1/10\r\n\r\n01"
+        f"\r\n--{boundary}\r\n"
+        "Content-Type: application/octet-stream\r\n"
+        "Content-Range: bytes 5-6/10\r\n\r\n56"
+        f"\r\n--{boundary}--\r\n"
+    ).encode("utf-8")
+
+    # If-Range
+    response, _ = await get({})
+    etag = response.headers[b"ETag"]
+    last_modified = response.headers[b"Last-Modified"]
+    for if_range, status in (
+        (etag, 200),  # weak ETag, never match in strong comparison
+        (b'W/"other"', 200),
+        (last_modified, 206),
+        (b"Thu, 01 Jan 1970 00:00:00 GMT", 200),
+    ):
+        response, data = await get({b"range": b"bytes=2-4", b"if-range": if_range})
+        assert response.status == status
+        assert data == (b"234" if status == 206 else b"0123456789")
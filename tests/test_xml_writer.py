@@ -0,0 +1,48 @@
+from xml.dom.minidom import parseString
+
+from asgi_webdav.xml_writer import DAVMultiStatusWriter, write_element
+
+
+def test_write_element():
+    buffer = []
+    write_element(buffer, "D:a", None)
+    write_element(buffer, "D:b", "<&>")
+    write_element(buffer, "D:c", 1)
+    write_element(buffer, "D:d", {"@x": '"', "D:e": ["1", "2"], "D:f": None})
+    write_element(buffer, "D:g", {"#text": "t"})
+    assert "".join(buffer) == (
+        "<D:a/><D:b>&lt;&amp;&gt;</D:b><D:c>1</D:c>"
+        '<D:d x="&quot;"><D:e>1</D:e><D:e>2</D:e><D:f/></D:d><D:g>t</D:g>'
+    )
+
+
+def test_multistatus_writer():
+    writer = DAVMultiStatusWriter()
+
+    used_ns = set()
+    tag_dav = writer.get_tag("DAV:", "getetag", used_ns)
+    tag_z = writer.get_tag("http://ns.example.com/z/", "author", used_ns)
+    tag_none = writer.get_tag("", "plain", used_ns)
+    assert tag_dav == "D:getetag"
+    assert tag_z == "ns1:author"
+    assert tag_none == "plain"
+    response_1 = writer.write_response(
+        "/a%20b",
+        [
+            ("HTTP/1.1 200 OK", [f"<{tag_dav}>e</{tag_dav}>"]),
+            ("HTTP/1.1 404 Not Found", [f"<{tag_z}/>", f"<{tag_none}/>"]),
+        ],
+        used_ns,
+    )
+    assert b'xmlns:ns1="http://ns.example.com/z/"' in response_1
+
+    # prefix is stable, and declared only when it's used
+    used_ns = set()
+    assert writer.get_tag("http://ns.example.com/z/", "x", used_ns) == "ns1:x"
+    response_2 = writer.write_response("/c", [("HTTP/1.1 200 OK", [])], set())
+    assert b"xmlns:ns1" not in response_2
+
+    document = writer.start() + response_1 + response_2 + writer.end()
+    dom = parseString(document)
+    assert len(dom.getElementsByTagName("D:response")) == 2
+    assert dom.getElementsByTagName("D:href")[0].firstChild.data == "/a%20b"